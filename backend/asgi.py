@@ -3,6 +3,15 @@ ASGI config for goldcinema_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The live seat-map stream (/api/seat-events/...) is an async view that holds
+its connection open, so serve the site through this entry point, e.g.
+``gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker``.
+Under WSGI every open stream would tie up a worker thread.
+
+WebSocket connections (the support chat at /ws/chat/<id>/) are routed to
+users.sockets; everything else goes to Django. uvicorn needs the
+``websockets`` package for them.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,6 +22,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from users.sockets import websocket_application  # noqa: E402
 
 
-application = get_asgi_application()
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
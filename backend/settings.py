@@ -102,6 +102,33 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # File-backed test DB so concurrency tests see real SQLite locking
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# ============================================================
+# CACHE
+# ============================================================
+# Seat maps, unread counters, presence heartbeats and dashboard figures live
+# in the cache, so every worker and management command must share one:
+# Redis when REDIS_URL is set, else a table in the database
+# (python manage.py createcachetable). Local development runs a single
+# process and keeps Django's per-process default.
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif DATABASE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
         }
     }
 
@@ -154,6 +181,85 @@ LOGIN_REDIRECT_URL = '/homepage/'
 LOGIN_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
+# ============================================================
+# BOOKINGS
+# ============================================================
+# Retries when a booking transaction hits a lock wait / deadlock
+BOOKING_MAX_RETRIES = 5
+BOOKING_RETRY_BACKOFF = 0.05  # seconds, doubled on every retry
+
+# Ticket numbers each process reserves from the shared sequence at a time
+TICKET_BLOCK_SIZE = 100
+
+# How long selected seats stay reserved for a user during checkout
+SEAT_HOLD_MINUTES = 10
+
+# Seconds a showtime's seat map stays in the cache between rebuilds
+SEATMAP_CACHE_TIMEOUT = 5
+
+# Seat-map versions kept for ?since= delta responses
+SEATMAP_HISTORY = 100
+
+# Seconds a movie title -> default showtime lookup stays cached
+MOVIE_SHOWTIME_CACHE_TIMEOUT = 300
+
+# Live seat-map streams (/api/seat-events/): how often each showtime's watcher
+# checks the DB for other workers' changes, and the idle keepalive interval
+SEAT_EVENTS_POLL_INTERVAL = 2
+SEAT_EVENTS_KEEPALIVE = 15
+SEAT_EVENTS_QUEUE_SIZE = 100
+
+# Messages per page of the support chat API (/api/chat/get/<id>/)
+CHAT_PAGE_SIZE = 50
+
+# Chat sockets (/ws/chat/<id>/) are woken at once by messages sent through
+# the same worker and check the DB this often (seconds) for the others
+CHAT_SOCKET_POLL_INTERVAL = 5
+
+# Seconds a user's cached unread-message count (/api/chat/unread/) lives
+# before it is counted again; sends add to it and reads drop it meanwhile
+CHAT_UNREAD_CACHE_TIMEOUT = 300
+
+# Presence (users/presence.py): pages send a heartbeat this often (seconds),
+# a user counts as online for PRESENCE_ONLINE_WINDOW after one, and each
+# worker writes last_seen for everyone it heard from at most once per
+# PRESENCE_FLUSH_INTERVAL. The advisor directory is cached until an
+# account changes or an advisor's last_seen is written, or
+# PRESENCE_DIRECTORY_TIMEOUT at most. Heartbeats and the directory are kept
+# in the shared cache (see CACHE), so every worker sees every heartbeat.
+# Presence needs Redis there: with the database cache each heartbeat is a
+# database write again.
+PRESENCE_HEARTBEAT_INTERVAL = 30
+PRESENCE_ONLINE_WINDOW = 75
+PRESENCE_FLUSH_INTERVAL = 60
+PRESENCE_DIRECTORY_TIMEOUT = 3600
+
+# ============================================================
+# DASHBOARDS
+# ============================================================
+# Days the dashboard chart shows before it is paged or zoomed (/api/admin/timeseries/)
+DASHBOARD_CHART_DAYS = 90
+
+# Seconds dashboard figures stay cached. Changes to bookings, movies and users
+# clear them at once.
+KPI_CACHE_TIMEOUT = 300
+
+# Rows fetched per database round trip by exports (admin and the export_* commands)
+EXPORT_CHUNK_SIZE = 2000
+
+# Seconds a movie's seat heatmap (users/seat_analytics.py) stays cached
+SEAT_ANALYTICS_CACHE_TIMEOUT = 3600
+
+# ============================================================
+# BACKGROUND JOBS (python manage.py runworker)
+# ============================================================
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 4))
+JOB_POLL_INTERVAL = 1  # seconds between checks for due jobs
+JOB_VISIBILITY_TIMEOUT = 300  # seconds before a claimed job counts as abandoned
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 30  # seconds, doubled on every retry
+JOB_RETENTION_DAYS = 7  # finished jobs are pruned after this long
+
 # ============================================================
 # EMAIL CONFIGURATION
 # ============================================================
@@ -42,6 +42,9 @@ urlpatterns = [
     # AJAX API
     path("api/bookings/", user_views.get_user_bookings, name="get_bookings"),
     path("api/booked-seats/<str:movie_name>/", user_views.get_booked_seats, name="get_booked_seats"),
+    path("api/seat-events/<str:movie_name>/", user_views.seat_events, name="seat_events"),
+    path("api/seat-hold/", user_views.hold_seats, name="hold_seats"),
+    path("api/seat-hold/release/", user_views.release_seat_holds, name="release_seat_holds"),
     path("download-ticket/<int:booking_id>/", user_views.download_ticket, name="download_ticket"),
 
     # ==========================
@@ -82,15 +85,21 @@ urlpatterns = [
 
     # USERS MANAGEMENT
     path("admin-dashboard/users/", admin_views.admin_users, name="admin_users"),
+    path("admin-dashboard/users/export/", admin_views.export_records, {"kind": "users"}, name="export_users"),
     path("admin-dashboard/users/<int:user_id>/", admin_views.admin_user_detail, name="admin_user_detail"),
     path("admin-dashboard/users/<int:user_id>/delete/", admin_views.delete_user_admin, name="delete_user_admin"),
 
     # BOOKINGS MANAGEMENT
     path("admin-dashboard/bookings/", admin_views.admin_bookings, name="admin_bookings"),
+    path("admin-dashboard/bookings/export/", admin_views.export_records, {"kind": "bookings"}, name="export_bookings"),
     path("admin-dashboard/booking/delete/<int:booking_id>/", admin_views.delete_booking_admin, name="delete_booking_admin"),
 
     # HISTORY
     path("admin-dashboard/history/", admin_views.admin_history, name="admin_history"),
+    path("api/admin/timeseries/", admin_views.api_timeseries, name="api_timeseries"),
+    path("admin-dashboard/revenue/export/", admin_views.export_records, {"kind": "revenue"}, name="export_revenue"),
+    path("admin-dashboard/history/<int:showtime_id>/seats/", admin_views.admin_history_seats, name="admin_history_seats"),
+    path("admin-dashboard/history/heatmap/<int:movie_id>/", admin_views.admin_seat_heatmap, name="admin_seat_heatmap"),
     
     # CREATE ADVISOR
     path("admin-dashboard/create-advisor/", admin_views.create_advisor, name="create_advisor"),
@@ -112,6 +121,7 @@ urlpatterns = [
     path("api/chat/send/", advisor_views.send_message, name="send_message"),
     path("api/chat/get/<int:other_user_id>/", advisor_views.get_messages, name="get_messages"),
     path("api/chat/unread/", advisor_views.get_unread_count, name="get_unread_count"),
+    path("api/presence/heartbeat/", advisor_views.presence_heartbeat, name="presence_heartbeat"),
 ]
 
 # MEDIA FILES
@@ -0,0 +1,175 @@
+/* ==============================
+   SUPPORT CHAT (user and advisor pages)
+   New messages arrive over a WebSocket (/ws/chat/<id>/); while it is
+   down the page polls /api/chat/get/<id>/?since_id= instead. Older
+   history loads a page at a time (?before_id=) when scrolled to the top.
+================================= */
+
+function startChat(options) {
+    const chatMessages = options.container;
+    const messageInput = options.input;
+    const sendBtn = options.sendBtn;
+    const url = `/api/chat/get/${options.otherUserId}/`;
+
+    let loaded = false;
+    let newestId = null;
+    let oldestId = null;
+    let hasOlder = false;
+    let polling = false;
+    let loadingOlder = false;
+    let socket = null;
+    let reconnectDelay = 1000;
+
+    function isNearBottom() {
+        return chatMessages.scrollHeight - chatMessages.scrollTop - chatMessages.clientHeight < 50;
+    }
+
+    function scrollToBottom() {
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function appendMessages(messages) {
+        if (!messages.length) return;
+        if (newestId === null) {
+            // Replace the "start the conversation" placeholder
+            chatMessages.innerHTML = '';
+        }
+        const wasAtBottom = isNearBottom();
+        messages.forEach(msg => {
+            if (newestId !== null && msg.id <= newestId) return;
+            chatMessages.appendChild(options.renderMessage(msg));
+            newestId = msg.id;
+            if (oldestId === null) oldestId = msg.id;
+        });
+        if (wasAtBottom) scrollToBottom();
+    }
+
+    async function loadLatest() {
+        try {
+            const response = await fetch(url);
+            const data = await response.json();
+
+            chatMessages.innerHTML = '';
+            if (data.messages.length === 0 && options.emptyHtml) {
+                chatMessages.innerHTML = options.emptyHtml;
+            }
+            appendMessages(data.messages);
+            hasOlder = data.has_more;
+            loaded = true;
+            scrollToBottom();
+        } catch (error) {
+            console.error('Error fetching messages:', error);
+        }
+    }
+
+    async function fetchNew() {
+        if (polling) return;
+        polling = true;
+        try {
+            let more = true;
+            while (more) {
+                const response = await fetch(`${url}?since_id=${newestId || 0}`);
+                const data = await response.json();
+                appendMessages(data.messages);
+                more = data.has_more;
+            }
+        } catch (error) {
+            console.error('Error fetching messages:', error);
+        } finally {
+            polling = false;
+        }
+    }
+
+    async function fetchOlder() {
+        if (loadingOlder || !hasOlder || oldestId === null) return;
+        loadingOlder = true;
+        try {
+            const response = await fetch(`${url}?before_id=${oldestId}`);
+            const data = await response.json();
+
+            // Keep the view where it was while history is inserted above it
+            const previousHeight = chatMessages.scrollHeight;
+            const first = chatMessages.firstChild;
+            data.messages.forEach(msg => chatMessages.insertBefore(options.renderMessage(msg), first));
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+
+            if (data.messages.length) oldestId = data.messages[0].id;
+            hasOlder = data.has_more;
+        } catch (error) {
+            console.error('Error fetching older messages:', error);
+        } finally {
+            loadingOlder = false;
+        }
+    }
+
+    function isConnected() {
+        return socket !== null && socket.readyState === WebSocket.OPEN;
+    }
+
+    function connect() {
+        if (!window.WebSocket || socket !== null) return;
+        const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+        socket = new WebSocket(`${scheme}://${location.host}/ws/chat/${options.otherUserId}/?since_id=${newestId || 0}`);
+
+        socket.onopen = () => {
+            reconnectDelay = 1000;
+        };
+        socket.onmessage = (event) => {
+            appendMessages(JSON.parse(event.data).messages);
+        };
+        socket.onclose = () => {
+            // Poll until the socket is back
+            socket = null;
+            setTimeout(connect, reconnectDelay);
+            reconnectDelay = Math.min(reconnectDelay * 2, 60000);
+        };
+    }
+
+    async function sendMessage() {
+        const text = messageInput.value.trim();
+        if (!text) return;
+
+        try {
+            const response = await fetch('/api/chat/send/', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': options.csrfToken
+                },
+                body: JSON.stringify({
+                    receiver_id: options.otherUserId,
+                    message: text
+                })
+            });
+
+            const data = await response.json();
+            if (data.success) {
+                messageInput.value = '';
+                if (!isConnected()) await fetchNew();
+                scrollToBottom();
+            }
+        } catch (error) {
+            console.error('Error sending message:', error);
+        }
+    }
+
+    sendBtn.addEventListener('click', sendMessage);
+    messageInput.addEventListener('keypress', (e) => {
+        if (e.key === 'Enter') sendMessage();
+    });
+    chatMessages.addEventListener('scroll', () => {
+        if (chatMessages.scrollTop < 50) fetchOlder();
+    });
+
+    // Fallback: poll every second while the socket is down
+    setInterval(() => {
+        if (isConnected()) return;
+        if (loaded) {
+            fetchNew();
+        } else {
+            loadLatest();
+        }
+    }, 1000);
+
+    loadLatest().then(connect);
+}
@@ -0,0 +1,36 @@
+/* ==============================
+   PRESENCE HEARTBEATS
+   Tells the server this user is around while the page is open and
+   visible; the server answers with when to send the next one.
+================================= */
+
+(function () {
+    const script = document.currentScript;
+    const url = script.dataset.url;
+    const csrfToken = script.dataset.csrf;
+    let delay = 30;
+    let timer = null;
+
+    async function beat() {
+        clearTimeout(timer);
+        if (document.visibilityState !== 'hidden') {
+            try {
+                const response = await fetch(url, {
+                    method: 'POST',
+                    headers: { 'X-CSRFToken': csrfToken }
+                });
+                const data = await response.json();
+                if (data.next) delay = data.next;
+            } catch (error) {
+                console.error('Heartbeat failed:', error);
+            }
+        }
+        timer = setTimeout(beat, delay * 1000);
+    }
+
+    document.addEventListener('visibilitychange', () => {
+        if (document.visibilityState === 'visible') beat();
+    });
+
+    beat();
+})();
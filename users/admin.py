@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Movie, Booking
+from .models import CustomUser, Movie, Booking, Showtime, Job
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -11,15 +11,33 @@ class CustomUserAdmin(UserAdmin):
         (None, {'fields': ('balance', 'customer_id', 'phone', 'address', 'city', 'zip_code')}),
     )
 
+class ShowtimeInline(admin.TabularInline):
+    model = Showtime
+    extra = 1
+
 class MovieAdmin(admin.ModelAdmin):
+    inlines = [ShowtimeInline]
     list_display = ['title', 'category', 'price', 'duration', 'coming_soon', 'scheduled_date']
     list_filter = ['category', 'coming_soon']
     list_editable = ['coming_soon']
     search_fields = ['title', 'genre']
 
+class ShowtimeAdmin(admin.ModelAdmin):
+    list_display = ['movie', 'starts_at', 'hall']
+    list_filter = ['hall']
+    date_hierarchy = 'starts_at'
+
 class BookingAdmin(admin.ModelAdmin):
     list_display = ['user', 'movie_name', 'date', 'time', 'created_at']
+    raw_id_fields = ['showtime']
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'run_at', 'created_at', 'finished_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['locked_by', 'last_error', 'created_at', 'finished_at']
 
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Movie, MovieAdmin)
+admin.site.register(Showtime, ShowtimeAdmin)
 admin.site.register(Booking, BookingAdmin)
+admin.site.register(Job, JobAdmin)
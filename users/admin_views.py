@@ -1,12 +1,27 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.paginator import Paginator
 from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 import os
+from datetime import timedelta
 from django.conf import settings
 
-from .models import Movie, Booking, CustomUser
+from .models import Movie, Booking, CustomUser, Showtime
 from .forms import MovieForm
+from . import booking_service
+from .seating import forget_default_showtime, showtime_reservations, sync_scheduled_showtime
+from .seatmap import CAPACITY, seat_index
+from .kpis import get_kpis
+from .pagination import KeysetPaginator
+from .timeseries import TimeseriesError, parse_bound, timeseries
+from .search import search as search_records
+from .exports import FORMATS, export, filter_bookings, filter_records, stream_in_thread
+
+# Most results a search box shows, best match first
+SEARCH_RESULTS = 50
 
 
 # --- Helper: Allow only admin users ---
@@ -14,54 +29,69 @@ def is_admin(user):
     return user.is_superuser
 
 
+# --- Helper: current filters, for the pager's next/previous links ---
+def filter_query(request):
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    return params.urlencode()
+
+
 # ================================
 # ADMIN DASHBOARD HOME
 # ================================
 @login_required
 @user_passes_test(is_admin)
 def admin_dashboard(request):
+    names = ("total_users", "sales_totals", "popular_movies", "recent_bookings")
 
-    total_users = CustomUser.objects.count()
-    total_bookings = Booking.objects.count()
-
-    # Recent bookings
-    recent_bookings = Booking.objects.order_by("-created_at")[:8]
-
-    # Build chart data
-    from django.db.models import Count
-    chart_data = (
-        Booking.objects.values("date")
-        .annotate(count=Count("id"))
-        .order_by("date")
-    )
+    # Figures come from the KPI cache; POSTing the refresh form recomputes them
+    if request.method == "POST":
+        get_kpis(*names, refresh=True)
+        return redirect("admin_dashboard")
 
-    chart_dates = [entry["date"].strftime("%Y-%m-%d") for entry in chart_data]
-    chart_counts = [entry["count"] for entry in chart_data]
+    kpis, computed_at = get_kpis(*names)
 
-    # Popular movies
-    popular_movies = (
-        Booking.objects.values("movie_name")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:5]
-    )
+    return render(request, "admin/dashboard.html", {
+        "total_users": kpis["total_users"],
+        "total_bookings": kpis["sales_totals"]["bookings"],
+        "total_revenue": kpis["sales_totals"]["revenue"],
+        "recent_bookings": kpis["recent_bookings"][:8],
+        "popular_movies": kpis["popular_movies"],
+        "computed_at": computed_at,
+        "chart_days": getattr(settings, "DASHBOARD_CHART_DAYS", 90),
+    })
 
-    # Calculate total revenue
-    total_revenue = 0
-    all_bookings = Booking.objects.all()
-    for b in all_bookings:
-        m = Movie.objects.filter(title=b.movie_name).first()
-        if m:
-            seat_count = len(b.seats.split(","))
-            total_revenue += m.price * seat_count
 
-    return render(request, "admin/dashboard.html", {
-        "total_users": total_users,
-        "total_bookings": total_bookings,
-        "total_revenue": total_revenue,
-        "recent_bookings": recent_bookings,
-        "popular_movies": popular_movies,
-        "chart_dates": chart_dates,
-        "chart_counts": chart_counts,
+# ================================
+# ADMIN — TIMESERIES API (dashboard chart)
+# ================================
+@login_required
+@user_passes_test(is_admin)
+def api_timeseries(request):
+    """
+    ?metric=bookings|seats|revenue|new_users&bucket=hour|day|week|month
+    &from=&to= (dates or ISO datetimes; the last DASHBOARD_CHART_DAYS days
+    by default).
+    """
+    metric = request.GET.get("metric", "bookings")
+    bucket = request.GET.get("bucket", "day")
+    try:
+        end = parse_bound(request.GET.get("to"), end=True) or parse_bound(
+            timezone.localdate().isoformat(), end=True
+        )
+        start = parse_bound(request.GET.get("from")) or end - timedelta(
+            days=getattr(settings, "DASHBOARD_CHART_DAYS", 90)
+        )
+        points = timeseries(metric, start, end, bucket)
+    except TimeseriesError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({
+        "metric": metric,
+        "bucket": bucket,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "points": points,
     })
 
 
@@ -73,19 +103,22 @@ def admin_dashboard(request):
 def admin_users(request):
 
     search = request.GET.get("q", "")
+    sort = request.GET.get("sort", "")
 
-    users = CustomUser.objects.all().order_by("id")
+    # Both orderings are served by an index (user_total_spent_idx, user_joined_idx)
+    ordering = ("-total_spent", "id") if sort == "spent" else ("date_joined", "id")
 
     if search:
-        users = users.filter(email__icontains=search)
-
-    paginator = Paginator(users, 10)
-    page = request.GET.get("page")
-    users_page = paginator.get_page(page)
+        # Ranked matches on email, name, phone, customer id (see users/search.py)
+        users_page = search_records("user", search, limit=SEARCH_RESULTS)
+    else:
+        users_page = KeysetPaginator(CustomUser.objects.all(), ordering, 10).get_page(request.GET.get("cursor"))
 
     return render(request, "admin/users.html", {
         "users": users_page,
         "search_query": search,
+        "sort": sort,
+        "filter_query": filter_query(request),
     })
 
 
@@ -101,7 +134,7 @@ def delete_user_admin(request, user_id):
         messages.error(request, "⚠️ You cannot delete super admin accounts.")
         return redirect("admin_users")
 
-    user.delete()
+    booking_service.delete_user(user)
     messages.success(request, "✔ User deleted successfully.")
     return redirect("admin_users")
 
@@ -113,16 +146,43 @@ def delete_user_admin(request, user_id):
 @user_passes_test(is_admin)
 def admin_bookings(request):
 
-    bookings = Booking.objects.all().order_by("-created_at")
-    paginator = Paginator(bookings, 12)
-    page = request.GET.get("page")
-    bookings_page = paginator.get_page(page)
+    bookings = filter_bookings(request.GET).select_related("user")
+    bookings_page = KeysetPaginator(bookings, ("-created_at", "-id"), 12).get_page(request.GET.get("cursor"))
 
     return render(request, "admin/bookings.html", {
-        "bookings": bookings_page
+        "bookings": bookings_page,
+        "filters": request.GET,
+        "filter_query": filter_query(request),
     })
 
 
+@login_required
+@user_passes_test(is_admin)
+def export_records(request, kind):
+    """
+    Download the bookings matching the admin filters, or the customers or
+    daily revenue per movie (see users/exports.py for each kind's filters),
+    as CSV (default) or NDJSON (?format=ndjson), gzipped with ?gzip=1.
+    Streamed from a worker thread, a chunk of rows at a time.
+    """
+    fmt = request.GET.get("format", "csv")
+    if fmt not in FORMATS:
+        fmt = "csv"
+    compress = request.GET.get("gzip") == "1"
+    records = filter_records(kind, request.GET)
+
+    filename = f"{kind}-{timezone.localdate():%Y%m%d}.{fmt}"
+    if compress:
+        filename += ".gz"
+    response = StreamingHttpResponse(
+        stream_in_thread(lambda: export(kind, records, fmt, compress)),
+        content_type="application/gzip" if compress else FORMATS[fmt],
+    )
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 # ================================
 # DELETE BOOKING
 # ================================
@@ -131,7 +191,7 @@ def admin_bookings(request):
 def delete_booking_admin(request, booking_id):
 
     booking = get_object_or_404(Booking, id=booking_id)
-    booking.delete()
+    booking_service.cancel_booking(booking, 0)
 
     messages.success(request, "✔ Booking deleted successfully.")
     return redirect("admin_bookings")
@@ -142,7 +202,7 @@ def delete_booking_admin(request, booking_id):
 def cancel_booking(request, booking_id):
 
     booking = get_object_or_404(Booking, id=booking_id)
-    booking.delete()
+    booking_service.cancel_booking(booking, 0)
 
     messages.success(request, "✔ Booking cancelled successfully.")
     return redirect("admin_bookings")
@@ -156,18 +216,17 @@ def cancel_booking(request, booking_id):
 def admin_movies(request):
 
     q = request.GET.get("q", "")
-    movies_qs = Movie.objects.all().order_by("-id")
+    movies_qs = Movie.objects.all()
 
     if q:
         movies_qs = movies_qs.filter(title__icontains=q)
 
-    paginator = Paginator(movies_qs, 20)
-    page = request.GET.get("page")
-    movies_page = paginator.get_page(page)
+    movies_page = KeysetPaginator(movies_qs, ("-id",), 20).get_page(request.GET.get("cursor"))
 
     return render(request, "admin/admin_movies.html", {
         "movies": movies_page,
-        "q": q
+        "q": q,
+        "filter_query": filter_query(request),
     })
 
 
@@ -177,7 +236,8 @@ def admin_movie_add(request):
     if request.method == "POST":
         form = MovieForm(request.POST, request.FILES)
         if form.is_valid():
-            form.save()
+            movie = form.save()
+            sync_scheduled_showtime(movie)
             messages.success(request, "✔ Movie added.")
             return redirect("admin_movies")
     else:
@@ -195,6 +255,8 @@ def admin_movie_edit(request, movie_id):
 
     movie = get_object_or_404(Movie, id=movie_id)
     old_poster = movie.poster.path if movie.poster else None
+    old_title = movie.title
+    old_scheduled_date = movie.scheduled_date
 
     if request.method == "POST":
         form = MovieForm(request.POST, request.FILES, instance=movie)
@@ -208,6 +270,8 @@ def admin_movie_edit(request, movie_id):
                     pass
 
             form.save()
+            sync_scheduled_showtime(movie, old_scheduled_date)
+            forget_default_showtime(old_title)
             messages.success(request, "✔ Movie updated.")
             return redirect("admin_movies")
 
@@ -237,6 +301,7 @@ def admin_movie_delete(request, movie_id):
                 pass
 
         movie.delete()
+        forget_default_showtime(movie.title)
         messages.success(request, "✔ Movie deleted.")
         return redirect("admin_movies")
 
@@ -257,9 +322,12 @@ def admin_user_detail(request, user_id):
     user = get_object_or_404(CustomUser, id=user_id)
     bookings = Booking.objects.filter(user=user).order_by("-created_at")
 
+    totals = {"bookings": user.booking_count, "spent": user.total_spent}
+
     return render(request, "admin/admin_user_detail.html", {
         "user_obj": user,
         "bookings": bookings,
+        "totals": totals,
     })
 
 
@@ -269,31 +337,45 @@ def admin_user_detail(request, user_id):
 @login_required
 @user_passes_test(is_admin)
 def admin_history(request):
-    movies = Movie.objects.all().order_by("-scheduled_date")
-    
-    events_data = []
-    for movie in movies:
-        # Calculate tickets sold
-        # Assuming 'seats' in Booking is a comma-separated string like "A1,A2"
-        # We need to sum the number of seats for all bookings of this movie
-        bookings = Booking.objects.filter(movie_name=movie.title)
-        tickets_sold = 0
-        seats_booked = []
-        for booking in bookings:
-            if booking.seats:
-                seat_list = booking.seats.split(',')
-                tickets_sold += len(seat_list)
-                seats_booked.extend(seat_list)
-        
-        events_data.append({
-            'name': movie.title,
-            'category': movie.category,
-            'tickets_sold': tickets_sold,
-            'seats_booked': ', '.join(seats_booked) if seats_booked else 'None',
-            'performance_date': movie.scheduled_date
-        })
-
-    return render(request, "admin/history.html", {"events": events_data})
+    # Tickets sold per performance in one grouped query over the stored seat
+    # counts; seat lists are fetched per row by admin_history_seats
+    performances = (
+        Showtime.objects.select_related("movie")
+        .annotate(tickets_sold=Coalesce(Sum("bookings__seat_count"), 0))
+    )
+    performances_page = KeysetPaginator(performances, ("-starts_at", "-id"), 25).get_page(request.GET.get("cursor"))
+
+    for showtime in performances_page:
+        showtime.capacity = CAPACITY
+        showtime.fill = round(100 * showtime.tickets_sold / CAPACITY)
+
+    events = Movie.objects.order_by("title").values("id", "title", "category")
+
+    return render(request, "admin/history.html", {
+        "events": events,
+        "performances": performances_page,
+        "filter_query": filter_query(request),
+    })
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_history_seats(request, showtime_id):
+    """Booked seats of one performance, loaded when its row is expanded."""
+    showtime = get_object_or_404(Showtime, id=showtime_id)
+    seats = showtime_reservations(showtime.pk).filter(booking__isnull=False).values_list("seat_id", flat=True)
+    seats = sorted(seats, key=lambda seat: (seat_index(seat) is None, seat_index(seat) or 0, seat))
+    return JsonResponse({"showtime": showtime.pk, "seats": seats})
+
+
+@login_required
+@user_passes_test(is_admin)
+def admin_seat_heatmap(request, movie_id):
+    """Per-seat sales analytics of a movie for the history page heatmap."""
+    from .seat_analytics import seat_analytics
+
+    movie = get_object_or_404(Movie, id=movie_id)
+    return JsonResponse(seat_analytics(movie.pk, refresh=request.GET.get("refresh") == "1"))
 
 
 # ================================
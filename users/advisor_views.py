@@ -1,9 +1,20 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
-from django.db.models import Q
+from django.db import transaction
 from django.utils import timezone
-from .models import CustomUser, ChatMessage
+from .models import CustomUser, ChatMessage, Conversation
+from .chat import (
+    mark_conversation_read,
+    mark_page_read,
+    message_page,
+    notify_new_message,
+    record_message,
+    serialize_message,
+    unread_count,
+)
+from .presence import advisors_with_status, heartbeat, online_advisor_ids
 import json
 
 # --- Helper: Check if user is advisor ---
@@ -17,24 +28,16 @@ def is_advisor(user):
 @user_passes_test(is_advisor)
 def advisor_dashboard(request):
     """
-    Advisor sees a list of users who have chatted or are online.
-    For simplicity, we'll list all users who have sent a message or are recently active.
+    Advisor sees their conversations, most recent first, with unread counts.
     """
-    # Get users who have sent messages or are recently active
-    # We can also just list all users for now, or filter by those who initiated chat
-    
-    # Get distinct users involved in chats
-    # Get distinct users who have chatted with THIS advisor
-    chat_users = CustomUser.objects.filter(
-        Q(sent_messages__receiver=request.user) | 
-        Q(received_messages__sender=request.user)
-    ).distinct()
-
-    # Annotate with last message time or unread count if needed
-    # For now, just pass the list
-    
+    conversations = (
+        Conversation.objects.filter(advisor=request.user)
+        .select_related("user")
+        .order_by("-last_message_at")
+    )
+
     return render(request, "advisor/dashboard.html", {
-        "chat_users": chat_users
+        "conversations": conversations
     })
 
 @login_required
@@ -46,7 +49,7 @@ def advisor_chat(request, user_id):
     other_user = get_object_or_404(CustomUser, id=user_id)
     
     # Mark messages from this user as read
-    ChatMessage.objects.filter(sender=other_user, receiver=request.user, is_read=False).update(is_read=True)
+    mark_conversation_read(request.user, other_user)
     
     return render(request, "advisor/chat.html", {
         "other_user": other_user
@@ -93,27 +96,35 @@ def advisor_list(request):
         advisors = CustomUser.objects.filter(is_superuser=True)
         
     return render(request, "advisor_list.html", {
-        "advisors": advisors
+        "advisors": advisors,
+        "online_ids": online_advisor_ids(),
     })
 
 def api_get_advisors(request):
     """
-    API to get list of advisors for the popup
+    API to get list of advisors for the popup, online ones first. Served
+    from the cache (see users/presence.py), so it is cheap to poll.
     """
-    advisors = CustomUser.objects.filter(is_advisor=True)
-    if not advisors.exists():
-        advisors = CustomUser.objects.filter(is_superuser=True)
-    
-    data = []
-    for adv in advisors:
-        data.append({
-            "id": adv.id,
-            "name": f"{adv.first_name} {adv.last_name}" if adv.first_name else adv.username,
-            "status": "Online" # Simplified for now
-        })
-    
+    data = [{
+        "id": adv["id"],
+        "name": adv["name"],
+        "status": adv["status"],
+        "last_seen": adv["last_seen"].isoformat() if adv["last_seen"] else None,
+    } for adv in advisors_with_status()]
+
     return JsonResponse({"advisors": data})
 
+@login_required
+def presence_heartbeat(request):
+    """
+    Pages with a logged-in user POST here every PRESENCE_HEARTBEAT_INTERVAL
+    seconds (the reply says when to send the next one).
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "error": "Invalid method"}, status=405)
+    heartbeat(request.user)
+    return JsonResponse({"success": True, "next": getattr(settings, "PRESENCE_HEARTBEAT_INTERVAL", 30)})
+
 @login_required
 def user_chat(request, advisor_id=None):
     """
@@ -129,18 +140,22 @@ def user_chat(request, advisor_id=None):
              return redirect('advisor_list')
     else:
         # Try to find last chatted advisor
-        last_msg = ChatMessage.objects.filter(
-            Q(sender=request.user) | Q(receiver=request.user)
-        ).filter(
-            Q(sender__is_advisor=True) | Q(receiver__is_advisor=True)
-        ).order_by("-timestamp").first()
-        
-        if last_msg:
-            advisor = last_msg.receiver if last_msg.sender == request.user else last_msg.sender
+        last_conversation = (
+            Conversation.objects.filter(user=request.user)
+            .select_related("advisor")
+            .order_by("-last_message_at")
+            .first()
+        )
+
+        if last_conversation:
+            advisor = last_conversation.advisor
         else:
             # No history, redirect to list
             return redirect('advisor_list')
 
+    # Mark messages from this advisor as read
+    mark_conversation_read(request.user, advisor)
+
     return render(request, "user_chat.html", {
         "advisor": advisor
     })
@@ -161,20 +176,18 @@ def send_message(request):
             
             receiver = get_object_or_404(CustomUser, id=receiver_id)
             
-            msg = ChatMessage.objects.create(
-                sender=request.user,
-                receiver=receiver,
-                message=message_text
-            )
+            with transaction.atomic():
+                msg = ChatMessage.objects.create(
+                    sender=request.user,
+                    receiver=receiver,
+                    message=message_text
+                )
+                record_message(msg)
+                notify_new_message(msg)
             
             return JsonResponse({
                 "success": True,
-                "message": {
-                    "id": msg.id,
-                    "text": msg.message,
-                    "timestamp": msg.timestamp.strftime("%H:%M"),
-                    "sender_id": msg.sender.id
-                }
+                "message": serialize_message(msg, request.user)
             })
         except Exception as e:
             return JsonResponse({"success": False, "error": str(e)})
@@ -184,29 +197,28 @@ def send_message(request):
 @login_required
 def get_messages(request, other_user_id):
     """
-    Get messages between request.user and other_user_id
+    Messages between request.user and other_user_id, a page at a time:
+    ?since_id=<id> for new messages (polling), ?before_id=<id> for older
+    history (scrolling up), neither for the latest page.
     """
     other_user = get_object_or_404(CustomUser, id=other_user_id)
-    
-    messages = ChatMessage.objects.filter(
-        Q(sender=request.user, receiver=other_user) | 
-        Q(sender=other_user, receiver=request.user)
-    ).order_by("timestamp")
-    
-    # Mark as read if receiving
-    ChatMessage.objects.filter(sender=other_user, receiver=request.user, is_read=False).update(is_read=True)
-    
-    data = [{
-        "id": m.id,
-        "text": m.message,
-        "timestamp": m.timestamp.strftime("%H:%M"),
-        "sender_id": m.sender.id,
-        "is_mine": m.sender.id == request.user.id
-    } for m in messages]
-    
-    return JsonResponse({"messages": data})
+
+    try:
+        since_id = int(request.GET["since_id"]) if request.GET.get("since_id") else None
+        before_id = int(request.GET["before_id"]) if request.GET.get("before_id") else None
+    except ValueError:
+        return JsonResponse({"error": "since_id and before_id must be message ids"}, status=400)
+
+    messages, has_more = message_page(request.user, other_user, since_id=since_id, before_id=before_id)
+
+    # Mark as read if receiving (older unread ones too, on the latest page)
+    mark_page_read(request.user, other_user, messages, since_id=since_id, before_id=before_id)
+
+    return JsonResponse({
+        "messages": [serialize_message(m, request.user) for m in messages],
+        "has_more": has_more,
+    })
 
 @login_required
 def get_unread_count(request):
-    count = ChatMessage.objects.filter(receiver=request.user, is_read=False).count()
-    return JsonResponse({"unread_count": count})
+    return JsonResponse({"unread_count": unread_count(request.user.id)})
@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # Connects the signals that keep the dashboard KPI and advisor directory caches current
+        from . import kpis, presence  # noqa: F401
+        from .search import on_post_migrate
+
+        # SQLite search shadow tables and triggers, recreated after any table rebuild
+        post_migrate.connect(on_post_migrate, sender=self)
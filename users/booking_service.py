@@ -0,0 +1,223 @@
+# users/booking_service.py
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Booking, CustomUser, SeatReservation
+from .rollups import record_booking, record_cancellation, record_cancellations, sales_of
+from .seatmap import refresh_seat_map
+from .tickets import next_ticket_number
+from .seating import (
+    find_conflicting_seats, hold_seats, normalize_seats, purge_expired_holds, reserve_seats, showtime_date_time,
+    showtime_reservations,
+)
+
+
+class BookingError(Exception):
+    """Base class for booking failures that should be shown to the user."""
+    error_type = "booking_error"
+
+
+class InvalidSeats(BookingError):
+    error_type = "invalid_seats"
+
+    def __init__(self, seats):
+        self.seats = seats
+        super().__init__(f"⚠️ Invalid seat(s): {', '.join(seats)}")
+
+
+class SeatsUnavailable(BookingError):
+    error_type = "seats_unavailable"
+
+    def __init__(self, seats):
+        self.seats = seats
+        super().__init__(f"❌ Seat(s) already booked or held: {', '.join(seats)}")
+
+
+class InsufficientFunds(BookingError):
+    error_type = "insufficient_funds"
+
+    def __init__(self, total_cost, balance):
+        self.total_cost = total_cost
+        self.balance = balance
+        super().__init__(f"❌ Insufficient funds. Cost: KSH {total_cost}, Balance: KSH {balance}")
+
+
+def _valid_seats(seat_list):
+    """seat_list in canonical form. Raises InvalidSeats for ids not in the hall."""
+    seats, invalid = normalize_seats(seat_list)
+    if invalid:
+        raise InvalidSeats(invalid)
+    return seats
+
+
+def _retry_delay(attempt):
+    """Exponential backoff with jitter so retrying workers don't collide again."""
+    base = getattr(settings, "BOOKING_RETRY_BACKOFF", 0.05)
+    return base * (2 ** attempt) * (0.5 + random.random())
+
+
+def _claim_seats(work, user, showtime_id, seat_list):
+    """
+    Run work() in a transaction, retrying lock waits ("database is locked" on
+    SQLite, deadlocks/serialization failures on Postgres) with backoff. A clash
+    on the seat index is reported as SeatsUnavailable.
+    """
+    max_retries = getattr(settings, "BOOKING_MAX_RETRIES", 5)
+
+    for attempt in range(max_retries + 1):
+        try:
+            with transaction.atomic():
+                return work()
+        except IntegrityError:
+            # Another buyer committed one of these seats first. Look the
+            # conflict up outside the failed transaction; if it has vanished
+            # (the other booking rolled back) simply try again.
+            conflicts = find_conflicting_seats(showtime_id, seat_list, user)
+            if conflicts:
+                raise SeatsUnavailable(conflicts)
+            if attempt == max_retries:
+                raise
+        except OperationalError:
+            if attempt == max_retries:
+                raise
+        time.sleep(_retry_delay(attempt))
+
+
+def book_seats(user, showtime, seat_list, unit_price):
+    """
+    Book seat_list for a showtime and charge the user, as one atomic unit.
+
+    Seats are claimed by inserting SeatReservation rows (or converting the
+    user's own holds), so the unique index decides which of two concurrent
+    buyers wins. The wallet is debited with a conditional UPDATE
+    (balance >= cost) instead of a read-modify-write, so parallel bookings
+    can never overdraw or lose a balance update; the same UPDATE adds the
+    booking to the user's total_spent and booking_count.
+
+    Returns (booking, total_cost). Raises InvalidSeats, SeatsUnavailable or
+    InsufficientFunds.
+    """
+    seat_list = _valid_seats(seat_list)
+    total_cost = unit_price * len(seat_list)
+    date, time_str = showtime_date_time(showtime)
+    # Drawn before the transaction so refilling the number block never waits on it
+    ticket_number = next_ticket_number()
+
+    def work():
+        purge_expired_holds(showtime.pk, seat_list, keep_holder=user)
+        booking = Booking.objects.create(
+            user=user,
+            showtime=showtime,
+            movie_name=showtime.movie.title,
+            date=date,
+            time=time_str,
+            seats=",".join(seat_list),
+            seat_count=len(seat_list),
+            unit_price=unit_price,
+            total_paid=total_cost,
+            ticket_number=ticket_number,
+        )
+        reserve_seats(booking, seat_list)
+
+        charged = CustomUser.objects.filter(
+            pk=user.pk, balance__gte=total_cost
+        ).update(
+            balance=F("balance") - total_cost,
+            total_spent=F("total_spent") + total_cost,
+            booking_count=F("booking_count") + 1,
+        )
+        if not charged:
+            raise InsufficientFunds(total_cost, _current_balance(user))
+
+        refresh_seat_map(showtime.pk)
+        # Last, so the shared per-day row is locked only until commit
+        record_booking(booking)
+        return booking
+
+    booking = _claim_seats(work, user, showtime.pk, seat_list)
+    user.refresh_from_db(fields=["balance", "total_spent", "booking_count"])
+    return booking, total_cost
+
+
+def place_hold(user, showtime_id, seat_list):
+    """
+    Hold seat_list for the user for SEAT_HOLD_MINUTES while they check out,
+    replacing whatever they held before for this showtime.
+
+    Returns the hold expiry. Raises InvalidSeats or SeatsUnavailable.
+    """
+    seat_list = _valid_seats(seat_list)
+    held_until = timezone.now() + timedelta(minutes=getattr(settings, "SEAT_HOLD_MINUTES", 10))
+
+    def work():
+        purge_expired_holds(showtime_id, seat_list, keep_holder=user)
+        hold_seats(user, showtime_id, seat_list, held_until)
+        refresh_seat_map(showtime_id)
+        return held_until
+
+    return _claim_seats(work, user, showtime_id, seat_list)
+
+
+def release_holds(user, showtime_id):
+    """Drop every hold the user has for the showtime."""
+    with transaction.atomic():
+        showtime_reservations(showtime_id).filter(booking__isnull=True, holder=user).delete()
+        refresh_seat_map(showtime_id)
+
+
+def cancel_booking(booking, refund_amount):
+    """
+    Delete a booking (releasing its seats) and refund the owner atomically.
+    Only the request that actually deletes the row issues the refund, so a
+    double-submitted cancel can't credit the wallet twice.
+
+    Returns True if this call cancelled the booking.
+    """
+    with transaction.atomic():
+        showtime_ids = set(booking.reservations.values_list("showtime_id", flat=True))
+        _, deleted = Booking.objects.filter(pk=booking.pk).delete()
+        if not deleted.get(Booking._meta.label):
+            return False
+        # The booking no longer counts towards the customer's spend,
+        # refunded or not
+        CustomUser.objects.filter(pk=booking.user_id).update(
+            balance=F("balance") + refund_amount,
+            total_spent=F("total_spent") - booking.total_paid,
+            booking_count=F("booking_count") - 1,
+        )
+        for showtime_id in showtime_ids:
+            refresh_seat_map(showtime_id)
+        # Last, in the same order as book_seats, so the shared per-day row
+        # is locked only until commit and the two can't deadlock
+        record_cancellation(booking)
+    return True
+
+
+def delete_user(user):
+    """
+    Delete a user account, then rebuild the seat maps of every showtime its
+    cascaded bookings and holds were freeing up and take the bookings out of
+    the daily sales.
+    """
+    with transaction.atomic():
+        sales = sales_of(Booking.objects.filter(user=user))
+        showtimes = set(
+            SeatReservation.objects.filter(Q(booking__user=user) | Q(holder=user))
+            .values_list("showtime_id", flat=True)
+            .distinct()
+        )
+        user.delete()
+        for showtime_id in showtimes:
+            refresh_seat_map(showtime_id)
+        # Last, as in book_seats (see cancel_booking)
+        record_cancellations(sales)
+
+
+def _current_balance(user):
+    return CustomUser.objects.filter(pk=user.pk).values_list("balance", flat=True).first()
@@ -0,0 +1,335 @@
+# users/chat.py
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, PositiveIntegerField, Q, When
+from django.db.models.functions import Greatest
+
+from .models import ChatMessage, Conversation
+from .realtime import chat_feed
+
+# Characters of the last message shown on the advisor dashboard
+PREVIEW_LENGTH = 100
+
+
+def serialize_message(message, user):
+    return {
+        "id": message.id,
+        "text": message.message,
+        "timestamp": message.timestamp.strftime("%H:%M"),
+        "sender_id": message.sender_id,
+        "is_mine": message.sender_id == user.id,
+    }
+
+
+def conversation(user, other_user):
+    """Every message between the two users, either way."""
+    return ChatMessage.objects.filter(
+        Q(sender=user, receiver=other_user) | Q(sender=other_user, receiver=user)
+    )
+
+
+# ================================
+# CURSOR PAGES
+# ================================
+def message_page(user, other_user, since_id=None, before_id=None, limit=None):
+    """
+    One page of the conversation, oldest first, as (messages, has_more).
+
+    - since_id: messages newer than it (what a poll asks for); has_more
+      means more new ones are waiting beyond this page.
+    - before_id: the page of history just before it (scrolling up);
+      has_more means there is older history still.
+    - neither: the latest page; has_more means there is older history.
+
+    Every page is a range over the primary key, so a poll costs the same
+    however long the conversation is.
+    """
+    limit = limit or getattr(settings, "CHAT_PAGE_SIZE", 50)
+    messages = conversation(user, other_user)
+
+    if since_id is not None:
+        rows = list(messages.filter(id__gt=since_id).order_by("id")[:limit + 1])
+        return rows[:limit], len(rows) > limit
+
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+    rows = list(messages.order_by("-id")[:limit + 1])
+    return rows[:limit][::-1], len(rows) > limit
+
+
+def mark_read(user, other_user, through_id=None):
+    """
+    Mark everything other_user sent `user` (up to message through_id, if
+    given) as read. Returns how many it marked.
+    """
+    unread = ChatMessage.objects.filter(sender=other_user, receiver=user, is_read=False)
+    if through_id is not None:
+        unread = unread.filter(id__lte=through_id)
+    with transaction.atomic():
+        marked = unread.update(is_read=True)
+        if marked:
+            _read(user.id, other_user.id, marked)
+            _forget_unread(user.id)
+    return marked
+
+
+def mark_page_read(user, other_user, messages, since_id=None, before_id=None):
+    """
+    Mark what a message_page() showed `user` as read. The latest page and
+    new messages (since_id) read everything up to the newest one shown,
+    including unread messages older than the page; history pages
+    (before_id) are behind that already. A poll only writes when it
+    brought unread messages. Returns how many it marked.
+    """
+    if not messages or before_id is not None:
+        return 0
+    if since_id is not None and not any(m.receiver_id == user.id and not m.is_read for m in messages):
+        return 0
+    return mark_read(user, other_user, through_id=messages[-1].id)
+
+
+def mark_conversation_read(user, other_user):
+    """Mark everything `user` received from other_user as read."""
+    return mark_read(user, other_user)
+
+
+# ================================
+# CONVERSATIONS
+# ================================
+def _is_advisor(user):
+    return user.is_advisor or user.is_superuser
+
+
+def _pair(user_id, other_user_id):
+    return Conversation.objects.filter(
+        Q(user_id=user_id, advisor_id=other_user_id) | Q(user_id=other_user_id, advisor_id=user_id)
+    )
+
+
+def _unread_change(side, reader_id, change):
+    """`side`'s unread counter changed by `change` if reader_id is on that side."""
+    return Case(
+        When(**{f"{side}_id": reader_id}, then=change),
+        default=F(f"{side}_unread"),
+        output_field=PositiveIntegerField(),
+    )
+
+
+def record_message(message):
+    """
+    Move the message's conversation to the top: last message time and
+    preview, plus one unread for the receiver. Creates the conversation on
+    the first message; the advisor is the side that is one (or, between two
+    advisors or two customers, the receiver). Call it in the transaction
+    that saved the message.
+    """
+    sender, receiver = message.sender, message.receiver
+    _count_sent(receiver.id)
+    pair = _pair(sender.id, receiver.id)
+    preview = message.message[:PREVIEW_LENGTH]
+    changes = dict(
+        last_message_at=message.timestamp,
+        last_message=preview,
+        user_unread=_unread_change("user", receiver.id, F("user_unread") + 1),
+        advisor_unread=_unread_change("advisor", receiver.id, F("advisor_unread") + 1),
+    )
+    if pair.update(**changes):
+        return
+
+    user, advisor = (receiver, sender) if _is_advisor(sender) and not _is_advisor(receiver) else (sender, receiver)
+    try:
+        with transaction.atomic():
+            Conversation.objects.create(
+                user=user,
+                advisor=advisor,
+                last_message_at=message.timestamp,
+                last_message=preview,
+                user_unread=int(receiver == user),
+                advisor_unread=int(receiver == advisor),
+            )
+    except IntegrityError:
+        # The other side's first message created it in the meantime
+        pair.update(**changes)
+
+
+def _read(reader_id, other_user_id, count):
+    _pair(reader_id, other_user_id).update(
+        user_unread=_unread_change("user", reader_id, Greatest(F("user_unread") - count, 0)),
+        advisor_unread=_unread_change("advisor", reader_id, Greatest(F("advisor_unread") - count, 0)),
+    )
+
+
+# ================================
+# UNREAD COUNTERS (/api/chat/unread/)
+# ================================
+def _unread_key(user_id):
+    return f"chat_unread:{user_id}"
+
+
+def count_unread(user_id):
+    """Unread messages for the user, counted on the chat_unread_idx partial index."""
+    return ChatMessage.objects.filter(receiver_id=user_id, is_read=False).count()
+
+
+def _generation_key(user_id):
+    return f"chat_unread_gen:{user_id}"
+
+
+def unread_count(user_id):
+    """
+    The user's unread messages from the shared cache, counted from the
+    database on a miss. Sends that commit add one to a cached counter and
+    reads drop it; both bump the user's generation first, and a count that
+    raced with one (its generation changed while counting) is dropped
+    again, so a count taken before a commit never outlives it. A count
+    taken between a send's commit and its increment can stay one high
+    until the next read or CHAT_UNREAD_CACHE_TIMEOUT;
+    `manage.py check_unread_counters` reports drift.
+    """
+    key = _unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        generation = cache.get(_generation_key(user_id))
+        count = count_unread(user_id)
+        cache.add(key, count, getattr(settings, "CHAT_UNREAD_CACHE_TIMEOUT", 300))
+        if cache.get(_generation_key(user_id)) != generation:
+            cache.delete(key)
+    return count
+
+
+def cached_unread_counts(user_ids):
+    """{user_id: cached counter} for those of the users that have one."""
+    cached = cache.get_many([_unread_key(user_id) for user_id in user_ids])
+    return {user_id: cached[_unread_key(user_id)] for user_id in user_ids if _unread_key(user_id) in cached}
+
+
+def _bump_generation(user_id):
+    generation_key = _generation_key(user_id)
+    cache.add(generation_key, 0, getattr(settings, "CHAT_UNREAD_CACHE_TIMEOUT", 300))
+    try:
+        cache.incr(generation_key)
+    except ValueError:
+        # Expired in between; any new value differs from what a reader saw
+        cache.set(generation_key, 1, getattr(settings, "CHAT_UNREAD_CACHE_TIMEOUT", 300))
+
+
+def _forget_unread(user_id):
+    """Drop the user's counter once the transaction that changed it commits."""
+    def forget():
+        _bump_generation(user_id)
+        cache.delete(_unread_key(user_id))
+
+    transaction.on_commit(forget)
+
+
+def _count_sent(user_id):
+    """
+    Add one to the receiver's counter once the send commits, or leave it
+    to the next read to count if there is none. The database cache's incr
+    is a read then a write that concurrent sends could both base on the
+    same value, so there the counter is dropped instead.
+    """
+    def count():
+        _bump_generation(user_id)
+        if isinstance(caches["default"], DatabaseCache):
+            cache.delete(_unread_key(user_id))
+            return
+        try:
+            cache.incr(_unread_key(user_id))
+        except ValueError:
+            pass
+
+    transaction.on_commit(count)
+
+
+# ================================
+# CONSISTENCY CHECKS (manage.py check_unread_counters)
+# ================================
+def _unread_by_direction(user_ids):
+    """{(sender_id, receiver_id): unread messages} among the users."""
+    rows = (
+        ChatMessage.objects.filter(is_read=False, sender_id__in=user_ids, receiver_id__in=user_ids)
+        .values_list("sender_id", "receiver_id")
+        .annotate(unread=Count("id"))
+        .order_by()
+    )
+    return {(sender, receiver): unread for sender, receiver, unread in rows}
+
+
+def check_conversation_counters(fix=False, batch_size=500):
+    """
+    Compare every conversation's unread counters with its unread messages.
+    Returns [(conversation id, (user_unread, advisor_unread) found, those
+    it should have)] for those that differ, correcting them if `fix`.
+    """
+    mismatched = []
+    last_id = 0
+    while True:
+        batch = list(Conversation.objects.filter(id__gt=last_id).order_by("id")[:batch_size])
+        if not batch:
+            return mismatched
+        unread = _unread_by_direction({c.user_id for c in batch} | {c.advisor_id for c in batch})
+        wrong = []
+        for c in batch:
+            found = (c.user_unread, c.advisor_unread)
+            expected = (unread.get((c.advisor_id, c.user_id), 0), unread.get((c.user_id, c.advisor_id), 0))
+            if found != expected:
+                mismatched.append((c.id, found, expected))
+                c.user_unread, c.advisor_unread = expected
+                wrong.append(c)
+        if fix and wrong:
+            Conversation.objects.bulk_update(wrong, ["user_unread", "advisor_unread"])
+        last_id = batch[-1].id
+
+
+def check_cached_unread(fix=False, batch_size=500):
+    """
+    Compare the cached per-user unread counters with the messages. Returns
+    [(user_id, cached, actual)] for those that differ, dropping them from
+    the cache if `fix` so the next read recounts. Reads the cache the web
+    workers share (settings.CACHES).
+    """
+    from .models import CustomUser
+
+    mismatched = []
+    last_id = 0
+    while True:
+        user_ids = list(
+            CustomUser.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return mismatched
+        cached = cached_unread_counts(user_ids)
+        if cached:
+            actual = dict(
+                ChatMessage.objects.filter(is_read=False, receiver_id__in=list(cached))
+                .values_list("receiver_id")
+                .annotate(unread=Count("id"))
+                .order_by()
+            )
+            wrong = [(user_id, count, actual.get(user_id, 0)) for user_id, count in cached.items()
+                     if count != actual.get(user_id, 0)]
+            mismatched += wrong
+            if fix and wrong:
+                cache.delete_many([_unread_key(user_id) for user_id, _, _ in wrong])
+        last_id = user_ids[-1]
+
+
+# ================================
+# LIVE DELIVERY (/ws/chat/<id>/)
+# ================================
+def deliver_new(user, other_user, since_id):
+    """
+    The next page of messages newer than since_id, serialized and marked
+    read, as (messages, has_more). Used by the chat sockets.
+    """
+    messages, has_more = message_page(user, other_user, since_id=since_id)
+    mark_page_read(user, other_user, messages, since_id=since_id)
+    return [serialize_message(m, user) for m in messages], has_more
+
+
+def notify_new_message(message):
+    """Wake both participants' chat sockets once the message is committed."""
+    transaction.on_commit(lambda: chat_feed.notify(message.sender_id, message.receiver_id))
@@ -8,18 +8,17 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 
 
-def send_registration_email(user, request):
+def send_registration_email(user, base_url):
     """
-    Send an account activation email to newly registered users
+    Send an account activation email to newly registered users.
+    base_url is the site root the links point at, e.g. "https://example.com"
     """
     # Generate activation token
     token = default_token_generator.make_token(user)
     uid = urlsafe_base64_encode(force_bytes(user.pk))
     
     # Build activation URL
-    activation_url = request.build_absolute_uri(
-        f'/activate/{uid}/{token}/'
-    )
+    activation_url = f'{base_url}/activate/{uid}/{token}/'
 
     subject = '🚀 Activate your Gold Cinema Account'
     
@@ -150,7 +149,7 @@ def send_registration_email(user, request):
         return False
 
 
-def send_password_reset_email(user, request):
+def send_password_reset_email(user, base_url):
     """
     Send password reset email with token
     """
@@ -159,9 +158,7 @@ def send_password_reset_email(user, request):
     uid = urlsafe_base64_encode(force_bytes(user.pk))
     
     # Build reset URL
-    reset_url = request.build_absolute_uri(
-        f'/reset-password/{uid}/{token}/'
-    )
+    reset_url = f'{base_url}/reset-password/{uid}/{token}/'
     
     subject = '🔐 Password Reset Request - Gold Cinema'
     
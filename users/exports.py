@@ -0,0 +1,265 @@
+# users/exports.py
+import csv
+import io
+import json
+import queue
+import threading
+import zlib
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+
+from .models import Booking, CustomUser, DailySales
+from .search import exact_filter, text_filter
+
+# Column name -> Booking field, in export order
+BOOKING_COLUMNS = [
+    ("booking_id", "id"),
+    ("ticket_number", "ticket_number"),
+    ("booked_at", "created_at"),
+    ("customer_email", "user__email"),
+    ("customer_id", "user__customer_id"),
+    ("movie", "movie_name"),
+    ("show_date", "date"),
+    ("show_time", "time"),
+    ("seats", "seats"),
+    ("seat_count", "seat_count"),
+    ("unit_price", "unit_price"),
+    ("total_paid", "total_paid"),
+]
+
+# Column name -> CustomUser field, in export order
+USER_COLUMNS = [
+    ("user_id", "id"),
+    ("customer_id", "customer_id"),
+    ("email", "email"),
+    ("first_name", "first_name"),
+    ("last_name", "last_name"),
+    ("phone", "phone"),
+    ("city", "city"),
+    ("joined_at", "date_joined"),
+    ("booking_count", "booking_count"),
+    ("total_spent", "total_spent"),
+    ("balance", "balance"),
+]
+
+# Column name -> DailySales field, in export order
+REVENUE_COLUMNS = [
+    ("day", "day"),
+    ("movie_id", "movie_id"),
+    ("movie", "title"),
+    ("bookings", "bookings"),
+    ("seats", "seats"),
+    ("revenue", "revenue"),
+]
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Bytes gathered before a piece of the export is written out
+WRITE_SIZE = 64 * 1024
+
+
+# ================================
+# FILTERS (bookings shared with the admin bookings table)
+# ================================
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def filter_bookings(params):
+    """
+    Bookings matching the admin search: q (an exact ticket number, or text
+    in the ticket number or the customer's email, name, phone or customer
+    id), movie (title) and since / until (day booked, YYYY-MM-DD). Unknown
+    or malformed values are ignored. Text matching goes through the search
+    indexes in users/search.py.
+    """
+    bookings = Booking.objects.all()
+    if params.get("q"):
+        exact = exact_filter("booking", params["q"])
+        if exact:
+            bookings = bookings.filter(exact)
+        else:
+            customers = CustomUser.objects.filter(text_filter("user", params["q"]))
+            bookings = bookings.filter(
+                Q(user__in=customers) | text_filter("booking", params["q"], ["ticket_number"])
+            )
+    if params.get("movie"):
+        bookings = bookings.filter(text_filter("booking", params["movie"], ["movie_name"]))
+    since, until = _parse_date(params.get("since")), _parse_date(params.get("until"))
+    if since:
+        bookings = bookings.filter(created_at__date__gte=since)
+    if until:
+        bookings = bookings.filter(created_at__date__lte=until)
+    return bookings
+
+
+def filter_users(params):
+    """
+    Customers matching q (text in their email, name, phone or customer id,
+    as in the admin users search) and since / until (day joined,
+    YYYY-MM-DD).
+    """
+    users = CustomUser.objects.all()
+    if params.get("q"):
+        users = users.filter(text_filter("user", params["q"]))
+    since, until = _parse_date(params.get("since")), _parse_date(params.get("until"))
+    if since:
+        users = users.filter(date_joined__date__gte=since)
+    if until:
+        users = users.filter(date_joined__date__lte=until)
+    return users
+
+
+def filter_revenue(params):
+    """
+    Daily sales per movie (users/rollups.py) matching movie (title) and
+    since / until (day of sale, YYYY-MM-DD). Rows kept by title after their
+    movie was deleted carry that title.
+    """
+    sales = DailySales.objects.annotate(title=Coalesce("movie__title", "movie_name"))
+    if params.get("movie"):
+        sales = sales.filter(title__icontains=params["movie"].strip())
+    since, until = _parse_date(params.get("since")), _parse_date(params.get("until"))
+    if since:
+        sales = sales.filter(day__gte=since)
+    if until:
+        sales = sales.filter(day__lte=until)
+    return sales
+
+
+# kind -> (filter, columns, row order)
+EXPORTS = {
+    "bookings": (filter_bookings, BOOKING_COLUMNS, ("pk",)),
+    "users": (filter_users, USER_COLUMNS, ("pk",)),
+    "revenue": (filter_revenue, REVENUE_COLUMNS, ("day", "pk")),
+}
+
+
+def filter_records(kind, params):
+    """The `kind` records ("bookings", "users" or "revenue") matching params."""
+    return EXPORTS[kind][0](params)
+
+
+# ================================
+# ENCODING
+# ================================
+def _rows(records, columns, ordering):
+    chunk_size = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+    fields = [field for _, field in columns]
+    return records.order_by(*ordering).values_list(*fields).iterator(chunk_size=chunk_size)
+
+
+def _csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_lines(rows, columns):
+    names = [name for name, _ in columns]
+    for row in rows:
+        yield json.dumps(dict(zip(names, row)), default=str) + "\n"
+
+
+def export(kind, records, fmt="csv", compress=False):
+    """
+    Yield `kind` records (from filter_records()) as CSV or NDJSON bytes in
+    pieces of about WRITE_SIZE, gzipped if asked. Rows are read from the
+    database in chunks, so memory stays flat however many there are.
+    """
+    _, columns, ordering = EXPORTS[kind]
+    rows = _rows(records, columns, ordering)
+    lines = _csv_lines(rows, columns) if fmt == "csv" else _ndjson_lines(rows, columns)
+    gzip = zlib.compressobj(wbits=31) if compress else None
+
+    pending, size = [], 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size < WRITE_SIZE:
+            continue
+        data = "".join(pending).encode()
+        pending, size = [], 0
+        data = gzip.compress(data) if gzip else data
+        if data:
+            yield data
+
+    data = "".join(pending).encode()
+    if gzip:
+        data = gzip.compress(data) + gzip.flush()
+    if data:
+        yield data
+
+
+# ================================
+# SERVING FROM A WORKER THREAD
+# ================================
+async def stream_in_thread(produce, max_pieces=8):
+    """
+    Async iterator over produce()'s pieces, run on a thread of its own.
+
+    Under ASGI a synchronous streaming body is read into memory in full
+    before it is sent; here the thread (with its own DB connection) hands
+    pieces over through a bounded queue, so memory stays at max_pieces and
+    the event loop keeps serving other requests. Stops the thread if the
+    client goes away.
+    """
+    pieces = queue.Queue(maxsize=max_pieces)
+    stop = threading.Event()
+    done = object()
+
+    def hand_over(item):
+        # Wait for room in the queue unless the consumer has gone away
+        while not stop.is_set():
+            try:
+                pieces.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        try:
+            for piece in produce():
+                if not hand_over(piece):
+                    return
+            hand_over(done)
+        except Exception as e:
+            hand_over(e)
+        finally:
+            connection.close()
+
+    def next_piece():
+        # Time out now and then so no executor thread waits on an abandoned export
+        try:
+            return pieces.get(timeout=1)
+        except queue.Empty:
+            return None
+
+    threading.Thread(target=run, name="export", daemon=True).start()
+    try:
+        while True:
+            piece = await sync_to_async(next_piece, thread_sensitive=False)()
+            if piece is None:
+                continue
+            if piece is done:
+                break
+            if isinstance(piece, Exception):
+                raise piece
+            yield piece
+    finally:
+        stop.set()
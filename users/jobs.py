@@ -0,0 +1,116 @@
+# users/jobs.py
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# ================================
+# QUEUEING
+# ================================
+def enqueue(func, *args, **kwargs):
+    """
+    Queue func(*args, **kwargs) for the job worker once the current
+    transaction commits (straight away outside one), so a rolled-back
+    request never leaves work behind. Arguments are stored as JSON: pass
+    ids and plain values, not model instances.
+    """
+    job = Job(
+        task=f"{func.__module__}.{func.__qualname__}",
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=getattr(settings, "JOB_MAX_ATTEMPTS", 5),
+    )
+    transaction.on_commit(job.save)
+
+
+# ================================
+# WORKER SIDE
+# ================================
+def _retry_delay(attempts):
+    """Exponential backoff with jitter, in seconds, after the given attempt."""
+    base = getattr(settings, "JOB_RETRY_BACKOFF", 30)
+    return base * (2 ** (attempts - 1)) * (0.5 + random.random())
+
+
+def claim_jobs(worker, limit):
+    """
+    Claim up to `limit` due jobs for `worker` and return their ids.
+
+    Each claim is a conditional UPDATE on the status and run_at the job was
+    read with, so two workers polling at once can't both take it, on any
+    database. A running job whose visibility timeout has lapsed is due
+    again; it counts as one more attempt.
+    """
+    now = timezone.now()
+    visible_until = now + timedelta(seconds=getattr(settings, "JOB_VISIBILITY_TIMEOUT", 300))
+
+    Job.objects.filter(status=Job.RUNNING, run_at__lte=now, attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, finished_at=now, last_error="Visibility timeout lapsed on the last attempt"
+    )
+
+    due = (
+        Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING], run_at__lte=now)
+        .order_by("run_at")
+        .values_list("pk", "status", "run_at")[:limit * 2]
+    )
+    claimed = []
+    for pk, status, run_at in due:
+        if len(claimed) == limit:
+            break
+        taken = Job.objects.filter(pk=pk, status=status, run_at=run_at).update(
+            status=Job.RUNNING, run_at=visible_until, attempts=F("attempts") + 1, locked_by=worker
+        )
+        if taken:
+            claimed.append(pk)
+    return claimed
+
+
+def run_job(pk, worker):
+    """
+    Run a job this worker claimed and record the outcome: done, queued again
+    after a backoff, or failed once its attempts are used up. Outcomes are
+    only written while the claim is still ours. Returns (task, status).
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.filter(pk=pk, status=Job.RUNNING, locked_by=worker).first()
+        if job is None:
+            return None, None
+        claim = Job.objects.filter(pk=pk, status=Job.RUNNING, locked_by=worker, attempts=job.attempts)
+
+        try:
+            import_string(job.task)(*job.args, **job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+            if job.attempts >= job.max_attempts:
+                claim.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+                return job.task, Job.FAILED
+            retry_at = timezone.now() + timedelta(seconds=_retry_delay(job.attempts))
+            claim.update(status=Job.QUEUED, run_at=retry_at, last_error=error)
+            return job.task, Job.QUEUED
+
+        claim.update(status=Job.DONE, finished_at=timezone.now())
+        return job.task, Job.DONE
+    finally:
+        close_old_connections()
+
+
+def prune_jobs():
+    """Delete finished jobs older than JOB_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=getattr(settings, "JOB_RETENTION_DAYS", 7))
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
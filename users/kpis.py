@@ -0,0 +1,88 @@
+# users/kpis.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Booking, CustomUser, Movie
+from .rollups import popular_movies, sales_totals
+
+
+# ================================
+# DASHBOARD FIGURES
+# ================================
+def _total_users():
+    return CustomUser.objects.count()
+
+
+def _sales_totals():
+    bookings, revenue = sales_totals()
+    return {"bookings": bookings, "revenue": revenue}
+
+
+def _leaderboard():
+    # Reads the stored per-user totals in user_total_spent_idx order
+    top_users = CustomUser.objects.filter(booking_count__gt=0).order_by("-total_spent", "id")[:10]
+    return [{"user": u, "revenue": u.total_spent, "bookings": u.booking_count} for u in top_users]
+
+
+def _recent_bookings():
+    return list(Booking.objects.select_related("user").order_by("-created_at")[:10])
+
+
+# name -> (compute function, models whose changes make it stale)
+KPIS = {
+    "total_users": (_total_users, {CustomUser}),
+    "sales_totals": (_sales_totals, {Booking}),
+    "popular_movies": (popular_movies, {Booking, Movie}),
+    "leaderboard": (_leaderboard, {Booking, CustomUser}),
+    "recent_bookings": (_recent_bookings, {Booking, CustomUser}),
+}
+
+
+def _cache_key(name):
+    return f"kpi:{name}"
+
+
+# ================================
+# CACHE
+# ================================
+def get_kpis(*names, refresh=False):
+    """
+    Dashboard figures by name, from the cache where possible.
+
+    Returns (values, computed_at): two dicts keyed by name, the second saying
+    when each value was computed. refresh=True recomputes them all.
+    """
+    cached = {} if refresh else cache.get_many([_cache_key(name) for name in names])
+    values, computed_at, missing = {}, {}, {}
+
+    for name in names:
+        entry = cached.get(_cache_key(name))
+        if entry is None:
+            entry = (timezone.now(), KPIS[name][0]())
+            missing[_cache_key(name)] = entry
+        computed_at[name], values[name] = entry
+
+    if missing:
+        cache.set_many(missing, getattr(settings, "KPI_CACHE_TIMEOUT", 300))
+    return values, computed_at
+
+
+def invalidate_kpis(model=None):
+    """Drop every cached figure that depends on the given model, or all of them."""
+    cache.delete_many([_cache_key(name) for name, (_, models) in KPIS.items() if model is None or model in models])
+
+
+@receiver([post_save, post_delete], sender=Booking)
+@receiver([post_save, post_delete], sender=Movie)
+@receiver([post_save, post_delete], sender=CustomUser)
+def _model_changed(sender, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no figure shows
+    if update_fields and set(update_fields) <= {"last_login"}:
+        return
+    # After commit: until then a dashboard read would cache the old figures
+    # again, and the booking's DailySales update comes later in its transaction
+    transaction.on_commit(lambda: invalidate_kpis(sender))
@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Booking, Movie, Showtime
+from users.seating import showtime_start
+
+
+class Command(BaseCommand):
+    help = 'Links existing bookings to their Showtime in small batches (safe to stop and re-run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Bookings per transaction')
+        parser.add_argument('--after', type=int, default=0, help='Resume after this booking id')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_id = options['after']
+
+        # Same pick as Movie.objects.filter(title=...).first(): the lowest id wins
+        movies = dict(Movie.objects.order_by('-id').values_list('title', 'id'))
+        showtimes = {}
+        linked = skipped = 0
+
+        while True:
+            # Only unlinked rows are read, so a re-run picks up where the last one stopped
+            batch = list(
+                Booking.objects.filter(showtime__isnull=True, pk__gt=last_id)
+                .order_by('pk')
+                .values_list('pk', 'movie_name', 'date', 'time')[:batch_size]
+            )
+            if not batch:
+                break
+
+            groups = {}
+            for pk, movie_name, date, time_str in batch:
+                if movie_name not in movies:
+                    skipped += 1
+                    continue
+                groups.setdefault((movies[movie_name], showtime_start(date, time_str)), []).append(pk)
+
+            with transaction.atomic():
+                for key, ids in groups.items():
+                    if key not in showtimes:
+                        movie_id, starts_at = key
+                        showtimes[key] = Showtime.objects.get_or_create(movie_id=movie_id, starts_at=starts_at)[0].pk
+                    linked += Booking.objects.filter(pk__in=ids, showtime__isnull=True).update(showtime_id=showtimes[key])
+
+            last_id = batch[-1][0]
+            self.stdout.write(f'Up to booking {last_id}: {linked} linked, {skipped} without a matching movie')
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {linked} bookings linked, {skipped} left without a showtime'))
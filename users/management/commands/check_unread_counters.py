@@ -0,0 +1,40 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from users.chat import check_cached_unread, check_conversation_counters
+
+
+class Command(BaseCommand):
+    help = 'Compares the unread-message counters (per conversation, and cached per user) with the messages themselves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Correct the counters that are off')
+        parser.add_argument('--batch-size', type=int, default=500, help='Conversations or users read per query')
+
+    def handle(self, *args, **options):
+        fix, batch_size = options['fix'], options['batch_size']
+
+        conversations = check_conversation_counters(fix=fix, batch_size=batch_size)
+        for conversation_id, found, expected in conversations:
+            self.stdout.write(
+                f'Conversation {conversation_id}: {found[0]}/{found[1]} unread (user/advisor), '
+                f'actually {expected[0]}/{expected[1]}'
+            )
+
+        if isinstance(caches['default'], LocMemCache):
+            # Each process has its own; the web workers' counters aren't visible here
+            self.stdout.write(self.style.WARNING('The cache is per-process (no CACHES setting); skipping cached counters'))
+            cached = []
+        else:
+            cached = check_cached_unread(fix=fix, batch_size=batch_size)
+        for user_id, count, actual in cached:
+            self.stdout.write(f'User {user_id}: cached {count} unread, actually {actual}')
+
+        problems = len(conversations) + len(cached)
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('All unread counters match'))
+        elif fix:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {problems} counters'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{problems} counters are off; run with --fix to correct them'))
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from users.exports import FORMATS, export, filter_records
+
+
+class Command(BaseCommand):
+    help = 'Streams bookings as CSV or NDJSON (optionally gzipped), with the same filters as the admin bookings page'
+    kind = 'bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        self.add_filters(parser)
+
+    def add_filters(self, parser):
+        parser.add_argument(
+            '--q', help="Exact ticket number, or text in the ticket number or the customer's email, name, phone or customer ID"
+        )
+        parser.add_argument('--movie', help='Movie title contains')
+        parser.add_argument('--since', help='Booked on or after (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Booked on or before (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        records = filter_records(self.kind, options)
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for piece in export(self.kind, records, options['format'], options['gzip']):
+                out.write(piece)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
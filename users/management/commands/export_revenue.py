@@ -0,0 +1,11 @@
+from users.management.commands.export_bookings import Command as ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Streams bookings, seats and revenue per movie per day as CSV or NDJSON (optionally gzipped)'
+    kind = 'revenue'
+
+    def add_filters(self, parser):
+        parser.add_argument('--movie', help='Movie title contains')
+        parser.add_argument('--since', help='Sold on or after (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Sold on or before (YYYY-MM-DD)')
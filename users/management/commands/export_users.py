@@ -0,0 +1,11 @@
+from users.management.commands.export_bookings import Command as ExportCommand
+
+
+class Command(ExportCommand):
+    help = 'Streams customers as CSV or NDJSON (optionally gzipped), with the same search as the admin users page'
+    kind = 'users'
+
+    def add_filters(self, parser):
+        parser.add_argument('--q', help='Text in the email, name, phone or customer ID')
+        parser.add_argument('--since', help='Joined on or after (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Joined on or before (YYYY-MM-DD)')
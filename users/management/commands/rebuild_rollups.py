@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.kpis import invalidate_kpis
+from users.rollups import rebuild_customer_stats, rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the DailySales rollups (a day at a time) and per-customer totals (a batch of users at a time) from the bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only rebuild days from this date on (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Customers read per query')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date like 2025-01-31')
+
+        def progress(day, rows):
+            self.stdout.write(f'Up to {day}: {rows} day/movie rows')
+
+        written = rebuild_daily_sales(since=since, progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'Done: {written} rollup rows written'))
+
+        def user_progress(last_id, updated):
+            self.stdout.write(f'Up to user {last_id}: {updated} customer totals corrected')
+
+        corrected = rebuild_customer_stats(batch_size=options['batch_size'], progress=user_progress)
+        self.stdout.write(self.style.SUCCESS(f'Done: {corrected} customer totals corrected'))
+
+        # The dashboard shows these totals; don't let it serve the old ones
+        invalidate_kpis()
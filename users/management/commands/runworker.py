@@ -0,0 +1,86 @@
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+
+from users.jobs import claim_jobs, prune_jobs, run_job, worker_name
+
+PRUNE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (emails etc.) from the database job table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 4),
+            help='Jobs run at the same time',
+        )
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread', help='Run jobs on threads or processes')
+        parser.add_argument('--once', action='store_true', help='Exit as soon as no job is due')
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        poll_interval = getattr(settings, 'JOB_POLL_INTERVAL', 1)
+        worker = worker_name()
+
+        stopping = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.set())
+
+        if options['pool'] == 'process':
+            # Children open their own database connections
+            connections.close_all()
+            pool = ProcessPoolExecutor(max_workers=concurrency, initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+        self.stdout.write(f'Worker {worker} running {concurrency} {options["pool"]}(s)')
+        running = set()
+        last_prune = 0
+
+        with pool:
+            while not stopping.is_set():
+                if time.monotonic() - last_prune > PRUNE_INTERVAL:
+                    prune_jobs()
+                    last_prune = time.monotonic()
+
+                claimed = []
+                if len(running) < concurrency:
+                    try:
+                        claimed = claim_jobs(worker, concurrency - len(running))
+                    except OperationalError as e:
+                        # e.g. "database is locked" on SQLite; just poll again
+                        self.stderr.write(f'Could not claim jobs: {e}')
+                for pk in claimed:
+                    running.add(pool.submit(run_job, pk, worker))
+
+                if not running:
+                    if options['once']:
+                        break
+                    stopping.wait(poll_interval)
+                    continue
+
+                done, running = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._report(future)
+
+            # Let claimed jobs finish; anything cut short is retried after its visibility timeout
+            for future in running:
+                self._report(future)
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} stopped'))
+
+    def _report(self, future):
+        try:
+            task, status = future.result()
+        except Exception as e:
+            self.stderr.write(f'Job crashed the worker: {e}')
+            return
+        if task:
+            self.stdout.write(f'{status}: {task}')
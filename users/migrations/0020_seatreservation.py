@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_seat_reservations(apps, schema_editor):
+    """
+    Split every existing Booking.seats string into SeatReservation rows,
+    streaming bookings in chunks so large tables are never held in memory.
+    Seats that were already double-booked keep the first reservation.
+    """
+    Booking = apps.get_model('users', 'Booking')
+    SeatReservation = apps.get_model('users', 'SeatReservation')
+
+    batch = []
+    bookings = Booking.objects.only('id', 'movie_name', 'date', 'time', 'seats').order_by('id')
+    for booking in bookings.iterator(chunk_size=BACKFILL_CHUNK_SIZE):
+        for seat_id in {s.strip() for s in (booking.seats or '').split(',') if s.strip()}:
+            batch.append(SeatReservation(
+                booking_id=booking.id,
+                movie_name=booking.movie_name,
+                date=booking.date,
+                time=booking.time,
+                seat_id=seat_id,
+            ))
+        if len(batch) >= BACKFILL_CHUNK_SIZE:
+            SeatReservation.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+
+    if batch:
+        SeatReservation.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_movie_coming_soon'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_name', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('time', models.CharField(max_length=50)),
+                ('seat_id', models.CharField(max_length=10)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='users.booking')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('movie_name', 'date', 'time', 'seat_id'), name='unique_seat_per_showtime')],
+            },
+        ),
+        migrations.RunPython(backfill_seat_reservations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_seatreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seatreservation',
+            name='held_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='seatreservation',
+            name='holder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='seatreservation',
+            name='booking',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='users.booking'),
+        ),
+    ]
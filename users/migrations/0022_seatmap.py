@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_seatreservation_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_name', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('time', models.CharField(max_length=50)),
+                ('booked', models.BinaryField(default=b'')),
+                ('held', models.BinaryField(default=b'')),
+                ('holds_expire_at', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('movie_name', 'date', 'time'), name='unique_seat_map_per_showtime')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_seatmap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatMapVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('booked', models.BinaryField(default=b'')),
+                ('held', models.BinaryField(default=b'')),
+                ('seat_map', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='users.seatmap')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('seat_map', 'version'), name='unique_seat_map_version')],
+            },
+        ),
+    ]
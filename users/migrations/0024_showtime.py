@@ -0,0 +1,114 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:02
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+DEFAULT_HALL = 'Main Hall'
+
+
+def _starts_at(date, time_str):
+    for fmt in ('%H:%M', '%H:%M:%S', '%H%M', '%I:%M %p', '%I:%M%p'):
+        try:
+            clock = datetime.datetime.strptime((time_str or '').strip(), fmt).time()
+            break
+        except ValueError:
+            continue
+    else:
+        clock = datetime.time.min
+    return datetime.datetime.combine(date, clock, tzinfo=datetime.timezone.utc)
+
+
+def link_showtimes(apps, schema_editor):
+    """
+    Create a Showtime for every scheduled movie and for every (title, date,
+    time) the seat tables refer to, then point those rows at it. Seats of
+    titles that no longer exist can't be booked again and are dropped, as
+    are seats a second spelling of the same start time repeats; both are
+    counted and reported. Bookings keep their seat lists, and are linked
+    separately by the backfill_showtimes command.
+    """
+    Movie = apps.get_model('users', 'Movie')
+    Showtime = apps.get_model('users', 'Showtime')
+    SeatReservation = apps.get_model('users', 'SeatReservation')
+    SeatMap = apps.get_model('users', 'SeatMap')
+
+    for movie_id, scheduled_date in Movie.objects.exclude(scheduled_date=None).values_list('id', 'scheduled_date'):
+        # Bookings record the time to the minute, so screenings start on one
+        starts_at = scheduled_date.replace(second=0, microsecond=0)
+        Showtime.objects.get_or_create(movie_id=movie_id, starts_at=starts_at, hall=DEFAULT_HALL)
+
+    # Same pick as Movie.objects.filter(title=...).first(): the lowest id wins
+    movies = dict(Movie.objects.order_by('-id').values_list('title', 'id'))
+
+    # (model, reason) -> {title: rows dropped}
+    dropped = {}
+
+    def drop(rows, model, reason, movie_name):
+        count = rows.delete()[1].get(model._meta.label, 0)
+        if count:
+            titles = dropped.setdefault((model._meta.verbose_name, reason), {})
+            titles[movie_name] = titles.get(movie_name, 0) + count
+
+    for model in (SeatReservation, SeatMap):
+        for movie_name, date, time in list(model.objects.values_list('movie_name', 'date', 'time').distinct()):
+            rows = model.objects.filter(movie_name=movie_name, date=date, time=time)
+            if movie_name not in movies:
+                drop(rows, model, 'of titles that no longer exist', movie_name)
+                continue
+            showtime, _ = Showtime.objects.get_or_create(
+                movie_id=movies[movie_name], starts_at=_starts_at(date, time), hall=DEFAULT_HALL
+            )
+            # Two spellings of the same start time collapse into one showtime;
+            # keep the rows that got there first
+            if model is SeatMap:
+                if SeatMap.objects.filter(showtime=showtime).exists():
+                    drop(rows, model, 'repeating another spelling of their start time', movie_name)
+            else:
+                repeated = rows.filter(seat_id__in=SeatReservation.objects.filter(showtime=showtime).values('seat_id'))
+                drop(repeated, model, 'repeating another spelling of their start time', movie_name)
+            rows.update(showtime=showtime)
+
+    for (name, reason), titles in dropped.items():
+        listed = ', '.join(f'{title} ({count})' for title, count in sorted(titles.items()))
+        print(f'\n  Dropped {sum(titles.values())} {name} row(s) {reason}: {listed}', end='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0023_seatmapversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Showtime',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts_at', models.DateTimeField(db_index=True)),
+                ('hall', models.CharField(default='Main Hall', max_length=50)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='showtimes', to='users.movie')),
+            ],
+            options={
+                'ordering': ['starts_at'],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'starts_at', 'hall'), name='unique_showtime')],
+            },
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='showtime',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bookings', to='users.showtime'),
+        ),
+        migrations.AddField(
+            model_name='seatreservation',
+            name='showtime',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='users.showtime'),
+        ),
+        migrations.AddField(
+            model_name='seatmap',
+            name='showtime',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='seat_map', to='users.showtime'),
+        ),
+        migrations.RunPython(link_showtimes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 21:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0024_showtime'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='seatreservation',
+            name='unique_seat_per_showtime',
+        ),
+        migrations.RemoveConstraint(
+            model_name='seatmap',
+            name='unique_seat_map_per_showtime',
+        ),
+        migrations.AlterField(
+            model_name='seatreservation',
+            name='showtime',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='users.showtime'),
+        ),
+        migrations.AlterField(
+            model_name='seatmap',
+            name='showtime',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='seat_map', to='users.showtime'),
+        ),
+        migrations.RemoveField(
+            model_name='seatreservation',
+            name='movie_name',
+        ),
+        migrations.RemoveField(
+            model_name='seatreservation',
+            name='date',
+        ),
+        migrations.RemoveField(
+            model_name='seatreservation',
+            name='time',
+        ),
+        migrations.RemoveField(
+            model_name='seatmap',
+            name='movie_name',
+        ),
+        migrations.RemoveField(
+            model_name='seatmap',
+            name='date',
+        ),
+        migrations.RemoveField(
+            model_name='seatmap',
+            name='time',
+        ),
+        migrations.AddConstraint(
+            model_name='seatreservation',
+            constraint=models.UniqueConstraint(fields=('showtime', 'seat_id'), name='unique_seat_per_showtime'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:52
+
+from django.db import migrations, models
+
+
+def create_ticket_sequence(apps, schema_editor):
+    TicketSequence = apps.get_model('users', 'TicketSequence')
+    TicketSequence.objects.get_or_create(name='ticket')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0026_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_ticket_sequence, migrations.RunPython.noop),
+    ]
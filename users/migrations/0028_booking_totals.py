@@ -0,0 +1,60 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:53
+
+from django.db import migrations, models
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_booking_totals(apps, schema_editor):
+    """
+    Fill seat_count, unit_price and total_paid for existing bookings from
+    their seats string and the movie's current price (the only price on
+    record), a chunk of bookings at a time. Bookings whose movie is gone
+    keep a price of 0, as the old revenue calculation counted them.
+    """
+    Booking = apps.get_model('users', 'Booking')
+    Movie = apps.get_model('users', 'Movie')
+
+    prices_by_title = dict(Movie.objects.order_by('-id').values_list('title', 'price'))
+    last_id = 0
+    while True:
+        chunk = list(
+            Booking.objects.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'seats', 'movie_name', 'showtime__movie__price')[:BACKFILL_CHUNK_SIZE]
+        )
+        if not chunk:
+            break
+        updates = []
+        for booking_id, seats, movie_name, showtime_price in chunk:
+            seat_count = len([s for s in (seats or '').split(',') if s.strip()])
+            price = showtime_price if showtime_price is not None else prices_by_title.get(movie_name, 0)
+            updates.append(Booking(id=booking_id, seat_count=seat_count, unit_price=price, total_paid=price * seat_count))
+        Booking.objects.bulk_update(updates, ['seat_count', 'unit_price', 'total_paid'])
+        last_id = chunk[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0027_ticketsequence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='seat_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='total_paid',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.RunPython(backfill_booking_totals, migrations.RunPython.noop),
+    ]
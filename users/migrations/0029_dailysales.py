@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0028_booking_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('movie_name', models.CharField(max_length=255)),
+                ('bookings', models.IntegerField(default=0)),
+                ('seats', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'movie_name'), name='unique_daily_sales')],
+            },
+        ),
+    ]
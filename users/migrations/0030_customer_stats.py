@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-17 19:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def backfill_customer_stats(apps, schema_editor):
+    """
+    Set total_spent and booking_count from each user's bookings, grouping
+    the bookings of a chunk of users at a time.
+    """
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Booking = apps.get_model('users', 'Booking')
+
+    last_id = 0
+    while True:
+        user_ids = list(
+            CustomUser.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:BACKFILL_CHUNK_SIZE]
+        )
+        if not user_ids:
+            break
+        stats = (
+            Booking.objects.filter(user_id__gte=user_ids[0], user_id__lte=user_ids[-1])
+            .values('user_id')
+            .annotate(spent=Sum('total_paid'), count=Count('id'))
+            .order_by()
+        )
+        updates = [CustomUser(id=row['user_id'], total_spent=row['spent'] or 0, booking_count=row['count']) for row in stats]
+        CustomUser.objects.bulk_update(updates, ['total_spent', 'booking_count'])
+        last_id = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0029_dailysales'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='total_spent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_customer_stats, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['-total_spent', 'id'], name='user_total_spent_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:20
+
+from django.db import migrations
+
+# (index name, table, column) for the admin search boxes
+TRIGRAM_INDEXES = [
+    ('user_email_trgm', 'users_customuser', 'email'),
+    ('user_first_name_trgm', 'users_customuser', 'first_name'),
+    ('user_last_name_trgm', 'users_customuser', 'last_name'),
+    ('user_phone_trgm', 'users_customuser', 'phone'),
+    ('user_customer_id_trgm', 'users_customuser', 'customer_id'),
+    ('booking_ticket_number_trgm', 'users_booking', 'ticket_number'),
+    ('booking_movie_name_trgm', 'users_booking', 'movie_name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """
+    PostgreSQL only: GIN trigram indexes on UPPER(column), the expression
+    Django's icontains compares, so contains-searches stop scanning. SQLite
+    uses FTS5 shadow tables instead (users/search.py, set up after migrate).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.8 on 2026-10-17 20:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Q
+
+BACKFILL_CHUNK_SIZE = 500
+PREVIEW_LENGTH = 100
+
+
+def backfill_conversations(apps, schema_editor):
+    """
+    One Conversation per pair of users who have exchanged messages. The
+    advisor is the side that is an advisor (or superuser) when only one is,
+    otherwise whoever received the first message, as in users/chat.py.
+    """
+    ChatMessage = apps.get_model('users', 'ChatMessage')
+    CustomUser = apps.get_model('users', 'CustomUser')
+    Conversation = apps.get_model('users', 'Conversation')
+
+    pairs = {}
+    directions = (
+        ChatMessage.objects.values('sender_id', 'receiver_id')
+        .annotate(first=Min('id'), last=Max('id'), unread=Count('id', filter=Q(is_read=False)))
+        .order_by()
+    )
+    for row in directions:
+        key = frozenset((row['sender_id'], row['receiver_id']))
+        pair = pairs.setdefault(key, {'first': None, 'last': 0, 'unread': {}})
+        if pair['first'] is None or row['first'] < pair['first'][0]:
+            pair['first'] = (row['first'], row['sender_id'], row['receiver_id'])
+        pair['last'] = max(pair['last'], row['last'])
+        pair['unread'][row['receiver_id']] = row['unread']
+
+    user_ids = {user_id for key in pairs for user_id in key}
+    advisors = set(
+        CustomUser.objects.filter(Q(is_advisor=True) | Q(is_superuser=True), id__in=user_ids).values_list('id', flat=True)
+    )
+
+    pairs = list(pairs.values())
+    for start in range(0, len(pairs), BACKFILL_CHUNK_SIZE):
+        chunk = pairs[start:start + BACKFILL_CHUNK_SIZE]
+        last = ChatMessage.objects.in_bulk([pair['last'] for pair in chunk])
+        conversations = []
+        for pair in chunk:
+            _, sender, receiver = pair['first']
+            user, advisor = (receiver, sender) if sender in advisors and receiver not in advisors else (sender, receiver)
+            message = last[pair['last']]
+            conversations.append(Conversation(
+                user_id=user,
+                advisor_id=advisor,
+                last_message_at=message.timestamp,
+                last_message=message.message[:PREVIEW_LENGTH],
+                user_unread=pair['unread'].get(user, 0),
+                advisor_unread=pair['unread'].get(advisor, 0),
+            ))
+        Conversation.objects.bulk_create(conversations)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0032_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField()),
+                ('last_message', models.CharField(blank=True, max_length=100)),
+                ('user_unread', models.PositiveIntegerField(default=0)),
+                ('advisor_unread', models.PositiveIntegerField(default=0)),
+                ('advisor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='advisor_conversations', to=settings.AUTH_USER_MODEL)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='customer_conversations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['advisor', '-last_message_at'], name='conversation_advisor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'advisor'), name='unique_conversation')],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
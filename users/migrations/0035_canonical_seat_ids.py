@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# Hall layout, as in users/seatmap.py
+SEAT_ROWS = 'ABCDE'
+SEATS_PER_ROW = 7
+
+
+def canonical_seat(seat_id):
+    row, number = seat_id[:1].upper(), seat_id[1:]
+    if row not in SEAT_ROWS or not number.isdigit() or not 1 <= int(number) <= SEATS_PER_ROW:
+        return None
+    return f'{row}{int(number)}'
+
+
+def canonicalize_seat_ids(apps, schema_editor):
+    """
+    Rewrite reservations stored as "a1" or "A001" as "A1". A row whose
+    canonical seat is already taken on its showtime (the seat was sold
+    twice under different spellings) is left as it is to be sorted out by
+    hand, since either booking may be the one to keep.
+    """
+    SeatReservation = apps.get_model('users', 'SeatReservation')
+
+    taken = set(SeatReservation.objects.values_list('showtime_id', 'seat_id'))
+    for reservation in SeatReservation.objects.only('id', 'showtime_id', 'seat_id').iterator():
+        seat = canonical_seat(reservation.seat_id)
+        if seat is None or seat == reservation.seat_id or (reservation.showtime_id, seat) in taken:
+            continue
+        SeatReservation.objects.filter(pk=reservation.pk).update(seat_id=seat)
+        taken.add((reservation.showtime_id, seat))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0034_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(canonicalize_seat_ids, migrations.RunPython.noop),
+    ]
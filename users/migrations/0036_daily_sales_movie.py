@@ -0,0 +1,49 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def link_daily_sales(apps, schema_editor):
+    """
+    Point existing rows at their movie where exactly one has the title.
+    `manage.py rebuild_rollups` links the rest through the bookings' showtimes.
+    """
+    DailySales = apps.get_model('users', 'DailySales')
+    Movie = apps.get_model('users', 'Movie')
+
+    titles = (
+        Movie.objects.values('title').annotate(n=Count('id'), movie_id=Min('id')).filter(n=1)
+        .values_list('title', 'movie_id')
+    )
+    for title, movie_id in titles:
+        DailySales.objects.filter(movie_name=title, movie__isnull=True).update(movie_id=movie_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0035_canonical_seat_ids'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailysales',
+            name='unique_daily_sales',
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='movie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='daily_sales', to='users.movie'),
+        ),
+        migrations.RunPython(link_daily_sales, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(condition=models.Q(('movie__isnull', False)), fields=('day', 'movie'), name='unique_daily_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(condition=models.Q(('movie__isnull', True)), fields=('day', 'movie_name'), name='unique_daily_sales_by_title'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 import random
 import string
 
@@ -16,28 +17,60 @@ class CustomUser(AbstractUser):
     balance = models.DecimalField(max_digits=10, decimal_places=2, default=1000.00)
     is_advisor = models.BooleanField(default=False)
     last_seen = models.DateTimeField(blank=True, null=True)
+    # Running totals over the user's bookings, kept current by booking_service
+    total_spent = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    booking_count = models.PositiveIntegerField(default=0)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["-total_spent", "id"], name="user_total_spent_idx"),
+            models.Index(fields=["date_joined", "id"], name="user_joined_idx"),
+        ]
 
 class Booking(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    showtime = models.ForeignKey("Showtime", on_delete=models.SET_NULL, related_name="bookings", blank=True, null=True)
+    # Title and showtime as printed on the ticket when it was booked
     movie_name = models.CharField(max_length=255)
     date = models.DateField()
     time = models.CharField(max_length=50)
     seats = models.CharField(max_length=200)  # Example: "A1, A2, A3"
+    # What was paid, fixed at purchase so later price changes don't rewrite revenue
+    seat_count = models.PositiveSmallIntegerField(default=0)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    total_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     ticket_number = models.CharField(max_length=20, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first listings page through this (see users/pagination.py)
+            models.Index(fields=["created_at", "id"], name="booking_created_idx"),
+            # A customer's bookings, newest first (homepage, get_user_bookings)
+            models.Index(fields=["user", "-created_at"], name="booking_user_created_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.ticket_number:
-            # Generate unique ticket number: GC-YYYYMMDD-XXXXX
-            import datetime
-            date_str = datetime.datetime.now().strftime('%Y%m%d')
-            random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            self.ticket_number = f"GC-{date_str}-{random_str}"
+            # Unique ticket number: GC-YYYYMMDD-XXXXXXXC (see users/tickets.py)
+            from .tickets import next_ticket_number
+            self.ticket_number = next_ticket_number()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.email} - {self.movie_name} ({self.date} {self.time})"
 
+class TicketSequence(models.Model):
+    """
+    Counter that ticket numbers are drawn from. Each process reserves a block
+    of it at a time, so numbers never repeat across workers or servers.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
 class Movie(models.Model):
     title = models.CharField(max_length=255)
     genre = models.CharField(max_length=100, blank=True, null=True)  # Genre field
@@ -52,6 +85,110 @@ class Movie(models.Model):
     def __str__(self):
         return self.title
 
+class Showtime(models.Model):
+    """
+    One screening of a movie in a hall. Bookings and seats refer to it by
+    foreign key, so a title can be screened many times or renamed without
+    its bookings losing track of it.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name="showtimes")
+    starts_at = models.DateTimeField(db_index=True)
+    hall = models.CharField(max_length=50, default="Main Hall")
+
+    class Meta:
+        ordering = ["starts_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["movie", "starts_at", "hall"], name="unique_showtime"),
+        ]
+
+    def __str__(self):
+        return f"{self.movie.title} ({self.starts_at:%Y-%m-%d %H:%M}, {self.hall})"
+
+class SeatReservation(models.Model):
+    """
+    One row per seat taken for a showtime. The unique constraint is what
+    prevents double-booking, and its index serves the booked-seats lookup.
+
+    A row without a booking is a checkout hold: it belongs to `holder` until
+    `held_until`, after which anyone may reclaim the seat.
+    """
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name="reservations", blank=True, null=True)
+    holder = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="seat_holds", blank=True, null=True)
+    held_until = models.DateTimeField(blank=True, null=True)
+    showtime = models.ForeignKey(Showtime, on_delete=models.CASCADE, related_name="reservations")
+    seat_id = models.CharField(max_length=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["showtime", "seat_id"], name="unique_seat_per_showtime"),
+        ]
+
+    def __str__(self):
+        return f"{self.showtime_id} - {self.seat_id}"
+
+class SeatMap(models.Model):
+    """
+    Availability of one showtime as bitsets (bit i = seat i of the hall
+    layout), rebuilt from SeatReservation and given a new version whenever
+    the showtime's reservations change.
+    """
+    showtime = models.OneToOneField(Showtime, on_delete=models.CASCADE, related_name="seat_map")
+    booked = models.BinaryField(default=b"")
+    held = models.BinaryField(default=b"")
+    holds_expire_at = models.DateTimeField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.showtime_id} v{self.version}"
+
+class SeatMapVersion(models.Model):
+    """
+    The bitsets a SeatMap had at one version, kept for a short history so
+    clients can ask for just what changed since the version they hold.
+    """
+    seat_map = models.ForeignKey(SeatMap, on_delete=models.CASCADE, related_name="versions")
+    version = models.PositiveIntegerField()
+    booked = models.BinaryField(default=b"")
+    held = models.BinaryField(default=b"")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["seat_map", "version"], name="unique_seat_map_version"),
+        ]
+
+class DailySales(models.Model):
+    """
+    Bookings, seats and revenue per movie per day of sale, kept up to date
+    as bookings are made and cancelled (see users/rollups.py) so dashboards
+    never group the whole Booking table. `manage.py rebuild_rollups`
+    recomputes it from the bookings.
+
+    Rows are keyed by the movie, through the bookings' showtimes, so a
+    renamed movie keeps its history. Bookings without a showtime (not yet
+    linked by backfill_showtimes) and movies since deleted are kept by the
+    title instead.
+    """
+    day = models.DateField()
+    movie = models.ForeignKey(Movie, on_delete=models.SET_NULL, related_name="daily_sales", blank=True, null=True)
+    # Title of the first booking counted in the row
+    movie_name = models.CharField(max_length=255)
+    bookings = models.IntegerField(default=0)
+    seats = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "movie"], condition=models.Q(movie__isnull=False), name="unique_daily_sales"
+            ),
+            models.UniqueConstraint(
+                fields=["day", "movie_name"], condition=models.Q(movie__isnull=True), name="unique_daily_sales_by_title"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.movie_name}: {self.bookings}"
+
 class Notification(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     message = models.TextField()
@@ -59,6 +196,11 @@ class Notification(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     notification_type = models.CharField(max_length=50, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="notification_user_created_idx"),
+        ]
+
     def __str__(self):
         return f"Notification for {self.user.email}: {self.message}"
 
@@ -69,5 +211,78 @@ class ChatMessage(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # One direction of a conversation in order (the chat API pages by id)
+            models.Index(fields=["sender", "receiver", "id"], name="chat_pair_idx"),
+            # Unread messages only, per receiver and sender: the unread badge
+            # and marking a conversation read never touch read history
+            models.Index(
+                fields=["receiver", "sender"], condition=models.Q(is_read=False), name="chat_unread_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"From {self.sender} to {self.receiver}: {self.message[:20]}"
+
+class Conversation(models.Model):
+    """
+    One support chat between a customer and an advisor, updated in the same
+    transaction as each message (see users/chat.py) so the advisor dashboard
+    lists chats by recency, with unread counts, without reading ChatMessage.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='customer_conversations')
+    advisor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='advisor_conversations')
+    last_message_at = models.DateTimeField()
+    last_message = models.CharField(max_length=100, blank=True)
+    user_unread = models.PositiveIntegerField(default=0)
+    advisor_unread = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "advisor"], name="unique_conversation"),
+        ]
+        indexes = [
+            models.Index(fields=["advisor", "-last_message_at"], name="conversation_advisor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} / {self.advisor}"
+
+class Job(models.Model):
+    """
+    Background work for `manage.py runworker`: the function at dotted path
+    `task`, called with `args` and `kwargs`. Claiming a job pushes its
+    `run_at` out by the visibility timeout, so a job whose worker died
+    becomes due again and is picked up by another worker.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_at"], name="job_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.task} [{self.status}]"
@@ -0,0 +1,129 @@
+# users/pagination.py
+from functools import cached_property
+
+from django.core import signing
+from django.db import connection
+from django.db.models import Q
+
+TOKEN_SALT = "users.pagination"
+
+
+# ================================
+# ESTIMATED COUNTS
+# ================================
+def estimated_count(queryset, cap=10000):
+    """
+    A total for "about N results" labels that never counts a large table in
+    full. Returns (count, exact). Unfiltered tables on PostgreSQL use the
+    planner's row estimate; anything else is counted up to `cap` rows.
+    """
+    if connection.vendor == "postgresql" and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return row[0], False
+
+    count = queryset.order_by()[:cap + 1].count()
+    return min(count, cap), count <= cap
+
+
+# ================================
+# KEYSET PAGINATION
+# ================================
+class KeysetPage:
+    def __init__(self, paginator, object_list, has_next, has_previous):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_token(self):
+        if self.has_next and self.object_list:
+            return self.paginator.token_for(self.object_list[-1], forward=True)
+        return None
+
+    @property
+    def previous_token(self):
+        if self.has_previous and self.object_list:
+            return self.paginator.token_for(self.object_list[0], forward=False)
+        return None
+
+    @cached_property
+    def estimated_count(self):
+        count, exact = estimated_count(self.paginator.queryset)
+        return {"count": count, "exact": exact}
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a unique ordering such as ("-created_at", "-id").
+
+    Instead of OFFSET and a COUNT(*) per page, each page continues from the
+    ordering values of the row the previous one ended on, so every page
+    costs one indexed range scan however deep it is. Pages are addressed by
+    opaque signed tokens (next_token / previous_token); an unknown or
+    tampered token gives the first page.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [queryset.model._meta.get_field(name.lstrip("-")) for name in self.ordering]
+
+    def token_for(self, obj, forward):
+        values = [getattr(obj, field.attname) for field in self.fields]
+        values = [v if v is None or isinstance(v, int) else str(v) for v in values]
+        return signing.dumps({"f": forward, "k": values}, salt=TOKEN_SALT, compress=True)
+
+    def _decode(self, token):
+        try:
+            data = signing.loads(token, salt=TOKEN_SALT)
+            values = [field.to_python(v) for field, v in zip(self.fields, data["k"], strict=True)]
+            return bool(data["f"]), values
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            return None
+
+    def _beyond(self, values, forward):
+        """Q for rows past `values` in the page order (before them if not forward)."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        lookups = []
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") == forward else "gt"
+            lookups.append((field, lookup, value))
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        # A plain range on the leading column lets the index seek to the
+        # cursor instead of scanning up to it
+        field, lookup, value = lookups[0]
+        return Q(**{f"{field}__{lookup}e": value}) & condition
+
+    def get_page(self, token=None):
+        cursor = self._decode(token) if token else None
+        if cursor is None:
+            rows = list(self.queryset.order_by(*self.ordering)[:self.per_page + 1])
+            return KeysetPage(self, rows[:self.per_page], len(rows) > self.per_page, False)
+
+        forward, values = cursor
+        if forward:
+            rows = list(
+                self.queryset.filter(self._beyond(values, True)).order_by(*self.ordering)[:self.per_page + 1]
+            )
+            return KeysetPage(self, rows[:self.per_page], len(rows) > self.per_page, True)
+
+        reverse = [name[1:] if name.startswith("-") else f"-{name}" for name in self.ordering]
+        rows = list(self.queryset.filter(self._beyond(values, False)).order_by(*reverse)[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page][::-1], True, len(rows) > self.per_page)
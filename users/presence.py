@@ -0,0 +1,141 @@
+# users/presence.py
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import CustomUser
+
+DIRECTORY_KEY = "presence:advisors"
+
+
+def _presence_key(user_id):
+    return f"presence:{user_id}"
+
+
+# ================================
+# LAST SEEN (written in batches)
+# ================================
+class LastSeenBuffer:
+    """
+    last_seen times waiting to be written, per process. Heartbeats only
+    record here; the first one after a flush starts a timer, and when it
+    fires everyone seen meanwhile is written in one bulk UPDATE. So
+    last_seen costs at most one query per PRESENCE_FLUSH_INTERVAL seconds
+    per process, however many users are online, and lags by up to that.
+    Whether someone is online never waits for it: that is the heartbeat
+    key in the shared cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def add(self, user_id, moment):
+        with self._lock:
+            self._pending[user_id] = moment
+            if self._timer is None:
+                self._timer = threading.Timer(getattr(settings, "PRESENCE_FLUSH_INTERVAL", 60), self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write the pending times now. Returns how many users were written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if pending:
+            CustomUser.objects.bulk_update(
+                [CustomUser(id=user_id, last_seen=moment) for user_id, moment in pending.items()], ["last_seen"]
+            )
+            # bulk_update sends no post_save, and the directory shows
+            # offline advisors' last_seen
+            directory = cache.get(DIRECTORY_KEY)
+            if directory is not None and any(adv["id"] in pending for adv in directory):
+                cache.delete(DIRECTORY_KEY)
+        return len(pending)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+
+last_seen_buffer = LastSeenBuffer()
+
+
+def heartbeat(user):
+    """
+    The user is around: online for PRESENCE_ONLINE_WINDOW seconds, in the
+    cache every worker shares. last_seen is written later, in a batch.
+    Keeping heartbeats off the database takes Redis (REDIS_URL); on the
+    DatabaseCache fallback every heartbeat is a write to its table.
+    """
+    now = timezone.now()
+    cache.set(_presence_key(user.id), now, getattr(settings, "PRESENCE_ONLINE_WINDOW", 75))
+    last_seen_buffer.add(user.id, now)
+
+
+# ================================
+# ADVISORS AND WHO IS ONLINE
+# ================================
+def advisor_directory():
+    """
+    Advisors (superusers if there are none) as [{"id", "name", "last_seen"}],
+    cached until an account changes or an advisor's last_seen is flushed.
+    """
+    directory = cache.get(DIRECTORY_KEY)
+    if directory is None:
+        advisors = CustomUser.objects.filter(is_advisor=True)
+        if not advisors.exists():
+            advisors = CustomUser.objects.filter(is_superuser=True)
+        directory = [
+            {
+                "id": adv.id,
+                "name": f"{adv.first_name} {adv.last_name}" if adv.first_name else adv.username,
+                "last_seen": adv.last_seen,
+            }
+            for adv in advisors.order_by("first_name", "id")
+        ]
+        cache.set(DIRECTORY_KEY, directory, getattr(settings, "PRESENCE_DIRECTORY_TIMEOUT", 3600))
+    return directory
+
+
+def advisors_with_status():
+    """
+    Every advisor with "status" (Online / Offline) and "last_seen", online
+    ones first. Two cache reads and no query once the directory is cached.
+    """
+    directory = advisor_directory()
+    seen = cache.get_many([_presence_key(adv["id"]) for adv in directory])
+    advisors = []
+    for adv in directory:
+        online_since = seen.get(_presence_key(adv["id"]))
+        advisors.append({
+            **adv,
+            "status": "Online" if online_since else "Offline",
+            "last_seen": online_since or adv["last_seen"],
+        })
+    advisors.sort(key=lambda adv: adv["status"] != "Online")
+    return advisors
+
+
+def online_advisor_ids():
+    """Ids of the advisors with a heartbeat in the last PRESENCE_ONLINE_WINDOW seconds."""
+    return {adv["id"] for adv in advisors_with_status() if adv["status"] == "Online"}
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def _forget_directory(sender, update_fields=None, **kwargs):
+    # Logins don't change who the advisors are or what they are called
+    if update_fields and set(update_fields) <= {"last_login", "last_seen"}:
+        return
+    cache.delete(DIRECTORY_KEY)
@@ -0,0 +1,189 @@
+# users/realtime.py
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# Put in a consumer's queue when it fell too far behind; it should refetch
+RESYNC = {"resync": True}
+
+
+def _offer(queue, message):
+    """
+    Queue a message without ever blocking the publisher. A consumer whose
+    queue is full has its backlog replaced by a single RESYNC marker.
+    """
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC)
+
+
+class LocalPubSub:
+    """
+    In-process publish/subscribe between sync code (views publishing after a
+    commit, on any thread) and async consumers waiting on the event loop.
+
+    This is the local stand-in for a shared broker such as Redis pub/sub:
+    every worker process only sees its own publishes, so consumers that must
+    notice other workers' changes also poll the database at a slow interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> {queue: loop}
+
+    def subscribe(self, channel, maxsize=100):
+        """Call from the event loop; returns an asyncio.Queue of messages."""
+        queue = asyncio.Queue(maxsize)
+        with self._lock:
+            self._subscribers.setdefault(channel, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel, {})
+            subscribers.pop(queue, None)
+            if not subscribers:
+                self._subscribers.pop(channel, None)
+
+    def publish(self, channel, message):
+        """Safe to call from any thread."""
+        with self._lock:
+            targets = list(self._subscribers.get(channel, {}).items())
+        for queue, loop in targets:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has shut down
+                self.unsubscribe(channel, queue)
+
+
+class SeatFeed:
+    """
+    Fans seat-map changes out to every open stream of a showtime.
+
+    Each showtime with viewers gets one watcher task per process. It wakes
+    when a local booking publishes a change, or every SEAT_EVENTS_POLL_INTERVAL
+    seconds to pick up other workers' changes, reads the SeatMap row once and
+    pushes the same delta to all streams. An idle viewer costs one queue on
+    the event loop: no thread and no query of its own.
+    """
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+        self._viewers = {}  # showtime key -> set of queues
+        self._watchers = {}  # showtime key -> asyncio.Task
+
+    def notify(self, key):
+        """A showtime's seat map changed; called after commit, from any thread."""
+        self.pubsub.publish(key, "changed")
+
+    async def stream(self, showtime_id, since=None):
+        """
+        Async generator of seat-map change events for one showtime, starting
+        with a catch-up event when the client's `since` version is stale.
+        Yields None when nothing happened for a keepalive interval.
+        """
+        from .seatmap import get_seat_map, seat_map_payload, showtime_key
+
+        key = showtime_key(showtime_id)
+        queue = asyncio.Queue(getattr(settings, "SEAT_EVENTS_QUEUE_SIZE", 100))
+        self._viewers.setdefault(key, set()).add(queue)
+
+        try:
+            snapshot = await sync_to_async(get_seat_map)(showtime_id)
+            if key not in self._watchers:
+                self._watchers[key] = asyncio.get_running_loop().create_task(
+                    self._watch(key, showtime_id, snapshot["version"])
+                )
+            if since != snapshot["version"]:
+                yield await sync_to_async(seat_map_payload)(showtime_id, snapshot, since=since)
+
+            keepalive = getattr(settings, "SEAT_EVENTS_KEEPALIVE", 15)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            viewers = self._viewers.get(key, set())
+            viewers.discard(queue)
+            if not viewers:
+                self._viewers.pop(key, None)
+                watcher = self._watchers.pop(key, None)
+                if watcher:
+                    watcher.cancel()
+
+    async def _watch(self, key, showtime_id, version):
+        from .seatmap import get_seat_map, seat_map_payload
+
+        wake = self.pubsub.subscribe(key)
+        poll_interval = getattr(settings, "SEAT_EVENTS_POLL_INTERVAL", 2)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wake.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+                snapshot = await sync_to_async(get_seat_map)(showtime_id, use_cache=False)
+                if snapshot["version"] == version:
+                    continue
+                event = await sync_to_async(seat_map_payload)(showtime_id, snapshot, since=version)
+                version = snapshot["version"]
+                for queue in list(self._viewers.get(key, ())):
+                    _offer(queue, event)
+        finally:
+            self.pubsub.unsubscribe(key, wake)
+
+
+class ChatFeed:
+    """
+    Delivers new support-chat messages to the open chat sockets.
+
+    A socket waits on its user's channel, which a sent message wakes for
+    both participants in this process, and otherwise checks the database
+    every CHAT_SOCKET_POLL_INTERVAL seconds for messages sent through other
+    workers. Either way it reads only the messages past the last one it
+    delivered.
+    """
+
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def notify(self, *user_ids):
+        """New messages for these users; called after commit, from any thread."""
+        for user_id in user_ids:
+            self.pubsub.publish(user_id, "changed")
+
+    async def stream(self, user, other_user, since_id=0):
+        """
+        Async generator of lists of serialized messages between the two
+        users newer than since_id, marked read as they are delivered.
+        """
+        from .chat import deliver_new
+
+        wake = self.pubsub.subscribe(user.id, maxsize=10)
+        poll_interval = getattr(settings, "CHAT_SOCKET_POLL_INTERVAL", 5)
+        try:
+            while True:
+                messages, has_more = await sync_to_async(deliver_new)(user, other_user, since_id)
+                if messages:
+                    since_id = messages[-1]["id"]
+                    yield messages
+                if has_more:
+                    continue
+                try:
+                    await asyncio.wait_for(wake.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.pubsub.unsubscribe(user.id, wake)
+
+
+seat_feed = SeatFeed(LocalPubSub())
+chat_feed = ChatFeed(LocalPubSub())
@@ -0,0 +1,233 @@
+# users/rollups.py
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import Booking, CustomUser, DailySales
+
+
+def _rollup_row(day, movie_id, movie_name):
+    if movie_id:
+        return DailySales.objects.filter(day=day, movie_id=movie_id)
+    return DailySales.objects.filter(day=day, movie__isnull=True, movie_name=movie_name)
+
+
+def _bump(day, movie_id, movie_name, bookings, seats, revenue):
+    """Add to one day's totals for a movie, creating the row on first sale."""
+    row = _rollup_row(day, movie_id, movie_name)
+    changes = dict(
+        bookings=F("bookings") + bookings,
+        seats=F("seats") + seats,
+        revenue=F("revenue") + revenue,
+    )
+    if row.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(
+                day=day, movie_id=movie_id, movie_name=movie_name, bookings=bookings, seats=seats, revenue=revenue
+            )
+    except IntegrityError:
+        # A concurrent first sale created the row in the meantime
+        row.update(**changes)
+
+
+def _movie_id(booking):
+    return booking.showtime.movie_id if booking.showtime_id else None
+
+
+# ================================
+# KEEPING THE ROLLUPS CURRENT
+# ================================
+def record_booking(booking):
+    """Count a new booking towards the day it was sold on."""
+    _bump(
+        timezone.localdate(booking.created_at), _movie_id(booking), booking.movie_name,
+        1, booking.seat_count, booking.total_paid,
+    )
+
+
+def record_cancellation(booking):
+    """Take a cancelled booking back out of the day it was sold on."""
+    _bump(
+        timezone.localdate(booking.created_at), _movie_id(booking), booking.movie_name,
+        -1, -booking.seat_count, -booking.total_paid,
+    )
+
+
+def sales_of(bookings):
+    """
+    The bookings' totals per (day, movie), read before they are deleted for
+    record_cancellations() to take out afterwards.
+    """
+    return list(
+        bookings.annotate(day=TruncDate("created_at"))
+        .values("day", "showtime__movie", "movie_name")
+        .annotate(bookings=Count("id"), seats=Sum("seat_count"), revenue=Sum("total_paid"))
+        .order_by()
+    )
+
+
+def record_cancellations(sales):
+    """record_cancellation() for the sales_of() some bookings, one update per (day, movie)."""
+    for g in sales:
+        _bump(
+            g["day"], g["showtime__movie"], g["movie_name"],
+            -g["bookings"], -(g["seats"] or 0), -(g["revenue"] or 0),
+        )
+
+
+# ================================
+# REBUILDING FROM BOOKINGS
+# ================================
+def _lock_daily_sales():
+    """
+    Keep record_booking() and record_cancellation() out of DailySales until
+    the transaction ends. PostgreSQL locks the table against writes (reads
+    go on); SQLite allows one writer at a time, so the caller's first write
+    does the same.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {connection.ops.quote_name(DailySales._meta.db_table)} IN EXCLUSIVE MODE")
+
+
+def rebuild_day(day):
+    """
+    Recompute one day's DailySales rows from its bookings, in a transaction
+    that holds the table lock from before the bookings are read until the
+    new rows are in. A booking made meanwhile waits for it and is then
+    added to the rebuilt row, so none is lost or counted twice.
+
+    Returns the number of rows written.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+    with transaction.atomic():
+        _lock_daily_sales()
+        DailySales.objects.filter(day=day).delete()
+        groups = (
+            Booking.objects.filter(created_at__gte=start, created_at__lt=end)
+            .values("showtime__movie", "movie_name")
+            .annotate(bookings=Count("id"), seats=Sum("seat_count"), revenue=Sum("total_paid"))
+            .order_by()
+        )
+        rows = {}
+        for g in groups:
+            movie_id = g["showtime__movie"]
+            # One row per movie, whatever title its bookings were sold under
+            key = (movie_id, None) if movie_id else (None, g["movie_name"])
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = DailySales(day=day, movie_id=movie_id, movie_name=g["movie_name"])
+            row.bookings += g["bookings"]
+            row.seats += g["seats"] or 0
+            row.revenue += g["revenue"] or 0
+        DailySales.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def rebuild_daily_sales(since=None, progress=None):
+    """
+    Recompute DailySales from the Booking table, from `since` (a date) on or
+    for all of history, one day at a time (see rebuild_day), so bookings
+    are only held up for as long as one day takes.
+
+    Returns the number of rollup rows written.
+    """
+    bookings = Booking.objects.all()
+    rollups = DailySales.objects.all()
+    if since is not None:
+        bookings = bookings.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        rollups = rollups.filter(day__gte=since)
+
+    days = set(bookings.annotate(day=TruncDate("created_at")).values_list("day", flat=True).distinct())
+    # Days whose bookings are all gone still have rows to clear
+    days |= set(rollups.values_list("day", flat=True).distinct())
+
+    written = 0
+    for day in sorted(days):
+        written += rebuild_day(day)
+        if progress:
+            progress(day, written)
+    return written
+
+
+def _locked_users(user_ids):
+    """
+    The users, with their rows locked until the transaction ends so no
+    booking or cancellation changes their counters meanwhile. PostgreSQL
+    locks just the rows; SQLite allows one writer at a time, so a write
+    that changes nothing takes that lock before they are read.
+    """
+    users = CustomUser.objects.filter(pk__in=user_ids).order_by("pk").only("pk", "total_spent", "booking_count")
+    if connection.features.has_select_for_update:
+        return list(users.select_for_update())
+    users.update(booking_count=F("booking_count"))
+    return list(users)
+
+
+def rebuild_customer_stats(batch_size=1000, progress=None):
+    """
+    Recompute CustomUser.total_spent and booking_count from the bookings,
+    one primary-key batch of users at a time, each in a transaction that
+    holds the batch's rows from before their bookings are summed until the
+    totals are written. Returns the users updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            CustomUser.objects.filter(pk__gt=last_id).order_by("pk").values_list("pk", flat=True)[:batch_size]
+        )
+        if not user_ids:
+            break
+        with transaction.atomic():
+            users = _locked_users(user_ids)
+            stats = {
+                row["user_id"]: row
+                for row in Booking.objects.filter(user_id__in=user_ids)
+                .values("user_id")
+                .annotate(spent=Sum("total_paid"), count=Count("id"))
+                .order_by()
+            }
+            changed = []
+            for user in users:
+                row = stats.get(user.pk, {})
+                spent, count = row.get("spent") or 0, row.get("count", 0)
+                if user.total_spent != spent or user.booking_count != count:
+                    user.total_spent, user.booking_count = spent, count
+                    changed.append(user)
+            CustomUser.objects.bulk_update(changed, ["total_spent", "booking_count"], batch_size=batch_size)
+        updated += len(changed)
+        last_id = user_ids[-1]
+        if progress:
+            progress(last_id, updated)
+    return updated
+
+
+# ================================
+# DASHBOARD READS
+# ================================
+def sales_totals():
+    """All-time bookings and revenue, summed over the rollups."""
+    totals = DailySales.objects.aggregate(bookings=Sum("bookings"), revenue=Sum("revenue"))
+    return totals["bookings"] or 0, totals["revenue"] or 0
+
+
+def popular_movies(limit=5):
+    """
+    The best-selling movies with their current title, booking count and
+    revenue. Rows not linked to a movie are grouped by the title they have.
+    """
+    return list(
+        DailySales.objects.annotate(title=Coalesce("movie__title", "movie_name"))
+        .values("movie", "title")
+        .annotate(count=Sum("bookings"), revenue=Sum("revenue"))
+        .filter(count__gt=0)
+        .order_by("-count")[:limit]
+    )
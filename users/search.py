@@ -0,0 +1,175 @@
+# users/search.py
+import re
+from functools import reduce
+from operator import or_
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Booking, CustomUser
+from .tickets import is_valid_ticket_number
+
+# kind -> (model, SQLite FTS5 shadow table, searchable columns)
+SEARCHES = {
+    "user": (CustomUser, "users_customuser_fts", ("email", "first_name", "last_name", "phone", "customer_id")),
+    "booking": (Booking, "users_booking_fts", ("ticket_number", "movie_name")),
+}
+
+# Trigram indexes match three characters or more; shorter terms fall back to a scan
+MIN_INDEXED_LENGTH = 3
+
+CUSTOMER_ID_RE = re.compile(r"^[A-Z0-9]{10}$")
+
+
+def _fts_ready(using="default"):
+    return connections[using].vendor == "sqlite" and _fts_available(connections[using])
+
+
+def _fts_available(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE name = %s", [SEARCHES["user"][1]])
+        return cursor.fetchone()[0] > 0
+
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+# ================================
+# FILTERS
+# ================================
+def exact_filter(kind, term):
+    """
+    Q for an exact hit on a unique index (ticket number, customer id or
+    login email), or None if the term can't be one.
+    """
+    term = term.strip()
+    if kind == "booking":
+        if is_valid_ticket_number(term.upper()):
+            return Q(ticket_number=term.upper())
+        return None
+    if CUSTOMER_ID_RE.match(term.upper()):
+        return Q(customer_id=term.upper())
+    if "@" in term:
+        # Accounts log in with their email as username
+        return Q(username=term)
+    return None
+
+
+def text_filter(kind, term, fields=None):
+    """
+    Q for rows whose `fields` contain `term`, case-insensitively.
+
+    On SQLite this is a lookup in the FTS5 trigram shadow table; on
+    PostgreSQL the icontains lookups are served by the pg_trgm GIN indexes
+    on UPPER(column). Terms under three characters fall back to icontains.
+    """
+    model, table, all_fields = SEARCHES[kind]
+    fields = tuple(fields or all_fields)
+    term = term.strip()
+
+    if len(term) >= MIN_INDEXED_LENGTH and _fts_ready():
+        expr = _fts_phrase(term)
+        if fields != all_fields:
+            expr = "{%s} : %s" % (" ".join(fields), expr)
+        return Q(pk__in=RawSQL(f"SELECT rowid FROM {table} WHERE {table} MATCH %s", [expr]))
+
+    return reduce(or_, [Q(**{f"{field}__icontains": term}) for field in fields])
+
+
+# ================================
+# RANKED SEARCH
+# ================================
+def _ranked_ids(kind, term, limit):
+    model, table, fields = SEARCHES[kind]
+
+    if len(term) >= MIN_INDEXED_LENGTH and _fts_ready():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s",
+                [_fts_phrase(term), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    matches = model.objects.filter(text_filter(kind, term))
+    if len(term) >= MIN_INDEXED_LENGTH and connection.vendor == "postgresql":
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models.functions import Greatest
+
+        similarity = Greatest(*[TrigramSimilarity(field, term) for field in fields])
+        matches = matches.annotate(similarity=similarity).order_by("-similarity", "-pk")
+    else:
+        matches = matches.order_by("-pk")
+    return list(matches.values_list("pk", flat=True)[:limit])
+
+
+def search(kind, term, limit=50):
+    """
+    Best matches for a support search box: exact hits on a unique index
+    first, then contains-matches by relevance (bm25 on SQLite, trigram
+    similarity on PostgreSQL).
+    """
+    model = SEARCHES[kind][0]
+    term = term.strip()
+    if not term:
+        return []
+
+    exact = exact_filter(kind, term)
+    results = list(model.objects.filter(exact)[:limit]) if exact else []
+    if results and kind == "booking":
+        return results
+
+    seen = {obj.pk for obj in results}
+    ids = [pk for pk in _ranked_ids(kind, term, limit) if pk not in seen]
+    found = model.objects.in_bulk(ids)
+    results += [found[pk] for pk in ids if pk in found]
+    return results[:limit]
+
+
+# ================================
+# SHADOW TABLES (SQLite)
+# ================================
+def _fts_statements(model, table, fields):
+    source = model._meta.db_table
+    columns = ", ".join(fields)
+    new_values = ", ".join(f"new.{field}" for field in fields)
+    old_values = ", ".join(f"old.{field}" for field in fields)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{columns}, content='{source}', content_rowid='id', tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {columns} ON {source} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {table}(rowid, {columns}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def ensure_search_tables(using="default"):
+    """
+    Create the FTS5 shadow tables and their sync triggers on SQLite, and
+    rebuild an index whenever its triggers had to be (re)created. Runs after
+    every migrate, because SQLite migrations that alter a table rebuild it
+    and drop its triggers.
+    """
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        for model, table, fields in SEARCHES.values():
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f"{table}_a_"],
+            )
+            complete = cursor.fetchone()[0] == 3
+            for statement in _fts_statements(model, table, fields):
+                cursor.execute(statement)
+            if not complete:
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def on_post_migrate(using="default", **kwargs):
+    ensure_search_tables(using)
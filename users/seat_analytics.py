@@ -0,0 +1,109 @@
+# users/seat_analytics.py
+import warnings
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Booking
+from .seating import parse_seats
+from .seatmap import CAPACITY, SEAT_ROWS, SEATS_PER_ROW, seat_index
+
+# Hours before the show at which the fill curve is sampled
+FILL_CURVE_HOURS = (336, 168, 72, 48, 24, 12, 6, 3, 1, 0)
+
+
+def _cache_key(movie_id):
+    return f"seat_analytics:{movie_id}"
+
+
+def _decode(movie_id):
+    """
+    Decode the movie's bookings into a showtime x seat matrix holding how
+    many hours before the show each seat was sold (NaN where unsold).
+    """
+    import numpy as np
+
+    rows = (
+        Booking.objects.filter(showtime__movie_id=movie_id)
+        .values_list("showtime_id", "showtime__starts_at", "created_at", "seats")
+        .iterator(chunk_size=5000)
+    )
+
+    showtimes = {}
+    booking_rows, booking_leads, seat_counts, seat_columns = [], [], [], []
+    columns = {}
+    for showtime_id, starts_at, created_at, seats in rows:
+        found = 0
+        for seat in parse_seats(seats)[0]:
+            column = columns.get(seat)
+            if column is None:
+                column = columns[seat] = seat_index(seat)
+            seat_columns.append(column)
+            found += 1
+        if not found:
+            continue
+        booking_rows.append(showtimes.setdefault(showtime_id, len(showtimes)))
+        booking_leads.append((starts_at - created_at).total_seconds() / 3600)
+        seat_counts.append(found)
+
+    lead = np.full((len(showtimes), CAPACITY), np.nan)
+    if seat_counts:
+        counts = np.array(seat_counts)
+        row_of_seat = np.repeat(np.array(booking_rows), counts)
+        lead_of_seat = np.repeat(np.clip(np.array(booking_leads), 0, None), counts)
+        lead[row_of_seat, np.array(seat_columns)] = lead_of_seat
+    return lead
+
+
+def compute_seat_analytics(movie_id):
+    """
+    Per-seat sell-through and median hours-before-show of sale, plus the
+    average fill curve, for every showtime of a movie.
+    """
+    import numpy as np
+
+    lead = _decode(movie_id)
+    showtime_count = lead.shape[0]
+    sold = ~np.isnan(lead)
+
+    if showtime_count:
+        sell_through = sold.mean(axis=0)
+        with warnings.catch_warnings():
+            # Seats never sold have an all-NaN column
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median_lead = np.nanmedian(lead, axis=0)
+        hours = np.array(FILL_CURVE_HOURS, dtype=float)
+        # Share of seats already sold at each point before the show, per showtime
+        fill = (np.nan_to_num(lead, nan=-1.0)[:, :, None] >= hours).sum(axis=1) / CAPACITY
+        fill_curve = fill.mean(axis=0)
+    else:
+        sell_through = np.zeros(CAPACITY)
+        median_lead = np.full(CAPACITY, np.nan)
+        fill_curve = np.zeros(len(FILL_CURVE_HOURS))
+
+    def grid(values, digits):
+        values = np.round(values, digits).reshape(len(SEAT_ROWS), SEATS_PER_ROW)
+        return [[None if np.isnan(v) else float(v) for v in row] for row in values]
+
+    return {
+        "movie": movie_id,
+        "showtimes": showtime_count,
+        "seats_sold": int(sold.sum()),
+        "rows": list(SEAT_ROWS),
+        "seats_per_row": SEATS_PER_ROW,
+        "sell_through": grid(sell_through, 3),
+        "median_hours_before": grid(median_lead, 1),
+        "fill_curve": [
+            {"hours_before": h, "fill": round(float(f), 3)} for h, f in zip(FILL_CURVE_HOURS, fill_curve)
+        ],
+    }
+
+
+def seat_analytics(movie_id, refresh=False):
+    """compute_seat_analytics(), cached per movie for SEAT_ANALYTICS_CACHE_TIMEOUT."""
+    key = _cache_key(movie_id)
+    result = None if refresh else cache.get(key)
+    if result is None:
+        result = compute_seat_analytics(movie_id)
+        cache.set(key, result, getattr(settings, "SEAT_ANALYTICS_CACHE_TIMEOUT", 3600))
+    return result
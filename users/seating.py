@@ -0,0 +1,228 @@
+# users/seating.py
+import hashlib
+from datetime import datetime, time as dt_time, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Movie, SeatReservation, Showtime
+from .seatmap import is_seat_map_cached, seat_index, seat_label
+
+
+def normalize_seats(seat_ids):
+    """
+    Split seat ids into (seats, invalid): the ones in the hall layout in the
+    canonical "A1" form ("a1" and "A001" are A1 too), unique and in the
+    order given, and the ones that aren't, as given. Reservations and holds
+    only ever store the canonical form, so the unique index sees every
+    spelling of a seat as the same seat.
+    """
+    seats, invalid = [], []
+    for seat_id in seat_ids:
+        index = seat_index(seat_id)
+        if index is None:
+            invalid.append(seat_id)
+        else:
+            seats.append(seat_label(index))
+    return list(dict.fromkeys(seats)), list(dict.fromkeys(invalid))
+
+
+def parse_seats(raw_seats):
+    """
+    Turn a "A1, A2,A3" style string into normalize_seats() of its ids,
+    keeping the order the user picked them in.
+    """
+    return normalize_seats(s.strip() for s in (raw_seats or "").split(",") if s.strip())
+
+
+def showtime_start(date, time_str):
+    """
+    Start of a showtime from the date and "HH:MM" text stored on older
+    bookings (UTC, like the scheduled dates they were copied from).
+    """
+    for fmt in ("%H:%M", "%H:%M:%S", "%H%M", "%I:%M %p", "%I:%M%p"):
+        try:
+            clock = datetime.strptime((time_str or "").strip(), fmt).time()
+            break
+        except ValueError:
+            continue
+    else:
+        clock = dt_time.min
+    return datetime.combine(date, clock, tzinfo=dt_timezone.utc)
+
+
+def showtime_date_time(showtime):
+    """The (date, "HH:MM") a booking for this showtime is printed with."""
+    return showtime.starts_at.date(), showtime.starts_at.strftime("%H:%M")
+
+
+def scheduled_start(movie):
+    """
+    Start of the showtime at a movie's scheduled date. Bookings record the
+    time to the minute, so screenings always start on one.
+    """
+    if movie.scheduled_date:
+        return movie.scheduled_date.replace(second=0, microsecond=0)
+    return None
+
+
+def sync_scheduled_showtime(movie, previous_date=None):
+    """
+    Keep a Showtime at the movie's scheduled date after it is added or
+    edited. A rescheduled screening moves along unless seats were already
+    sold or held for it, in which case it stays and a new one is added.
+    """
+    starts_at = scheduled_start(movie)
+    if previous_date:
+        previous_start = previous_date.replace(second=0, microsecond=0)
+        if previous_start != starts_at:
+            Showtime.objects.filter(movie=movie, starts_at=previous_start, reservations__isnull=True).delete()
+    if starts_at:
+        Showtime.objects.get_or_create(movie=movie, starts_at=starts_at)
+    forget_default_showtime(movie.title)
+
+
+def default_showtime(movie):
+    """
+    The screening a movie page books by default: the next upcoming one,
+    else the one at its scheduled date. None if the movie has neither.
+    """
+    upcoming = movie.showtimes.filter(starts_at__gte=timezone.now()).first()
+    if upcoming or not movie.scheduled_date:
+        return upcoming
+    showtime, _ = Showtime.objects.get_or_create(movie=movie, starts_at=scheduled_start(movie))
+    return showtime
+
+
+def _default_showtime_key(title):
+    return "movie-showtime:" + hashlib.md5(title.encode("utf-8")).hexdigest()
+
+
+def default_showtime_id(title):
+    """
+    Id of default_showtime() for the movie with this title, or None. Cached
+    so seat-map polling doesn't query Movie each time.
+    """
+    key = _default_showtime_key(title)
+    showtime_id = cache.get(key)
+    if showtime_id is None:
+        movie_obj = Movie.objects.filter(title=title).first()
+        showtime = default_showtime(movie_obj) if movie_obj else None
+        showtime_id = showtime.pk if showtime else 0
+        cache.set(key, showtime_id, getattr(settings, "MOVIE_SHOWTIME_CACHE_TIMEOUT", 300))
+    return showtime_id or None
+
+
+def forget_default_showtime(*titles):
+    """Drop cached default showtimes after a movie is edited or deleted."""
+    cache.delete_many([_default_showtime_key(title) for title in titles if title])
+
+
+def requested_showtime_id(title, raw_id=None):
+    """
+    Showtime a request is about: the ?showtime= id it names if that exists,
+    else the default screening of the title in its URL. A showtime whose
+    seat map is cached needs no query, so conditional seat-map polls
+    answered 304 don't touch the database.
+    """
+    if raw_id and str(raw_id).isdigit():
+        showtime_id = int(raw_id)
+        if is_seat_map_cached(showtime_id) or Showtime.objects.filter(pk=showtime_id).exists():
+            return showtime_id
+    return default_showtime_id(title)
+
+
+def movie_for_booking(booking):
+    """
+    The Movie a booking is for, through its showtime. Bookings the
+    backfill_showtimes command hasn't linked yet fall back to the title.
+    """
+    if booking.showtime_id:
+        return booking.showtime.movie
+    return Movie.objects.filter(title=booking.movie_name).first()
+
+
+def showtime_reservations(showtime_id):
+    return SeatReservation.objects.filter(showtime_id=showtime_id)
+
+
+def _unavailable_to(user, now):
+    """
+    Seats count as taken when they are booked, or held by someone else and
+    the hold hasn't expired yet. Expired holds are simply ignored here.
+    """
+    taken = Q(booking__isnull=False) | Q(held_until__gt=now)
+    if user is not None:
+        taken &= ~Q(booking__isnull=True, holder=user)
+    return taken
+
+
+def find_conflicting_seats(showtime_id, seat_list, user=None):
+    """
+    Return the seats from seat_list that are booked, or held by someone other
+    than `user`, for the showtime.
+    """
+    return list(
+        showtime_reservations(showtime_id)
+        .filter(_unavailable_to(user, timezone.now()), seat_id__in=seat_list)
+        .values_list("seat_id", flat=True)
+    )
+
+
+def purge_expired_holds(showtime_id, seat_list, keep_holder=None):
+    """
+    Delete lapsed holds on just the seats about to be claimed. Expiry is lazy:
+    nothing sweeps the table, a dead hold is removed by whoever needs the seat.
+    """
+    expired = showtime_reservations(showtime_id).filter(
+        seat_id__in=seat_list, booking__isnull=True, held_until__lte=timezone.now()
+    )
+    if keep_holder is not None:
+        expired = expired.exclude(holder=keep_holder)
+    expired.delete()
+
+
+def reserve_seats(booking, seat_list):
+    """
+    Create one SeatReservation row per seat of the booking, turning any holds
+    the booking's user has on those seats into the booked rows.
+    """
+    own_holds = showtime_reservations(booking.showtime_id).filter(
+        seat_id__in=seat_list, booking__isnull=True, holder_id=booking.user_id
+    )
+    held = set(own_holds.values_list("seat_id", flat=True))
+    if held:
+        own_holds.update(booking=booking, holder=None, held_until=None)
+
+    SeatReservation.objects.bulk_create([
+        SeatReservation(
+            booking=booking,
+            showtime_id=booking.showtime_id,
+            seat_id=seat_id,
+        )
+        for seat_id in seat_list if seat_id not in held
+    ])
+
+
+def hold_seats(user, showtime_id, seat_list, held_until):
+    """
+    Make seat_list the user's complete set of holds for the showtime: holds on
+    seats no longer selected are dropped, kept ones are extended and new ones
+    are inserted (the unique index rejects seats someone else has).
+    """
+    mine = showtime_reservations(showtime_id).filter(booking__isnull=True, holder=user)
+    mine.exclude(seat_id__in=seat_list).delete()
+    already = set(mine.values_list("seat_id", flat=True))
+    mine.update(held_until=held_until)
+
+    SeatReservation.objects.bulk_create([
+        SeatReservation(
+            holder=user,
+            held_until=held_until,
+            showtime_id=showtime_id,
+            seat_id=seat_id,
+        )
+        for seat_id in seat_list if seat_id not in already
+    ])
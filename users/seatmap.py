@@ -0,0 +1,221 @@
+# users/seatmap.py
+import base64
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SeatMap, SeatMapVersion, SeatReservation
+from .realtime import seat_feed
+
+# Hall layout, matching the seat grid drawn in movie_details.html
+SEAT_ROWS = "ABCDE"
+SEATS_PER_ROW = 7
+CAPACITY = len(SEAT_ROWS) * SEATS_PER_ROW
+ALL_SEATS = (1 << CAPACITY) - 1
+
+
+# ================================
+# SEAT <-> BIT CONVERSION
+# ================================
+def seat_index(seat_id):
+    """
+    Bit position of a seat id like "C4", or None if it isn't in the layout.
+    """
+    row, number = seat_id[:1].upper(), seat_id[1:]
+    if row not in SEAT_ROWS or not number.isdigit() or not 1 <= int(number) <= SEATS_PER_ROW:
+        return None
+    return SEAT_ROWS.index(row) * SEATS_PER_ROW + int(number) - 1
+
+
+def seat_label(index):
+    return f"{SEAT_ROWS[index // SEATS_PER_ROW]}{index % SEATS_PER_ROW + 1}"
+
+
+def bits_from_seats(seat_ids):
+    bits = 0
+    for seat_id in seat_ids:
+        index = seat_index(seat_id)
+        if index is not None:
+            bits |= 1 << index
+    return bits
+
+
+def seats_from_bits(bits):
+    return [seat_label(i) for i in range(CAPACITY) if bits >> i & 1]
+
+
+def to_bytes(bits):
+    return bits.to_bytes((CAPACITY + 7) // 8, "little")
+
+
+def from_bytes(data):
+    return int.from_bytes(bytes(data or b""), "little")
+
+
+def encode_bits(bits):
+    """Base64 of the little-endian bitset, as served to the seat map JS."""
+    return base64.b64encode(to_bytes(bits)).decode("ascii")
+
+
+# ================================
+# STORED / CACHED MAPS
+# ================================
+def showtime_key(showtime_id):
+    return str(showtime_id)
+
+
+def _cache_key(showtime_id):
+    return f"seatmap:{showtime_id}"
+
+
+def _snapshot(seat_map):
+    return {
+        "version": seat_map.version,
+        "booked": from_bytes(seat_map.booked),
+        "held": from_bytes(seat_map.held),
+        "holds_expire_at": seat_map.holds_expire_at,
+    }
+
+
+def refresh_seat_map(showtime_id):
+    """
+    Rebuild a showtime's bitsets from its reservation rows, deleting holds
+    that have expired, and bump the version if anything changed. Call it
+    inside the transaction that changed the reservations; the row lock
+    keeps concurrent rebuilds in order and the cache is only updated once
+    the change has committed.
+    """
+    seat_map, _ = SeatMap.objects.select_for_update().get_or_create(showtime_id=showtime_id)
+
+    now = timezone.now()
+    # Lapsed holds are dropped here, so they don't pile up on seats nobody claimed
+    SeatReservation.objects.filter(showtime_id=showtime_id, booking__isnull=True, held_until__lte=now).delete()
+    booked = held = 0
+    holds_expire_at = None
+    rows = SeatReservation.objects.filter(showtime_id=showtime_id).values_list("seat_id", "booking_id", "held_until")
+    for seat_id, booking_id, held_until in rows:
+        index = seat_index(seat_id)
+        if index is None:
+            continue
+        if booking_id:
+            booked |= 1 << index
+        elif held_until and held_until > now:
+            held |= 1 << index
+            holds_expire_at = min(holds_expire_at or held_until, held_until)
+
+    changed = booked != from_bytes(seat_map.booked) or held != from_bytes(seat_map.held)
+    if changed:
+        seat_map.version += 1
+    seat_map.booked = to_bytes(booked)
+    seat_map.held = to_bytes(held)
+    seat_map.holds_expire_at = holds_expire_at
+    seat_map.save()
+
+    if changed:
+        SeatMapVersion.objects.create(seat_map=seat_map, version=seat_map.version, booked=seat_map.booked, held=seat_map.held)
+        history = getattr(settings, "SEATMAP_HISTORY", 100)
+        SeatMapVersion.objects.filter(seat_map=seat_map, version__lte=seat_map.version - history).delete()
+
+    snapshot = _snapshot(seat_map)
+
+    def publish():
+        cache.set(_cache_key(showtime_id), snapshot, getattr(settings, "SEATMAP_CACHE_TIMEOUT", 5))
+        if changed:
+            seat_feed.notify(showtime_key(showtime_id))
+
+    transaction.on_commit(publish)
+    return snapshot
+
+
+def is_seat_map_cached(showtime_id):
+    """Whether the showtime's map is in the cache (so the showtime exists)."""
+    return cache.get(_cache_key(showtime_id)) is not None
+
+
+def get_seat_map(showtime_id, use_cache=True):
+    """
+    Current bitsets of a showtime: from the cache, else from its SeatMap row.
+    Holds lapse lazily: once the earliest hold has expired the map is
+    rebuilt on read, which deletes the lapsed rows, so no sweeper is needed.
+    """
+    snapshot = cache.get(_cache_key(showtime_id)) if use_cache else None
+    if snapshot is None:
+        seat_map = SeatMap.objects.filter(showtime_id=showtime_id).first()
+        if seat_map is not None:
+            snapshot = _snapshot(seat_map)
+            cache.set(_cache_key(showtime_id), snapshot, getattr(settings, "SEATMAP_CACHE_TIMEOUT", 5))
+
+    expired = snapshot and snapshot["holds_expire_at"] and snapshot["holds_expire_at"] <= timezone.now()
+    if snapshot is None or expired:
+        with transaction.atomic():
+            snapshot = refresh_seat_map(showtime_id)
+    return snapshot
+
+
+def unavailable_bits(snapshot, own_held=0):
+    """Seats nobody else can take: booked, or held by someone other than the viewer."""
+    return snapshot["booked"] | (snapshot["held"] & ~own_held)
+
+
+def available_count(snapshot):
+    return CAPACITY - (snapshot["booked"] | snapshot["held"]).bit_count()
+
+
+def etag_for(snapshot, own_held=0):
+    """ETag of the map as one viewer sees it (their own holds are masked out)."""
+    return f'"{snapshot["version"]}-{own_held:x}"'
+
+
+def get_seat_map_delta(showtime_id, since, snapshot, own_held=0):
+    """
+    Seats booked, released, held and unheld between version `since` and the
+    current snapshot, diffed from the stored bitsets of that version. Returns
+    None when that version is unknown or too old, so the caller sends the
+    full map instead.
+    """
+    if since > snapshot["version"]:
+        return None
+    if since == snapshot["version"]:
+        old_booked, old_held = snapshot["booked"], snapshot["held"]
+    elif since == 0:
+        old_booked = old_held = 0
+    else:
+        past = SeatMapVersion.objects.filter(
+            seat_map__showtime_id=showtime_id, version=since
+        ).values_list("booked", "held").first()
+        if past is None:
+            return None
+        old_booked, old_held = from_bytes(past[0]), from_bytes(past[1])
+
+    booked, held = snapshot["booked"], snapshot["held"] & ~own_held
+    old_held &= ~own_held
+    return {
+        "booked_seats": seats_from_bits(booked & ~old_booked),
+        "released_seats": seats_from_bits(old_booked & ~booked),
+        "held_seats": seats_from_bits(held & ~old_held),
+        "unheld_seats": seats_from_bits(old_held & ~held),
+    }
+
+
+def seat_map_payload(showtime_id, snapshot, own_held=0, since=None):
+    """
+    JSON body describing a seat map: the delta since version `since` when it
+    can be computed, otherwise the full base64 bitsets.
+    """
+    available = available_count(snapshot)
+    data = {
+        "version": snapshot["version"],
+        "capacity": CAPACITY,
+        "available": available,
+        "sold_out": available == 0,
+    }
+    delta = None
+    if since is not None and showtime_id is not None:
+        delta = get_seat_map_delta(showtime_id, since, snapshot, own_held)
+    if delta is not None:
+        data.update(delta, since=since)
+    else:
+        data.update(booked=encode_bits(snapshot["booked"]), held=encode_bits(snapshot["held"] & ~own_held))
+    return data
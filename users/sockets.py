@@ -0,0 +1,125 @@
+# users/sockets.py
+import asyncio
+import json
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.http.request import split_domain_port, validate_host
+
+from .models import CustomUser
+from .realtime import chat_feed
+
+# Close codes sent before the handshake is accepted (the client sees a 403/404)
+FORBIDDEN = 4403
+NOT_FOUND = 4404
+
+
+# ================================
+# HANDSHAKE HELPERS
+# ================================
+def _headers(scope):
+    return {name.decode("latin-1"): value.decode("latin-1") for name, value in scope.get("headers", [])}
+
+
+def _origin_allowed(headers):
+    """
+    Browsers send cookies with cross-site WebSocket handshakes and CSRF
+    checks don't apply to them, so the Origin must be one of ALLOWED_HOSTS.
+    """
+    origin = headers.get("origin")
+    if not origin:
+        return True
+    host = re.sub(r"^\w+://", "", origin)
+    domain, _ = split_domain_port(host)
+    allowed = settings.ALLOWED_HOSTS
+    if settings.DEBUG and not allowed:
+        allowed = [".localhost", "127.0.0.1", "[::1]"]
+    return bool(domain) and validate_host(domain, allowed)
+
+
+async def _user(headers):
+    """The user logged in to the session the handshake's cookie names."""
+    cookie = SimpleCookie(headers.get("cookie", ""))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value if morsel else None)
+    return await aget_user(SimpleNamespace(session=session))
+
+
+# ================================
+# CHAT SOCKET
+# ================================
+async def chat_socket(scope, receive, send, other_user_id):
+    """
+    /ws/chat/<other_user_id>/?since_id=<id>: sends {"messages": [...]} (the
+    same items as /api/chat/get/) whenever messages past since_id arrive in
+    the conversation. Messages are still sent through /api/chat/send/.
+    """
+    if (await receive())["type"] != "websocket.connect":
+        return
+
+    headers = _headers(scope)
+    user = await _user(headers)
+    if not user.is_authenticated or not _origin_allowed(headers):
+        await send({"type": "websocket.close", "code": FORBIDDEN})
+        return
+    other_user = await CustomUser.objects.filter(id=other_user_id).afirst()
+    if other_user is None:
+        await send({"type": "websocket.close", "code": NOT_FOUND})
+        return
+
+    since_id = parse_qs(scope.get("query_string", b"").decode()).get("since_id", ["0"])[0]
+    since_id = int(since_id) if since_id.isdigit() else 0
+
+    await send({"type": "websocket.accept"})
+
+    async def deliver():
+        stream = chat_feed.stream(user, other_user, since_id)
+        try:
+            async for messages in stream:
+                await send({"type": "websocket.send", "text": json.dumps({"messages": messages})})
+        finally:
+            await stream.aclose()
+
+    async def wait_for_disconnect():
+        # Clients only listen; anything they send is ignored
+        while (await receive())["type"] != "websocket.disconnect":
+            pass
+
+    delivering = asyncio.ensure_future(deliver())
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        await asyncio.wait({delivering, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        failed = delivering.done() and not delivering.cancelled() and delivering.exception()
+        delivering.cancel()
+        disconnected.cancel()
+        # Let the stream unsubscribe before the connection is gone
+        await asyncio.gather(delivering, disconnected, return_exceptions=True)
+    if failed:
+        await send({"type": "websocket.close", "code": 1011})
+        raise failed
+
+
+# ================================
+# ROUTING
+# ================================
+ROUTES = [
+    (re.compile(r"^/ws/chat/(?P<other_user_id>\d+)/$"), chat_socket),
+]
+
+
+async def websocket_application(scope, receive, send):
+    """ASGI app for every WebSocket connection; HTTP goes to Django."""
+    for pattern, handler in ROUTES:
+        match = pattern.match(scope["path"])
+        if match:
+            kwargs = {name: int(value) for name, value in match.groupdict().items()}
+            return await handler(scope, receive, send, **kwargs)
+
+    await receive()
+    await send({"type": "websocket.close", "code": NOT_FOUND})
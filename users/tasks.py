@@ -0,0 +1,44 @@
+# users/tasks.py
+# Background jobs queued with users.jobs.enqueue. They take ids and plain
+# values, load what they need when they run, and raise when a send fails
+# so the queue retries it.
+from . import email_utils
+from .models import Booking, CustomUser
+
+
+def _check_sent(sent, what):
+    if not sent:
+        raise RuntimeError(f"{what} email was not sent (see worker output)")
+
+
+def send_registration_email(user_id, base_url):
+    # Skip users who were deleted or have activated in the meantime
+    user = CustomUser.objects.filter(pk=user_id, is_active=False).first()
+    if user is not None:
+        _check_sent(email_utils.send_registration_email(user, base_url), "Activation")
+
+
+def send_password_reset_email(user_id, base_url):
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is not None:
+        _check_sent(email_utils.send_password_reset_email(user, base_url), "Password reset")
+
+
+def send_booking_confirmation_email(booking_id):
+    booking = Booking.objects.select_related("user").filter(pk=booking_id).first()
+    if booking is not None:
+        _check_sent(email_utils.send_booking_confirmation_email(booking.user, booking), "Booking confirmation")
+
+
+def send_booking_cancellation_email(user_id, movie_name):
+    # The booking row is gone by now; the email only needs its title
+    user = CustomUser.objects.filter(pk=user_id).first()
+    if user is not None:
+        booking = Booking(movie_name=movie_name)
+        _check_sent(email_utils.send_booking_cancellation_email(user, booking), "Cancellation")
+
+
+def send_account_deletion_email(email, first_name, username):
+    # The account is deleted before this runs, so only its contact details are passed
+    user = CustomUser(email=email, first_name=first_name, username=username)
+    _check_sent(email_utils.send_account_deletion_email(user), "Account deletion")
@@ -1,3 +1,1203 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import mail, signing
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import booking_service
+from .booking_service import (
+    book_seats,
+    cancel_booking,
+    delete_user,
+    place_hold,
+    release_holds,
+    BookingError,
+    InsufficientFunds,
+    InvalidSeats,
+    SeatsUnavailable,
+)
+from . import chat, tasks
+from .chat import check_conversation_counters, conversation, mark_conversation_read, record_message, unread_count
+from .rollups import popular_movies, rebuild_customer_stats, rebuild_daily_sales
+from .pagination import KeysetPaginator
+from .seat_analytics import compute_seat_analytics
+from .seatmap import get_seat_map, refresh_seat_map, seats_from_bits
+from .presence import advisors_with_status, heartbeat, last_seen_buffer
+from .models import (
+    Booking,
+    ChatMessage,
+    Conversation,
+    CustomUser,
+    DailySales,
+    Job,
+    Movie,
+    Notification,
+    SeatReservation,
+    Showtime,
+    TicketSequence,
+)
+from .jobs import claim_jobs, enqueue, run_job
+from .kpis import get_kpis
+from .search import exact_filter, search, text_filter
+from .timeseries import parse_bound, timeseries
+from .realtime import chat_feed, seat_feed
+from .tickets import is_valid_ticket_number, next_ticket_number, reserve_block
+
+
+def run_in_parallel(target, args_list):
+    """
+    Run target(*args) for every entry of args_list on its own thread, releasing
+    them together, and collect each result or raised exception.
+    """
+    barrier = threading.Barrier(len(args_list))
+    results = [None] * len(args_list)
+
+    def worker(index, args):
+        try:
+            barrier.wait()
+            results[index] = target(*args)
+        except Exception as e:
+            results[index] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Stress the booking transaction from parallel threads, each on its own DB
+    connection, the way parallel gunicorn workers would hit it.
+    """
+
+    price = Decimal("100.00")
+
+    def setUp(self):
+        movie = Movie.objects.create(title="Flash Sale Concert", duration="90", category="Concert", price=self.price)
+        self.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+
+    def make_user(self, n, balance):
+        return CustomUser.objects.create_user(
+            username=f"fan{n}@example.com", email=f"fan{n}@example.com", balance=balance
+        )
+
+    def book(self, user, seats):
+        return book_seats(user, self.showtime, seats, self.price)
+
+    def test_same_seat_is_never_sold_twice(self):
+        users = [self.make_user(n, Decimal("1000.00")) for n in range(12)]
+
+        results = run_in_parallel(self.book, [(u, ["A1", "A2"]) for u in users])
+
+        self.assertFalse([r for r in results if isinstance(r, Exception) and not isinstance(r, BookingError)])
+        winners = [r for r in results if not isinstance(r, BookingError)]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(SeatReservation.objects.count(), 2)
+        total = sum(CustomUser.objects.values_list("balance", flat=True))
+        self.assertEqual(total, Decimal("1000.00") * len(users) - 2 * self.price)
+
+    def test_wallet_is_never_overdrawn(self):
+        user = self.make_user(0, Decimal("300.00"))
+        seats = [f"B{n}" for n in range(1, 8)] + ["C1"]
+
+        results = run_in_parallel(self.book, [(user, [seat]) for seat in seats])
+
+        self.assertEqual(sum(1 for r in results if not isinstance(r, Exception)), 3)
+        self.assertTrue(all(isinstance(r, InsufficientFunds) for r in results if isinstance(r, Exception)))
+        user.refresh_from_db()
+        self.assertEqual(user.balance, Decimal("0.00"))
+        self.assertEqual(SeatReservation.objects.count(), 3)
+
+
+class RollupTests(TransactionTestCase):
+    price = Decimal("100.00")
+
+    def setUp(self):
+        self.movie = Movie.objects.create(title="Old Title", duration="90", category="Movie", price=self.price)
+        self.showtime = Showtime.objects.create(
+            movie=self.movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc)
+        )
+
+    def make_user(self, n):
+        return CustomUser.objects.create_user(
+            username=f"fan{n}@example.com", email=f"fan{n}@example.com", balance=Decimal("1000.00")
+        )
+
+    def assertRollupsMatchBookings(self):
+        rows = DailySales.objects.all()
+        self.assertEqual(sum(r.bookings for r in rows), Booking.objects.count())
+        self.assertEqual(sum(r.revenue for r in rows), sum(b.total_paid for b in Booking.objects.all()))
+
+    def test_renamed_movie_keeps_its_history(self):
+        book_seats(self.make_user(0), self.showtime, ["A1"], self.price)
+        self.movie.title = "New Title"
+        self.movie.save()
+        book_seats(self.make_user(1), self.showtime, ["A2"], self.price)
+
+        self.assertEqual(
+            [(m["title"], m["count"]) for m in popular_movies()], [("New Title", 2)]
+        )
+        rebuild_daily_sales()
+        self.assertEqual(DailySales.objects.get().movie, self.movie)
+        self.assertEqual([(m["title"], m["count"]) for m in popular_movies()], [("New Title", 2)])
+
+    def test_rebuild_during_bookings_loses_none(self):
+        users = [self.make_user(n) for n in range(6)]
+        seats = ["A1", "A2", "A3", "B1", "B2", "B3"]
+
+        def work(user, seat):
+            if user is None:
+                return rebuild_daily_sales()
+            return book_seats(user, self.showtime, [seat], self.price)
+
+        results = run_in_parallel(work, list(zip(users, seats)) + [(None, None)] * 3)
+
+        self.assertFalse([r for r in results if isinstance(r, Exception)])
+        self.assertRollupsMatchBookings()
+
+
+    def test_cancellations_lock_in_booking_order(self):
+        users = [self.make_user(n) for n in range(2)]
+        bookings = [book_seats(user, self.showtime, [seat], self.price)[0] for user, seat in zip(users, ["A1", "A2"])]
+
+        # Seat map, then the per-day row, as book_seats takes them
+        for cancel, rollup in [
+            (lambda: cancel_booking(bookings[0], self.price), "record_cancellation"),
+            (lambda: delete_user(users[1]), "record_cancellations"),
+        ]:
+            calls = mock.Mock()
+            with (
+                mock.patch.object(booking_service, "refresh_seat_map", wraps=refresh_seat_map) as seat_map,
+                mock.patch.object(booking_service, rollup, wraps=getattr(booking_service, rollup)) as recorded,
+            ):
+                calls.attach_mock(seat_map, "seat_map")
+                calls.attach_mock(recorded, "rollup")
+                cancel()
+            self.assertEqual([name for name, _, _ in calls.mock_calls], ["seat_map", "rollup"])
+
+        self.assertFalse(Booking.objects.exists())
+        self.assertRollupsMatchBookings()
+
+    def test_stats_rebuild_during_bookings_loses_none(self):
+        users = [self.make_user(n) for n in range(4)]
+        # Drifted counters, so every user is rewritten
+        CustomUser.objects.update(total_spent=999, booking_count=9)
+        bulk_update = CustomUser.objects.bulk_update
+        bookings = []
+
+        def book_meanwhile(changed, fields, **kwargs):
+            # Another request books for a user of this batch after its
+            # bookings were summed; it has to wait for the batch to be written
+            batch = len(threads)
+            user, seat = users[2 * batch], f"C{batch + 1}"
+            thread = threading.Thread(target=lambda: bookings.append(book_seats(user, self.showtime, [seat], self.price)))
+            thread.start()
+            thread.join(timeout=0.5)
+            bulk_update(changed, fields, **kwargs)
+            return thread
+
+        threads = []
+        with mock.patch.object(
+            CustomUser.objects, "bulk_update", side_effect=lambda *a, **k: threads.append(book_meanwhile(*a, **k))
+        ):
+            rebuild_customer_stats(batch_size=2)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(bookings), 2)
+        self.assertEqual(
+            list(CustomUser.objects.order_by("pk").values_list("total_spent", "booking_count")),
+            [(self.price, 1), (0, 0), (self.price, 1), (0, 0)],
+        )
+
+    def test_customer_stats_are_corrected_a_batch_at_a_time(self):
+        users = [self.make_user(n) for n in range(5)]
+        book_seats(users[0], self.showtime, ["A1", "A2"], self.price)
+        CustomUser.objects.filter(pk__in=[users[0].pk, users[3].pk]).update(total_spent=999, booking_count=9)
+
+        # One bulk UPDATE per batch of two that has a user to correct
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rebuild_customer_stats(batch_size=2), 2)
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE") and "CASE WHEN" in q["sql"]]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(
+            list(CustomUser.objects.order_by("pk").values_list("total_spent", "booking_count")),
+            [(self.price * 2, 1)] + [(0, 0)] * 4,
+        )
+
+
+class SeatIdTests(TestCase):
+    """
+    Every spelling of a seat is the same seat: reservations are stored in
+    the canonical form, so the unique index catches "a1" and "A001" after "A1".
+    """
+
+    price = Decimal("100.00")
+
+    @classmethod
+    def setUpTestData(cls):
+        movie = Movie.objects.create(title="Spelling Bee", duration="90", category="Movie", price=cls.price)
+        cls.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        cls.users = [
+            CustomUser.objects.create_user(username=f"fan{n}@example.com", email=f"fan{n}@example.com", balance=Decimal("1000.00"))
+            for n in range(3)
+        ]
+
+    def test_seat_is_sold_once_however_it_is_spelled(self):
+        book_seats(self.users[0], self.showtime, ["A1"], self.price)
+
+        for user, seat in zip(self.users[1:], ["a1", "A001"]):
+            with self.assertRaises(SeatsUnavailable):
+                book_seats(user, self.showtime, [seat], self.price)
+        self.assertEqual(list(SeatReservation.objects.values_list("seat_id", flat=True)), ["A1"])
+
+    def test_seats_are_stored_canonical(self):
+        booking, _ = book_seats(self.users[0], self.showtime, ["b002", "B2", "c3"], self.price)
+
+        self.assertEqual(booking.seats, "B2,C3")
+        self.assertEqual(sorted(booking.reservations.values_list("seat_id", flat=True)), ["B2", "C3"])
+
+    def test_unknown_seats_are_rejected(self):
+        with self.assertRaises(InvalidSeats):
+            book_seats(self.users[0], self.showtime, ["A1", "Z9"], self.price)
+        self.assertFalse(SeatReservation.objects.exists())
+
+
+class SeatHoldTests(TestCase):
+    price = Decimal("100.00")
+
+    @classmethod
+    def setUpTestData(cls):
+        movie = Movie.objects.create(title="Checkout", duration="90", category="Movie", price=cls.price)
+        cls.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        cls.users = [
+            CustomUser.objects.create_user(
+                username=f"fan{n}@example.com", email=f"fan{n}@example.com", balance=Decimal("1000.00")
+            )
+            for n in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def later(self, minutes):
+        """Patch the clock `minutes` ahead."""
+        moment = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+        return mock.patch("django.utils.timezone.now", return_value=moment)
+
+    def test_held_seat_is_refused_to_others(self):
+        place_hold(self.users[0], self.showtime.pk, ["A1", "A2"])
+
+        with self.assertRaises(SeatsUnavailable) as raised:
+            place_hold(self.users[1], self.showtime.pk, ["A2", "A3"])
+        self.assertEqual(raised.exception.seats, ["A2"])
+        with self.assertRaises(SeatsUnavailable):
+            book_seats(self.users[1], self.showtime, ["A1"], self.price)
+
+    def test_expired_hold_can_be_claimed(self):
+        place_hold(self.users[0], self.showtime.pk, ["A1"])
+
+        with self.later(settings.SEAT_HOLD_MINUTES + 1):
+            booking, _ = book_seats(self.users[1], self.showtime, ["A1"], self.price)
+        self.assertEqual(list(SeatReservation.objects.values_list("seat_id", "booking")), [("A1", booking.pk)])
+
+    def test_hold_becomes_the_booking(self):
+        place_hold(self.users[0], self.showtime.pk, ["A1", "A2"])
+        booking, _ = book_seats(self.users[0], self.showtime, ["A1", "A2"], self.price)
+
+        self.assertEqual(
+            sorted(SeatReservation.objects.values_list("seat_id", "booking", "holder", "held_until")),
+            [("A1", booking.pk, None, None), ("A2", booking.pk, None, None)],
+        )
+        snapshot = get_seat_map(self.showtime.pk, use_cache=False)
+        self.assertEqual((seats_from_bits(snapshot["booked"]), snapshot["held"]), (["A1", "A2"], 0))
+
+    def test_release_updates_the_seat_map(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            place_hold(self.users[0], self.showtime.pk, ["B1"])
+        held = get_seat_map(self.showtime.pk)
+        self.assertEqual(seats_from_bits(held["held"]), ["B1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            release_holds(self.users[0], self.showtime.pk)
+        released = get_seat_map(self.showtime.pk)
+        self.assertEqual((released["held"], released["version"]), (0, held["version"] + 1))
+        self.assertFalse(SeatReservation.objects.exists())
+
+    def test_lapsed_holds_are_deleted_when_the_map_is_read(self):
+        place_hold(self.users[0], self.showtime.pk, ["C1", "C2"])
+
+        with self.later(settings.SEAT_HOLD_MINUTES + 1):
+            snapshot = get_seat_map(self.showtime.pk)
+        self.assertEqual(snapshot["held"], 0)
+        self.assertFalse(SeatReservation.objects.exists())
+
+
+class BackfillShowtimesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.evening = Movie.objects.create(title="Evening", duration="90", category="Movie", price=Decimal("100.00"))
+        cls.matinee = Movie.objects.create(title="Matinee", duration="90", category="Movie", price=Decimal("50.00"))
+        cls.scheduled = Showtime.objects.create(
+            movie=cls.evening, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc)
+        )
+        # "20:00" and "8:00 PM" are the same screening
+        for title, time_str in [
+            ("Evening", "20:00"), ("Evening", "20:00"), ("Evening", "8:00 PM"), ("Evening", "20:00"),
+            ("Matinee", "14:00"), ("Matinee", "14:00"), ("Deleted Film", "20:00"),
+        ]:
+            Booking.objects.create(user=user, movie_name=title, date="2030-01-01", time=time_str, seats="A1")
+
+    def backfill(self):
+        call_command("backfill_showtimes", batch_size=2, stdout=io.StringIO())
+
+    def test_interrupted_backfill_resumes(self):
+        get_or_create = Showtime.objects.get_or_create
+        calls = []
+
+        def killed_on_second_showtime(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            return get_or_create(**kwargs)
+
+        with mock.patch.object(Showtime.objects, "get_or_create", side_effect=killed_on_second_showtime):
+            with self.assertRaises(KeyboardInterrupt):
+                self.backfill()
+        # The batch that was cut short left nothing behind
+        self.assertEqual(Booking.objects.filter(showtime__isnull=False).count(), 4)
+        self.assertEqual(Showtime.objects.count(), 1)
+
+        self.backfill()
+        self.backfill()
+        matinee = Showtime.objects.get(movie=self.matinee)
+        self.assertEqual(matinee.starts_at, datetime(2030, 1, 1, 14, tzinfo=timezone.utc))
+        self.assertEqual(Showtime.objects.count(), 2)
+        self.assertEqual(
+            sorted(Booking.objects.values_list("movie_name", "showtime")),
+            [("Deleted Film", None)] + [("Evening", self.scheduled.pk)] * 4 + [("Matinee", matinee.pk)] * 2,
+        )
+
+
+class TicketSequenceTests(TestCase):
+    def test_missing_sequence_row_is_recreated(self):
+        # As after `manage.py flush` or a TransactionTestCase teardown
+        TicketSequence.objects.all().delete()
+
+        first = next_ticket_number()
+        self.assertTrue(is_valid_ticket_number(first))
+        self.assertEqual(reserve_block(10), 2)
+        self.assertNotEqual(next_ticket_number(), first)
+        self.assertEqual(TicketSequence.objects.get().next_value, 13)
+
+
+def send(sender, receiver, text="Hello"):
+    """What /api/chat/send/ does, without the request."""
+    with transaction.atomic():
+        message = ChatMessage.objects.create(sender=sender, receiver=receiver, message=text)
+        record_message(message)
+    return message
+
+
+class ConversationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.advisor = CustomUser.objects.create_user(
+            username="help@example.com", email="help@example.com", is_advisor=True
+        )
+
+    def test_sends_count_unread_for_the_receiver(self):
+        send(self.customer, self.advisor, "First")
+        send(self.customer, self.advisor, "Second")
+        reply = send(self.advisor, self.customer, "x" * 150)
+
+        chat_row = Conversation.objects.get()
+        self.assertEqual((chat_row.user, chat_row.advisor), (self.customer, self.advisor))
+        self.assertEqual((chat_row.user_unread, chat_row.advisor_unread), (1, 2))
+        self.assertEqual((chat_row.last_message, chat_row.last_message_at), ("x" * 100, reply.timestamp))
+
+    def test_reading_clears_only_the_readers_counter(self):
+        send(self.customer, self.advisor)
+        send(self.advisor, self.customer)
+
+        self.assertEqual(mark_conversation_read(self.advisor, self.customer), 1)
+        chat_row = Conversation.objects.get()
+        self.assertEqual((chat_row.user_unread, chat_row.advisor_unread), (1, 0))
+        self.assertEqual(check_conversation_counters(), [])
+
+    def test_deleted_user_takes_their_conversations(self):
+        other = CustomUser.objects.create_user(username="other@example.com", email="other@example.com")
+        send(self.customer, self.advisor)
+        send(other, self.advisor)
+
+        delete_user(self.customer)
+        chat_row = Conversation.objects.get()
+        self.assertEqual((chat_row.user, chat_row.advisor_unread), (other, 1))
+        self.assertEqual(check_conversation_counters(), [])
+
+
+class UnreadCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.advisor = CustomUser.objects.create_user(
+            username="help@example.com", email="help@example.com", is_advisor=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sends_add_to_the_cached_count_and_reads_drop_it(self):
+        self.assertEqual(unread_count(self.advisor.id), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            send(self.customer, self.advisor)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread_count(self.advisor.id), 1)
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mark_conversation_read(self.advisor, self.customer)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(unread_count(self.advisor.id), 0)
+        self.assertEqual(len([q for q in queries if "COUNT(" in q["sql"]]), 1)
+
+    def test_badge_after_a_send_is_not_counted_again(self):
+        self.client.force_login(self.advisor)
+        self.client.get("/api/chat/unread/", secure=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            send(self.customer, self.advisor)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/chat/unread/", secure=True)
+        self.assertEqual(response.json(), {"unread_count": 1})
+        self.assertFalse([q for q in queries if "COUNT(" in q["sql"]])
+
+    def test_send_without_a_cached_count_leaves_it_to_the_next_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            send(self.customer, self.advisor)
+        self.assertIsNone(cache.get(chat._unread_key(self.advisor.id)))
+        self.assertEqual(unread_count(self.advisor.id), 1)
+
+    def test_count_racing_a_send_is_not_kept(self):
+        count_unread = chat.count_unread
+
+        def count_then_send(user_id):
+            # The count is taken, then a send commits before it is cached
+            stale = count_unread(user_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                send(self.customer, self.advisor)
+            return stale
+
+        with mock.patch.object(chat, "count_unread", side_effect=count_then_send):
+            self.assertEqual(unread_count(self.advisor.id), 0)
+        self.assertEqual(unread_count(self.advisor.id), 1)
+
+
+class ChatReadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.advisor = CustomUser.objects.create_user(
+            username="help@example.com", email="help@example.com", is_advisor=True
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer)
+
+    def test_latest_page_reads_unread_messages_beyond_it(self):
+        for n in range(60):
+            send(self.advisor, self.customer, f"Message {n}")
+        url = f"/api/chat/get/{self.advisor.id}/"
+
+        with self.captureOnCommitCallbacks(execute=True):
+            page = self.client.get(url, secure=True).json()
+
+        self.assertEqual(len(page["messages"]), 50)
+        self.assertTrue(page["has_more"])
+        self.assertFalse(ChatMessage.objects.filter(is_read=False).exists())
+        self.assertEqual(Conversation.objects.get().user_unread, 0)
+        self.assertEqual(unread_count(self.customer.id), 0)
+
+    def test_polls_read_only_what_they_show(self):
+        first = send(self.advisor, self.customer)
+        second = send(self.advisor, self.customer)
+        url = f"/api/chat/get/{self.advisor.id}/"
+
+        with self.assertNumQueries(4):
+            # Session, user, other user and the page; nothing to mark
+            self.client.get(url, {"since_id": second.id}, secure=True)
+        self.client.get(url, {"before_id": second.id}, secure=True)
+        self.assertEqual(ChatMessage.objects.filter(is_read=False).count(), 2)
+
+        self.client.get(url, {"since_id": first.id}, secure=True)
+        self.assertFalse(ChatMessage.objects.filter(is_read=False).exists())
+        self.assertEqual(Conversation.objects.get().user_unread, 0)
+
+
+class PresenceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.advisor = CustomUser.objects.create_user(
+            username="help@example.com", email="help@example.com", first_name="Ann", is_advisor=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_heartbeat_shows_advisor_online(self):
+        self.assertEqual(advisors_with_status()[0]["status"], "Offline")
+
+        with self.assertNumQueries(0):
+            heartbeat(self.advisor)
+            self.assertEqual(advisors_with_status()[0]["status"], "Online")
+
+        self.assertEqual(last_seen_buffer.flush(), 1)
+        self.advisor.refresh_from_db()
+        self.assertIsNotNone(self.advisor.last_seen)
+
+    def test_flush_refreshes_the_directory_last_seen(self):
+        self.assertIsNone(advisors_with_status()[0]["last_seen"])
+        heartbeat(self.advisor)
+        last_seen_buffer.flush()
+        # The heartbeat has expired, so the directory's last_seen shows
+        cache.delete(f"presence:{self.advisor.id}")
+
+        advisor = advisors_with_status()[0]
+        self.assertEqual(advisor["status"], "Offline")
+        self.assertEqual(advisor["last_seen"], CustomUser.objects.get(pk=self.advisor.pk).last_seen)
+        self.assertIsNotNone(advisor["last_seen"])
+
+    def test_directory_follows_account_changes(self):
+        self.assertEqual(advisors_with_status()[0]["name"].strip(), "Ann")
+        self.advisor.last_name = "Lee"
+        self.advisor.save()
+        self.assertEqual(advisors_with_status()[0]["name"], "Ann Lee")
+
+
+class SeatMapPollTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        movie = Movie.objects.create(title="Poll Night", duration="90", category="Movie", price=Decimal("100.00"))
+        cls.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_not_modified_poll_reads_no_app_tables(self):
+        url = f"/api/booked-seats/Poll Night/?showtime={self.showtime.pk}"
+        with self.captureOnCommitCallbacks(execute=True):
+            etag = self.client.get(url, secure=True)["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, secure=True, headers={"if-none-match": etag})
+
+        self.assertEqual(response.status_code, 304)
+        # Only the session and the logged-in user are loaded
+        tables = {re.search(r'FROM "(\w+)"', q["sql"]).group(1) for q in queries.captured_queries}
+        self.assertEqual(tables, {"django_session", "users_customuser"})
+
+
+class ExportTests(TransactionTestCase):
+    """
+    Exports stream from a thread with its own connection, so the rows they
+    read have to be committed.
+    """
+
+    def setUp(self):
+        movie = Movie.objects.create(title="Export Night", duration="90", category="Movie", price=Decimal("100.00"))
+        showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        self.fan = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com", phone="0700111222")
+        other = CustomUser.objects.create_user(username="other@example.com", email="other@example.com")
+        self.booking, _ = book_seats(self.fan, showtime, ["A1", "A2"], movie.price)
+        matinee = Movie.objects.create(title="Matinee", duration="90", category="Movie", price=Decimal("50.00"))
+        matinee_showtime = Showtime.objects.create(
+            movie=matinee, starts_at=datetime(2030, 1, 2, 14, tzinfo=timezone.utc)
+        )
+        self.old_booking, _ = book_seats(other, matinee_showtime, ["B1"], matinee.price)
+        Booking.objects.filter(pk=self.old_booking.pk).update(created_at=datetime(2020, 6, 1, tzinfo=timezone.utc))
+        self.async_client.force_login(CustomUser.objects.create_superuser(username="root", email="root@example.com"))
+
+    def get(self, url):
+        async def fetch():
+            response = await self.async_client.get(url, secure=True)
+            return response, b"".join([piece async for piece in response.streaming_content])
+        return async_to_sync(fetch)()
+
+    def booking_ids(self, body, fmt="csv"):
+        if fmt == "ndjson":
+            return [json.loads(line)["booking_id"] for line in body.decode().splitlines()]
+        header, *rows = body.decode().splitlines()
+        self.assertEqual(header.split(",")[:2], ["booking_id", "ticket_number"])
+        return [int(row.split(",")[0]) for row in rows]
+
+    def test_bookings_export_filters(self):
+        url = "/admin-dashboard/bookings/export/"
+        for query, expected in [
+            ("", [self.booking.pk, self.old_booking.pk]),
+            ("q=fan@exa", [self.booking.pk]),
+            (f"q={self.old_booking.ticket_number}", [self.old_booking.pk]),
+            ("movie=matin", [self.old_booking.pk]),
+            ("since=2020-06-01&until=2020-06-01", [self.old_booking.pk]),
+            ("since=2020-06-02", [self.booking.pk]),
+        ]:
+            response, body = self.get(f"{url}?{query}")
+            self.assertEqual(response["Content-Type"], "text/csv")
+            self.assertEqual(sorted(self.booking_ids(body)), expected, query)
+            _, body = self.get(f"{url}?{query}&format=ndjson")
+            self.assertEqual(sorted(self.booking_ids(body, "ndjson")), expected, query)
+
+    def test_gzip_holds_the_same_rows(self):
+        for fmt in ["csv", "ndjson"]:
+            _, plain = self.get(f"/admin-dashboard/bookings/export/?format={fmt}")
+            response, packed = self.get(f"/admin-dashboard/bookings/export/?format={fmt}&gzip=1")
+            self.assertTrue(response["Content-Disposition"].endswith(f'.{fmt}.gz"'))
+            self.assertEqual(gzip.decompress(packed), plain)
+
+    def test_export_bookings_command_writes_the_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bookings.ndjson.gz")
+            call_command("export_bookings", format="ndjson", gzip=True, output=path, movie="export", since="2020-06-02")
+            with gzip.open(path) as f:
+                rows = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(row["booking_id"], row["customer_email"], row["seats"]) for row in rows],
+            [(self.booking.pk, "fan@example.com", "A1,A2")],
+        )
+
+    def test_users_export(self):
+        response, body = self.get("/admin-dashboard/users/export/?q=0700111")
+
+        self.assertTrue(response["Content-Disposition"].startswith('attachment; filename="users-'))
+        header, *rows = body.decode().splitlines()
+        self.assertEqual(header.split(",")[:3], ["user_id", "customer_id", "email"])
+        self.assertEqual([row.split(",")[2] for row in rows], ["fan@example.com"])
+
+    def test_revenue_export(self):
+        response, body = self.get("/admin-dashboard/revenue/export/?format=ndjson&gzip=1&movie=export")
+
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        rows = [json.loads(line) for line in gzip.decompress(body).splitlines()]
+        self.assertEqual(
+            [(row["movie"], row["bookings"], row["seats"], row["revenue"]) for row in rows],
+            [("Export Night", 1, 2, "200.00")],
+        )
+
+
+class TimeseriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for day, bookings in [("2030-01-06", 2), ("2030-01-07", 3), ("2030-01-09", 1)]:
+            DailySales.objects.create(day=day, movie_name="Chart Topper", bookings=bookings, revenue=bookings * 100)
+        cls.admin = CustomUser.objects.create_superuser(username="root", email="root@example.com")
+
+    def series(self, metric, start, end, bucket):
+        return [(p["t"], p["value"]) for p in timeseries(metric, parse_bound(start), parse_bound(end, end=True), bucket)]
+
+    def test_empty_buckets_are_filled(self):
+        self.assertEqual(
+            self.series("bookings", "2030-01-06", "2030-01-08", "day"),
+            [("2030-01-06", 2), ("2030-01-07", 3), ("2030-01-08", 0)],
+        )
+
+    def test_weeks_start_on_monday(self):
+        self.assertEqual(
+            self.series("revenue", "2030-01-06", "2030-01-12", "week"),
+            [("2029-12-31", 200.0), ("2030-01-07", 400.0)],
+        )
+
+    def test_bad_range_is_a_400(self):
+        self.client.force_login(self.admin)
+        for query in ["from=2030-01-09&to=2030-01-01", "from=someday", "bucket=hour&from=2029-01-01&to=2030-01-01"]:
+            response = self.client.get(f"/api/admin/timeseries/?{query}", secure=True)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn("error", response.json())
+
+
+class AdminHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(username="root", email="root@example.com")
+        fan = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com", balance=1000)
+        movie = Movie.objects.create(title="Long Run", duration="90", category="Movie", price=Decimal("100.00"))
+        first_night = datetime(2030, 1, 1, 20, tzinfo=timezone.utc)
+        cls.showtimes = [
+            Showtime.objects.create(movie=movie, starts_at=first_night + timedelta(days=n)) for n in range(30)
+        ]
+        cls.latest = cls.showtimes[-1]
+        book_seats(fan, cls.latest, ["B2", "A3", "A1"], movie.price)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_history_pages_performances_latest_first(self):
+        first = self.client.get("/admin-dashboard/history/", secure=True)
+        page = first.context["performances"]
+        rows = list(page)
+        self.assertEqual([s.pk for s in rows], [s.pk for s in self.showtimes[::-1][:25]])
+        self.assertEqual((rows[0].tickets_sold, rows[0].fill), (3, round(300 / rows[0].capacity)))
+        self.assertEqual(rows[1].tickets_sold, 0)
+
+        second = self.client.get("/admin-dashboard/history/", {"cursor": page.next_token}, secure=True)
+        self.assertEqual([s.pk for s in second.context["performances"]], [s.pk for s in self.showtimes[4::-1]])
+        self.assertFalse(second.context["performances"].has_next)
+
+    def test_seats_are_loaded_per_performance(self):
+        response = self.client.get(f"/admin-dashboard/history/{self.latest.pk}/seats/", secure=True)
+        self.assertEqual(response.json(), {"showtime": self.latest.pk, "seats": ["A1", "A3", "B2"]})
+
+        empty = self.client.get(f"/admin-dashboard/history/{self.showtimes[0].pk}/seats/", secure=True)
+        self.assertEqual(empty.json()["seats"], [])
+        missing = self.client.get("/admin-dashboard/history/0/seats/", secure=True)
+        self.assertEqual(missing.status_code, 404)
+
+    def test_history_is_for_admins_only(self):
+        self.client.force_login(CustomUser.objects.get(username="fan@example.com"))
+        for url in ["/admin-dashboard/history/", f"/admin-dashboard/history/{self.latest.pk}/seats/"]:
+            self.assertEqual(self.client.get(url, secure=True).status_code, 302, url)
+
+
+class SeatAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.movie = Movie.objects.create(title="Heatmap", duration="90", category="Movie", price=Decimal("100.00"))
+        for day, seats, hours_before in [(1, "A1,A2", 24), (2, "a1", 2), (2, "Z9", 5)]:
+            showtime, _ = Showtime.objects.get_or_create(
+                movie=cls.movie, starts_at=datetime(2030, 1, day, 20, tzinfo=timezone.utc)
+            )
+            booking = Booking.objects.create(
+                user=user, showtime=showtime, movie_name=cls.movie.title, date=showtime.starts_at.date(),
+                time="20:00", seats=seats,
+            )
+            Booking.objects.filter(pk=booking.pk).update(created_at=showtime.starts_at - timedelta(hours=hours_before))
+
+    def test_seat_matrix(self):
+        result = compute_seat_analytics(self.movie.pk)
+
+        self.assertEqual((result["showtimes"], result["seats_sold"]), (2, 3))
+        self.assertEqual(result["sell_through"][0][:3], [1.0, 0.5, 0.0])
+        self.assertEqual(result["median_hours_before"][0][:3], [13.0, 24.0, None])
+        fill = {point["hours_before"]: point["fill"] for point in result["fill_curve"]}
+        # Two of 35 seats sold a day out for the first show, one more two hours out for the second
+        self.assertEqual((fill[48], fill[24], fill[0]), (0.0, round(2 / 70, 3), round(3 / 70, 3)))
+
+
+class ChatSocketTests(TransactionTestCase):
+    """
+    /ws/chat/<id>/ through the ASGI entry point. The socket reads the
+    session and messages on other threads, so they have to be committed.
+    """
+
+    def setUp(self):
+        self.advisor = CustomUser.objects.create_user(
+            username="advisor@example.com", email="advisor@example.com", is_advisor=True
+        )
+        self.customer = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        self.client.force_login(self.advisor)
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+    def connect(self, path, cookie=None, origin="https://localhost"):
+        """Start a handshake; returns (client -> app queue, app -> client queue, app task)."""
+        from backend.asgi import application
+
+        incoming, outgoing = asyncio.Queue(), asyncio.Queue()
+        incoming.put_nowait({"type": "websocket.connect"})
+        headers = [(b"origin", origin.encode())]
+        if cookie:
+            headers.append((b"cookie", cookie.encode()))
+        scope = {"type": "websocket", "path": path, "query_string": b"", "headers": headers}
+        return incoming, outgoing, asyncio.ensure_future(application(scope, incoming.get, outgoing.put))
+
+    def first_event(self, *args, **kwargs):
+        async def handshake():
+            _, outgoing, task = self.connect(*args, **kwargs)
+            event = await asyncio.wait_for(outgoing.get(), 5)
+            await asyncio.wait_for(task, 5)
+            return event
+        return asyncio.run(handshake())
+
+    def test_rejected_handshakes(self):
+        path = f"/ws/chat/{self.customer.id}/"
+        self.assertEqual(self.first_event(path), {"type": "websocket.close", "code": 4403})
+        self.assertEqual(
+            self.first_event(path, self.cookie, origin="https://evil.example"), {"type": "websocket.close", "code": 4403}
+        )
+        self.assertEqual(self.first_event("/ws/chat/0/", self.cookie), {"type": "websocket.close", "code": 4404})
+        self.assertEqual(self.first_event("/ws/elsewhere/", self.cookie), {"type": "websocket.close", "code": 4404})
+
+    def test_messages_are_delivered_and_read(self):
+        send(self.customer, self.advisor, "Earlier")
+
+        async def chat():
+            incoming, outgoing, task = self.connect(f"/ws/chat/{self.customer.id}/", self.cookie)
+            self.assertEqual(await asyncio.wait_for(outgoing.get(), 5), {"type": "websocket.accept"})
+            received = [json.loads((await asyncio.wait_for(outgoing.get(), 5))["text"])]
+
+            await sync_to_async(send)(self.customer, self.advisor, "Now")
+            chat_feed.notify(self.advisor.id)
+            received.append(json.loads((await asyncio.wait_for(outgoing.get(), 5))["text"]))
+
+            incoming.put_nowait({"type": "websocket.disconnect"})
+            await asyncio.wait_for(task, 5)
+            return received
+
+        received = asyncio.run(chat())
+        self.assertEqual([[m["text"] for m in r["messages"]] for r in received], [["Earlier"], ["Now"]])
+        self.assertFalse(ChatMessage.objects.filter(is_read=False).exists())
+        self.assertEqual(chat_feed.pubsub._subscribers, {})
+
+
+@override_settings(SEAT_EVENTS_POLL_INTERVAL=60)
+class SeatFeedTests(TransactionTestCase):
+    """
+    Seat-map streams are woken by the publish a booking makes once it has
+    committed; the watcher's database poll is pushed out of the way.
+    """
+
+    price = Decimal("100.00")
+
+    def setUp(self):
+        movie = Movie.objects.create(title="Live Seats", duration="90", category="Movie", price=self.price)
+        self.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        self.user = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+
+    def test_published_after_commit_only(self):
+        with mock.patch.object(seat_feed, "notify") as notify:
+            with transaction.atomic():
+                book_seats(self.user, self.showtime, ["A1"], self.price)
+                notify.assert_not_called()
+            notify.assert_called_once_with(str(self.showtime.pk))
+
+    def test_stream_gets_the_booking(self):
+        async def watch():
+            stream = seat_feed.stream(self.showtime.pk)
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), 5)
+                await sync_to_async(book_seats)(self.user, self.showtime, ["B2"], self.price)
+                return first, await asyncio.wait_for(stream.__anext__(), 5)
+            finally:
+                await stream.aclose()
+
+        first, change = asyncio.run(watch())
+        self.assertEqual(change["since"], first["version"])
+        self.assertEqual((change["booked_seats"], change["available"]), (["B2"], first["available"] - 1))
+        self.assertEqual(seat_feed._watchers, {})
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        for n in range(8):
+            booking = Booking.objects.create(
+                user=user, movie_name="Paged", date="2030-01-01", time="20:00", seats="A1"
+            )
+            # Three bookings share each timestamp, so the id breaks the ties
+            Booking.objects.filter(pk=booking.pk).update(created_at=datetime(2030, 1, 1 + n // 3, tzinfo=timezone.utc))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(Booking.objects.all(), ("-created_at", "-id"), 3)
+        self.offset_order = list(Booking.objects.order_by("-created_at", "-id"))
+
+    def test_pages_follow_the_offset_order_both_ways(self):
+        pages = [self.paginator.get_page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator.get_page(pages[-1].next_token))
+        self.assertEqual([list(page) for page in pages], [self.offset_order[i:i + 3] for i in range(0, 8, 3)])
+        self.assertFalse(pages[0].has_previous)
+
+        back = [pages[-1]]
+        while back[-1].has_previous:
+            back.append(self.paginator.get_page(back[-1].previous_token))
+        self.assertEqual([list(page) for page in back], [list(page) for page in pages[::-1]])
+        self.assertIsNone(back[-1].previous_token)
+
+    def test_forged_token_gives_the_first_page(self):
+        token = self.paginator.get_page().next_token
+        forged = token[:-2] + ("AA" if token[-2:] != "AA" else "BB")
+        for bad in [forged, "not-a-token", signing.dumps({"f": True, "k": [1]}, salt="users.pagination")]:
+            self.assertEqual(list(self.paginator.get_page(bad)), self.offset_order[:3], bad)
+
+    def test_pages_are_seeks(self):
+        token = self.paginator.get_page().next_token
+        with CaptureQueriesContext(connection) as queries:
+            list(self.paginator.get_page(token))
+        sql = " ".join(q["sql"] for q in queries.captured_queries).upper()
+        self.assertNotIn("COUNT(", sql)
+        self.assertNotIn("OFFSET", sql)
+
+
+def failing_job():
+    raise RuntimeError("Mail server down")
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF=30, JOB_VISIBILITY_TIMEOUT=300)
+class JobQueueTests(TransactionTestCase):
+    def due_now(self, job):
+        """As if the job's retry delay or visibility timeout had passed."""
+        Job.objects.filter(pk=job.pk).update(run_at=datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    def test_enqueued_on_commit(self):
+        with transaction.atomic():
+            enqueue(failing_job)
+            self.assertFalse(Job.objects.exists())
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue(failing_job)
+            raise RuntimeError("Request failed")
+        self.assertEqual(list(Job.objects.values_list("task", "status")), [("users.tests.failing_job", Job.QUEUED)])
+
+    def test_only_one_worker_claims_a_job(self):
+        enqueue(failing_job)
+        update = QuerySet.update
+        rival = []
+
+        def claim_after_rival(queryset, **kwargs):
+            # Worker "b" claims the job after "a" read it but before "a" updates it
+            if kwargs.get("locked_by") == "a" and not rival:
+                rival.append(claim_jobs("b", 1))
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, "update", claim_after_rival):
+            claimed = claim_jobs("a", 1)
+
+        job = Job.objects.get()
+        self.assertEqual((claimed, rival), ([], [[job.pk]]))
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, "b", 1))
+
+    def test_failed_job_is_retried_with_backoff_until_max_attempts(self):
+        enqueue(failing_job)
+        job = Job.objects.get()
+
+        self.assertEqual(claim_jobs("a", 5), [job.pk])
+        self.assertEqual(run_job(job.pk, "a"), ("users.tests.failing_job", Job.QUEUED))
+        job.refresh_from_db()
+        delay = (job.run_at - datetime.now(timezone.utc)).total_seconds()
+        self.assertTrue(10 < delay <= 45, delay)
+        self.assertEqual(claim_jobs("a", 5), [])
+
+        self.due_now(job)
+        self.assertEqual(claim_jobs("a", 5), [job.pk])
+        self.assertEqual(run_job(job.pk, "a"), ("users.tests.failing_job", Job.FAILED))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn("Mail server down", job.last_error)
+
+    def test_abandoned_job_is_claimed_again(self):
+        enqueue(failing_job)
+        job = Job.objects.get()
+        claim_jobs("a", 1)
+        self.assertEqual(claim_jobs("b", 1), [])
+
+        self.due_now(job)
+        self.assertEqual(claim_jobs("b", 1), [job.pk])
+        # The first worker's claim is gone, so it can't record an outcome
+        self.assertEqual(run_job(job.pk, "a"), (None, None))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, "b", 2))
+
+    def test_runworker_once_sends_queued_email(self):
+        enqueue(tasks.send_account_deletion_email, "fan@example.com", "Fan", "fan@example.com")
+
+        with mock.patch("signal.signal"):
+            call_command("runworker", once=True, concurrency=1, stdout=io.StringIO())
+
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual([message.to for message in mail.outbox], [["fan@example.com"]])
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="zanzibar@example.com", email="zanzibar@example.com", first_name="Wanjiru",
+            balance=Decimal("1000.00"),
+        )
+        CustomUser.objects.create_user(username="other@example.com", email="other@example.com", first_name="Otieno")
+        movie = Movie.objects.create(title="Search Party", duration="90", category="Movie", price=Decimal("100.00"))
+        showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        cls.booking, _ = book_seats(cls.user, showtime, ["A1"], movie.price)
+
+    def matching(self, term):
+        """Ids of users text_filter() finds, and the SQL that found them."""
+        with CaptureQueriesContext(connection) as queries:
+            ids = list(CustomUser.objects.filter(text_filter("user", term)).values_list("pk", flat=True))
+        return ids, queries.captured_queries[-1]["sql"]
+
+    @skipUnless(connection.vendor == "sqlite", "FTS5 shadow tables are SQLite only")
+    def test_shadow_table_follows_the_users(self):
+        self.assertEqual(self.matching("zanzib")[0], [self.user.pk])
+
+        CustomUser.objects.filter(pk=self.user.pk).update(email="mombasa@example.com")
+        self.assertEqual(self.matching("zanzib")[0], [])
+        self.assertEqual(self.matching("mombas")[0], [self.user.pk])
+
+        self.user.delete()
+        self.assertEqual(self.matching("mombas")[0], [])
+
+    def test_exact_identifiers_skip_the_text_search(self):
+        self.assertEqual(exact_filter("user", self.user.customer_id.lower()), Q(customer_id=self.user.customer_id))
+        self.assertEqual(exact_filter("booking", self.booking.ticket_number), Q(ticket_number=self.booking.ticket_number))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(search("booking", self.booking.ticket_number), [self.booking])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("MATCH", queries[0]["sql"])
+        self.assertEqual(search("user", self.user.customer_id)[0], self.user)
+
+    def test_substring_uses_the_index(self):
+        ids, sql = self.matching("njir")
+        self.assertEqual(ids, [self.user.pk])
+        if connection.vendor == "sqlite":
+            self.assertIn("MATCH", sql)
+
+    def test_short_term_falls_back_to_a_plain_filter(self):
+        ids, sql = self.matching("ji")
+        self.assertEqual(ids, [self.user.pk])
+        self.assertNotIn("MATCH", sql)
+        self.assertIn("LIKE", sql)
+
+
+class KpiTests(TestCase):
+    names = ("total_users", "sales_totals", "popular_movies", "leaderboard", "recent_bookings")
+    price = Decimal("100.00")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="fan@example.com", email="fan@example.com", balance=Decimal("1000.00")
+        )
+        movie = Movie.objects.create(title="Figures", duration="90", category="Movie", price=cls.price)
+        cls.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bookings_and_cancellations_refresh_the_figures(self):
+        before, _ = get_kpis(*self.names)
+        self.assertEqual(before["sales_totals"], {"bookings": 0, "revenue": 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking, _ = book_seats(self.user, self.showtime, ["A1", "A2"], self.price)
+        booked, _ = get_kpis(*self.names)
+        self.assertEqual(booked["sales_totals"], {"bookings": 1, "revenue": self.price * 2})
+        self.assertEqual(booked["recent_bookings"], [booking])
+        self.assertEqual([(m["title"], m["count"]) for m in booked["popular_movies"]], [("Figures", 1)])
+        self.assertEqual([row["user"] for row in booked["leaderboard"]], [self.user])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cancel_booking(booking, self.price * 2)
+        cancelled, _ = get_kpis(*self.names)
+        self.assertEqual(cancelled["sales_totals"], {"bookings": 0, "revenue": 0})
+        self.assertEqual((cancelled["recent_bookings"], cancelled["leaderboard"]), ([], []))
+
+    def test_warm_cache_runs_no_query(self):
+        first, computed_at = get_kpis(*self.names)
+        with self.assertNumQueries(0):
+            again, cached_at = get_kpis(*self.names)
+        self.assertEqual((again, cached_at), (first, computed_at))
+
+
+class QueryPlanTests(TestCase):
+    """
+    EXPLAIN the hot lookups and fail if any of them would read a whole table
+    instead of seeking an index. PostgreSQL is told to avoid sequential
+    scans, which it would rightly prefer on tables this small.
+    """
+
+    # SQLite reports a full pass as "SCAN <table>", PostgreSQL as "Seq Scan"
+    FULL_SCAN = re.compile(r"\bSCAN\b|Seq Scan")
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username="fan@example.com", email="fan@example.com")
+        cls.advisor = CustomUser.objects.create_user(
+            username="help@example.com", email="help@example.com", is_advisor=True
+        )
+        movie = Movie.objects.create(title="Plan Night", duration="90", category="Movie", price=Decimal("100.00"))
+        cls.showtime = Showtime.objects.create(movie=movie, starts_at=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+
+    def plan(self, queryset):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = self.plan(queryset)
+        self.assertIsNone(self.FULL_SCAN.search(plan), f"Full scan in plan:\n{plan}")
+        if index:
+            self.assertIn(index, plan)
+
+    def test_customer_bookings(self):
+        # homepage and get_user_bookings
+        bookings = Booking.objects.filter(user=self.customer).order_by("-created_at")
+        self.assertUsesIndex(bookings, "booking_user_created_idx")
+
+    def test_booked_seats(self):
+        # Seat availability when booking, served by the unique (showtime, seat) index
+        seats = SeatReservation.objects.filter(showtime=self.showtime).values_list("seat_id", flat=True)
+        self.assertUsesIndex(seats)
+
+    def test_bookings_listing_and_ranges(self):
+        since = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        # A page after a cursor, as KeysetPaginator builds it
+        after = Booking.objects.filter(
+            Q(created_at__lte=since) & (Q(created_at__lt=since) | Q(created_at=since, id__lt=100))
+        )
+        self.assertUsesIndex(after.order_by("-created_at", "-id")[:26], "booking_created_idx")
+        in_range = Booking.objects.filter(created_at__gte=since, created_at__lt=since + timedelta(days=1))
+        self.assertUsesIndex(in_range, "booking_created_idx")
+
+    def test_notifications(self):
+        notifications = Notification.objects.filter(user=self.customer).order_by("-created_at")
+        self.assertUsesIndex(notifications, "notification_user_created_idx")
+
+    def test_chat_pages(self):
+        messages = conversation(self.customer, self.advisor)
+        self.assertUsesIndex(messages.filter(id__gt=100).order_by("id")[:51], "chat_pair_idx")
+        self.assertUsesIndex(messages.filter(id__lt=100).order_by("-id")[:51], "chat_pair_idx")
+        self.assertUsesIndex(messages.order_by("-id")[:51], "chat_pair_idx")
+
+    def test_unread_messages(self):
+        unread = ChatMessage.objects.filter(receiver=self.customer, is_read=False)
+        self.assertUsesIndex(unread.values("id"), "chat_unread_idx")
+        self.assertUsesIndex(unread.filter(sender=self.advisor).values("id"), "chat_unread_idx")
+
+    def test_advisor_conversations(self):
+        conversations = Conversation.objects.filter(advisor=self.advisor).order_by("-last_message_at")
+        self.assertUsesIndex(conversations, "conversation_advisor_idx")
+
+    def test_due_jobs(self):
+        now = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        due = Job.objects.filter(status__in=[Job.QUEUED, Job.RUNNING], run_at__lte=now)
+        self.assertUsesIndex(due.order_by("run_at"), "job_due_idx")
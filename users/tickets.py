@@ -0,0 +1,115 @@
+# users/tickets.py
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import TicketSequence
+
+SEQUENCE_NAME = "ticket"
+
+# Crockford base32: no I, L, O or U, so codes read back unambiguously
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+CODE_LENGTH = 7
+CODE_SPACE = len(ALPHABET) ** CODE_LENGTH  # 2**35 tickets
+
+# Multiplying by an odd number modulo 2**35 maps every sequence number to a
+# distinct code, so consecutive tickets don't look consecutive
+SCRAMBLE = 0x5DEECE66D
+
+
+# ================================
+# ENCODING
+# ================================
+def _check_char(code):
+    """Luhn mod 32 check character: catches any one wrong or swapped-neighbour character."""
+    factor, total = 2, 0
+    for char in reversed(code):
+        addend = factor * ALPHABET.index(char)
+        factor = 3 - factor
+        total += addend // len(ALPHABET) + addend % len(ALPHABET)
+    return ALPHABET[-total % len(ALPHABET)]
+
+
+def encode_ticket(sequence_number, day):
+    """GC-YYYYMMDD- plus 7 code characters and a check character (20 chars)."""
+    if not 0 <= sequence_number < CODE_SPACE:
+        raise ValueError("Ticket sequence exhausted")
+    value = sequence_number * SCRAMBLE % CODE_SPACE
+    code = ""
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, len(ALPHABET))
+        code = ALPHABET[digit] + code
+    return f"GC-{day:%Y%m%d}-{code}{_check_char(code)}"
+
+
+def is_valid_ticket_number(ticket_number):
+    """Check digit test for a typed-in ticket number, before any lookup."""
+    code = (ticket_number or "").upper().rsplit("-", 1)[-1]
+    if len(code) != CODE_LENGTH + 1 or any(c not in ALPHABET for c in code):
+        return False
+    return _check_char(code[:-1]) == code[-1]
+
+
+# ================================
+# BLOCK ALLOCATION
+# ================================
+def _bump_sequence(conn, size):
+    table = conn.ops.quote_name(TicketSequence._meta.db_table)
+    bump = f"UPDATE {table} SET next_value = next_value + %s WHERE name = %s"
+    with conn.cursor() as cursor:
+        cursor.execute(bump, [size, SEQUENCE_NAME])
+        if not cursor.rowcount:
+            # Migration 0027 creates the row, but a flush (or a test database
+            # emptied between tests) removes it again
+            TicketSequence.objects.using(conn.alias).get_or_create(name=SEQUENCE_NAME)
+            cursor.execute(bump, [size, SEQUENCE_NAME])
+        cursor.execute(f"SELECT next_value FROM {table} WHERE name = %s", [SEQUENCE_NAME])
+        return cursor.fetchone()[0] - size
+
+
+def reserve_block(size):
+    """Reserve `size` sequence numbers in a committed transaction and return the first."""
+    with transaction.atomic():
+        return _bump_sequence(connection, size)
+
+
+class TicketAllocator:
+    """
+    Hands out sequence numbers from a block reserved in bulk, so a ticket
+    costs one database round trip per TICKET_BLOCK_SIZE bookings. Numbers
+    left in a block when the process exits are simply skipped.
+
+    Inside an open transaction a single number is taken instead and nothing
+    is kept: a block reserved there would be handed to another process again
+    if the transaction rolled back, whereas one number rolls back together
+    with the row that used it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def allocate(self):
+        if connection.in_atomic_block:
+            return _bump_sequence(connection, 1)
+        with self._lock:
+            # A forked worker must not keep using its parent's block
+            if self._pid != os.getpid() or self._next >= self._end:
+                size = getattr(settings, "TICKET_BLOCK_SIZE", 100)
+                self._next = reserve_block(size)
+                self._end = self._next + size
+                self._pid = os.getpid()
+            number = self._next
+            self._next += 1
+        return number
+
+
+allocator = TicketAllocator()
+
+
+def next_ticket_number():
+    return encode_ticket(allocator.allocate(), timezone.now())
@@ -0,0 +1,147 @@
+# users/timeseries.py
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Trunc, TruncDate, TruncHour
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Booking, CustomUser, DailySales
+
+# metric -> (DailySales column, the same figure aggregated over Booking)
+SALES_METRICS = {
+    "bookings": ("bookings", Count("id")),
+    "seats": ("seats", Sum("seat_count")),
+    "revenue": ("revenue", Sum("total_paid")),
+}
+METRICS = [*SALES_METRICS, "new_users"]
+BUCKETS = ["hour", "day", "week", "month"]
+
+# Most buckets one response may hold
+MAX_POINTS = 1000
+
+
+class TimeseriesError(ValueError):
+    """A bad metric, bucket or range, reported back to the caller."""
+
+
+# ================================
+# RANGES AND BUCKETS
+# ================================
+def parse_bound(value, end=False):
+    """
+    A range bound from "YYYY-MM-DD" or an ISO datetime. A date `to` bound
+    covers the whole day. Returns an aware datetime, or None.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        moment = None if day else parse_datetime(value)
+    except ValueError:
+        day = moment = None
+    if day:
+        moment = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+    elif moment is None:
+        raise TimeseriesError(f"Not a date: {value}")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _floor(moment, bucket):
+    moment = timezone.localtime(moment)
+    if bucket == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.date()
+    if bucket == "week":
+        day -= timedelta(days=day.weekday())
+    elif bucket == "month":
+        day = day.replace(day=1)
+    return day
+
+
+def _step(start, bucket):
+    if bucket == "hour":
+        return start + timedelta(hours=1)
+    if bucket == "day":
+        return start + timedelta(days=1)
+    if bucket == "week":
+        return start + timedelta(weeks=1)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def _key(value, bucket):
+    if bucket == "hour":
+        return timezone.localtime(value).strftime("%Y-%m-%dT%H:00")
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value.isoformat()
+
+
+def bucket_starts(start, end, bucket):
+    """Every bucket from the one holding `start` up to `end` (exclusive)."""
+    current = _floor(start, bucket)
+    last = _floor(end - timedelta(microseconds=1), bucket)
+    starts = []
+    while current <= last:
+        starts.append(current)
+        if len(starts) > MAX_POINTS:
+            raise TimeseriesError(f"More than {MAX_POINTS} {bucket} buckets; narrow the range or use a larger bucket")
+        current = _step(current, bucket)
+    return starts
+
+
+# ================================
+# QUERIES
+# ================================
+def _truncate(field, bucket):
+    if bucket == "hour":
+        return TruncHour(field)
+    if bucket == "day":
+        return TruncDate(field)
+    return Trunc(field, bucket)
+
+
+def _totals(metric, start, end, bucket):
+    if metric == "new_users":
+        rows = CustomUser.objects.filter(date_joined__gte=start, date_joined__lt=end).annotate(
+            t=_truncate("date_joined", bucket)
+        )
+        total = Count("id")
+    elif bucket == "hour":
+        # The rollups are daily, so hours come from the bookings themselves
+        rows = Booking.objects.filter(created_at__gte=start, created_at__lt=end).annotate(t=TruncHour("created_at"))
+        total = SALES_METRICS[metric][1]
+    else:
+        first_day = timezone.localtime(start).date()
+        last_day = timezone.localtime(end - timedelta(microseconds=1)).date()
+        rows = DailySales.objects.filter(day__gte=first_day, day__lte=last_day).annotate(
+            t=F("day") if bucket == "day" else Trunc("day", bucket)
+        )
+        total = Sum(SALES_METRICS[metric][0])
+
+    return {_key(t, bucket): v for t, v in rows.values("t").annotate(v=total).values_list("t", "v")}
+
+
+def timeseries(metric, start, end, bucket):
+    """
+    `metric` per `bucket` between start (inclusive) and end (exclusive) as
+    [{"t": bucket start, "value": total}], empty buckets included. Sales
+    metrics read the DailySales rollups (bookings for hourly buckets), new
+    users the date_joined index; either way a range scan.
+    """
+    if metric not in METRICS:
+        raise TimeseriesError(f"Unknown metric: {metric}")
+    if bucket not in BUCKETS:
+        raise TimeseriesError(f"Unknown bucket: {bucket}")
+    if end <= start:
+        raise TimeseriesError("'to' must be after 'from'")
+
+    starts = bucket_starts(start, end, bucket)
+    totals = _totals(metric, start, end, bucket)
+    points = []
+    for bucket_start in starts:
+        value = totals.get(_key(bucket_start, bucket)) or 0
+        points.append({"t": _key(bucket_start, bucket), "value": float(value) if metric == "revenue" else value})
+    return points
@@ -4,16 +4,30 @@ from django.contrib.auth import authenticate, login as auth_login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.conf import settings
+from django.utils import timezone
+from django.utils.http import parse_etags
+from asgiref.sync import sync_to_async
 from django.core.paginator import Paginator
-from django.db.models import Count
-from django.db.models.functions import TruncDate
 import json
 from django.views.decorators.csrf import csrf_exempt
 
 from urllib.parse import unquote
 
-from .models import CustomUser, Movie, Booking, Notification
+from .models import CustomUser, Movie, Booking, Notification, Showtime
+from .seating import (
+    default_showtime, movie_for_booking, parse_seats, requested_showtime_id, showtime_date_time,
+)
+from .seatmap import (
+    SEAT_ROWS, SEATS_PER_ROW, bits_from_seats, etag_for, get_seat_map, seat_map_payload,
+    seats_from_bits, showtime_key, unavailable_bits,
+)
+from .realtime import seat_feed
+from .jobs import enqueue
+from .kpis import get_kpis
+from . import tasks
+from .booking_service import book_seats, cancel_booking, delete_user, place_hold, release_holds, BookingError, SeatsUnavailable
 
 
 # ============================================================
@@ -87,27 +101,21 @@ def register_view(request):
         user.is_active = False
         user.save()
 
-        # Send activation email
-        from .email_utils import send_registration_email
-        try:
-            if send_registration_email(user, request):
-                # Store email in session for the pending page
-                request.session['registration_email'] = email
-                return redirect("registration_pending")
-            else:
-                # If email fails, delete user and show error
-                user.delete()
-                messages.error(request, "❌ Failed to send verification email. Please try again.")
-                return redirect("register")
-        except Exception as e:
-            user.delete()
-            print(f"Failed to send registration email: {e}")
-            messages.error(request, "❌ An error occurred. Please try again.")
-            return redirect("register")
+        # Activation email is sent by the job worker, retrying if SMTP is down
+        enqueue(tasks.send_registration_email, user.pk, _site_url(request))
+
+        # Store email in session for the pending page
+        request.session['registration_email'] = email
+        return redirect("registration_pending")
 
     return render(request, "register.html")
 
 
+def _site_url(request):
+    """Site root for links in emails, which are built outside the request."""
+    return request.build_absolute_uri("/").rstrip("/")
+
+
 def registration_pending(request):
     """
     Show page telling user to check their email
@@ -269,17 +277,25 @@ def book_movie_page(request, movie_name):
 
     context = {
         "movie_name": movie_name,
+        "seat_rows": SEAT_ROWS,
+        "seats_per_row": SEATS_PER_ROW,
     }
 
     # Try to find in DB
     movie_obj = Movie.objects.filter(title=movie_name).first()
     
     if movie_obj:
+        showtimes = movie_obj.showtimes.filter(starts_at__gte=timezone.now())
+        selected = request.GET.get("showtime", "")
+        showtime = movie_obj.showtimes.filter(pk=selected).first() if selected.isdigit() else None
+        showtime = showtime or default_showtime(movie_obj)
+        context["showtime"] = showtime
+        context["showtimes"] = showtimes
         context["movie_genre"] = movie_obj.genre if movie_obj.genre else movie_obj.category
         context["movie_duration"] = f"{movie_obj.duration} mins" if movie_obj.duration else None
         context["movie_description"] = movie_obj.description if movie_obj.description else "Experience this amazing title at Gold Cinema. Book your tickets now!"
         context["movie_price"] = movie_obj.price
-        context["movie_scheduled_date"] = movie_obj.scheduled_date
+        context["movie_scheduled_date"] = showtime.starts_at if showtime else movie_obj.scheduled_date
         if movie_obj.poster:
             context["movie_poster"] = movie_obj.poster.url
     elif movie_name in hardcoded_movies:
@@ -304,52 +320,44 @@ def create_booking(request):
         movie_encoded = request.POST.get("movie_name")
         movie = unquote(movie_encoded)
 
-        # Fetch Movie object to get scheduled date/time
-        movie_obj = Movie.objects.filter(title=movie).first()
-        if not movie_obj:
+        is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.accepts("application/json")
+
+        # Showtime picked on the page (older forms only send the title)
+        showtime = _showtime_from_request(request.POST, movie)
+        if not showtime:
              msg = "❌ Movie not found."
              if is_ajax:
                  return JsonResponse({"success": False, "message": msg})
              messages.error(request, msg)
              return redirect(f"/book/{movie}/")
 
-        # Use scheduled date/time
-        if movie_obj.scheduled_date:
-            date = movie_obj.scheduled_date.date()
-            time = movie_obj.scheduled_date.strftime("%H:%M")
-        else:
-            # Fallback if no scheduled date (shouldn't happen with new logic but good for safety)
-            date = timezone.now().date()
-            time = "00:00"
-
-        raw_seats = request.POST.get("selected_seats", "").strip()
+        date, time = showtime_date_time(showtime)
 
-        is_ajax = request.headers.get('x-requested-with') == 'XMLHttpRequest' or request.accepts("application/json")
+        seat_list, invalid_seats = parse_seats(request.POST.get("selected_seats", ""))
 
         # Validate seats
-        if not raw_seats:
+        if not seat_list and not invalid_seats:
             msg = "⚠️ Please select at least one seat."
             if is_ajax:
                 return JsonResponse({"success": False, "message": msg})
             messages.error(request, msg)
             return redirect(f"/book/{movie}/")
 
-        seats = ",".join([s.strip() for s in raw_seats.split(",")])
-        seat_list = [s.strip() for s in seats.split(",")]
-
-        # Check for existing booked seats
-        # We filter by movie_name and the scheduled date/time we just fetched
-        existing = Booking.objects.filter(
-            movie_name=movie,
-            date=date,
-            time=time
-        )
+        if invalid_seats:
+            msg = f"⚠️ Invalid seat(s): {', '.join(invalid_seats)}"
+            if is_ajax:
+                return JsonResponse({"success": False, "message": msg})
+            messages.error(request, msg)
+            return redirect(f"/book/{movie}/")
 
-        already_booked = []
-        for b in existing:
-            already_booked.extend([s.strip() for s in b.seats.split(",")])
+        seats = ",".join(seat_list)
+        key = showtime_key(showtime.pk)
 
-        conflict_seats = [s for s in seat_list if s in already_booked]
+        # Check for existing booked seats
+        # Bitset test against the showtime's cached seat map to fail fast before the transaction
+        seat_map = get_seat_map(showtime.pk)
+        taken = bits_from_seats(seat_list) & unavailable_bits(seat_map, _own_held_bits(request, key))
+        conflict_seats = seats_from_bits(taken)
 
         if conflict_seats:
             msg = f"❌ Seat(s) already booked: {', '.join(conflict_seats)}"
@@ -358,32 +366,18 @@ def create_booking(request):
             messages.error(request, msg)
             return redirect(f"/book/{movie}/")
 
-        # Check Balance & Deduct Price
-        price = movie_obj.price
-        
-        # If multiple seats, multiply price? Usually per seat.
-        # Assuming price is per seat.
-        total_cost = price * len(seat_list)
-
-        if request.user.balance < total_cost:
-            msg = f"❌ Insufficient funds. Cost: KSH {total_cost}, Balance: KSH {request.user.balance}"
+        # SAVE BOOKING
+        # Seats, booking and wallet debit are committed together; concurrent
+        # buyers are resolved by the seat index and a conditional balance update.
+        try:
+            booking, total_cost = book_seats(request.user, showtime, seat_list, showtime.movie.price)
+        except BookingError as e:
+            msg = str(e)
             if is_ajax:
-                return JsonResponse({"success": False, "message": msg, "error_type": "insufficient_funds"})
+                return JsonResponse({"success": False, "message": msg, "error_type": e.error_type})
             messages.error(request, msg)
             return redirect(f"/book/{movie}/")
-
-        # Deduct balance
-        request.user.balance -= total_cost
-        request.user.save()
-
-        # SAVE BOOKING
-        booking = Booking.objects.create(
-            user=request.user,
-            movie_name=movie,
-            date=date,
-            time=time,
-            seats=seats
-        )
+        _remember_holds(request, key, [])
 
         # CREATE NOTIFICATION
         Notification.objects.create(
@@ -392,12 +386,8 @@ def create_booking(request):
             notification_type="booking_success"
         )
 
-        # SEND EMAIL
-        from .email_utils import send_booking_confirmation_email
-        try:
-            send_booking_confirmation_email(request.user, booking)
-        except Exception as e:
-            print(f"Failed to send booking email: {e}")
+        # SEND EMAIL (queued; the worker delivers it)
+        enqueue(tasks.send_booking_confirmation_email, booking.pk)
 
         success_msg = f"Booking successful! 🎉 KSH {total_cost} deducted."
         if is_ajax:
@@ -414,51 +404,148 @@ def cancel_my_booking(request, booking_id):
     booking = get_object_or_404(Booking, id=booking_id, user=request.user)
     
     if request.method == "POST":
-        # Calculate refund
-        movie = Movie.objects.filter(title=booking.movie_name).first()
-        refund_amount = 0
-        
-        if movie:
-            # Count seats (assuming comma-separated)
-            seats_list = [s for s in booking.seats.split(",") if s.strip()]
-            seat_count = len(seats_list)
-            refund_amount = movie.price * seat_count
-            
-            # Credit user balance
-            request.user.balance += refund_amount
-            request.user.save()
+        # Refund what was actually paid, whatever the price is now
+        refund_amount = booking.total_paid
+
+        # Release seats and credit the refund in one transaction
+        if not cancel_booking(booking, refund_amount):
+            messages.error(request, "⚠️ This booking has already been cancelled.")
+            return redirect("homepage")
 
         # Send cancellation email
-        from .email_utils import send_booking_cancellation_email
-        try:
-            send_booking_cancellation_email(request.user, booking)
-        except Exception as e:
-            print(f"Failed to send cancellation email: {e}")
+        enqueue(tasks.send_booking_cancellation_email, request.user.pk, booking.movie_name)
 
-        booking.delete()
         messages.success(request, f"Booking cancelled. KSH {refund_amount} has been refunded to your account. 🗑️")
         return redirect("homepage")
         
     return redirect("homepage")
 
 
-# API — return JSON booked seats
+def _showtime_from_request(data, movie_name):
+    """The showtime a form or API call names, else the title's default screening."""
+    showtime_id = requested_showtime_id(movie_name, data.get("showtime"))
+    return Showtime.objects.select_related("movie").filter(pk=showtime_id).first() if showtime_id else None
+
+
+def _own_held_bits(request, key):
+    """Seats this session holds for the showtime, which stay selectable for it."""
+    return bits_from_seats(request.session.get("seat_holds", {}).get(key, []))
+
+
+def _remember_holds(request, key, seat_list):
+    holds = request.session.get("seat_holds", {})
+    if seat_list:
+        holds[key] = seat_list
+    else:
+        holds.pop(key, None)
+    request.session["seat_holds"] = holds
+
+
+# API — return the showtime's seat map as base64 bitsets
+# Supports If-None-Match (304 when the version is unchanged) and
+# ?since=<version> to fetch only the seats that changed after that version.
 @login_required
 def get_booked_seats(request, movie_name):
     movie_name = unquote(movie_name)
 
-    movie_obj = Movie.objects.filter(title=movie_name).first()
-    seats = []
+    showtime_id = requested_showtime_id(movie_name, request.GET.get("showtime"))
+    seat_map = {"version": 0, "booked": 0, "held": 0, "holds_expire_at": None}
+    own_held = 0
 
-    if movie_obj and movie_obj.scheduled_date:
-        date_str = movie_obj.scheduled_date.strftime("%Y-%m-%d")
-        time_str = movie_obj.scheduled_date.strftime("%H:%M")
-        
-        bookings = Booking.objects.filter(movie_name=movie_name, date=date_str, time=time_str)
-        for b in bookings:
-            seats.extend(s.strip() for s in b.seats.split(","))
+    if showtime_id:
+        seat_map = get_seat_map(showtime_id)
+        own_held = _own_held_bits(request, showtime_key(showtime_id))
 
-    return JsonResponse({"booked_seats": seats})
+    etag = etag_for(seat_map, own_held)
+    since = request.GET.get("since", "")
+
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        since = int(since) if since.isdigit() else None
+        response = JsonResponse(seat_map_payload(showtime_id, seat_map, own_held, since))
+
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+# API — hold seats while the user checks out
+@login_required
+def hold_seats(request):
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Invalid method"})
+
+    movie_name = unquote(request.POST.get("movie_name", ""))
+    showtime_id = requested_showtime_id(movie_name, request.POST.get("showtime"))
+    if not showtime_id:
+        return JsonResponse({"success": False, "message": "❌ Movie not found."})
+
+    key = showtime_key(showtime_id)
+    seat_list, invalid_seats = parse_seats(request.POST.get("selected_seats", ""))
+
+    if invalid_seats:
+        return JsonResponse({"success": False, "message": f"⚠️ Invalid seat(s): {', '.join(invalid_seats)}"})
+
+    if not seat_list:
+        release_holds(request.user, showtime_id)
+        _remember_holds(request, key, [])
+        return JsonResponse({"success": True, "held_seats": [], "held_until": None})
+
+    try:
+        held_until = place_hold(request.user, showtime_id, seat_list)
+    except SeatsUnavailable as e:
+        return JsonResponse({"success": False, "message": str(e), "unavailable_seats": e.seats})
+    _remember_holds(request, key, seat_list)
+
+    return JsonResponse({"success": True, "held_seats": seat_list, "held_until": held_until.isoformat()})
+
+
+@login_required
+def release_seat_holds(request):
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Invalid method"})
+
+    movie_name = unquote(request.POST.get("movie_name", ""))
+    showtime_id = requested_showtime_id(movie_name, request.POST.get("showtime"))
+    if showtime_id:
+        release_holds(request.user, showtime_id)
+        _remember_holds(request, showtime_key(showtime_id), [])
+
+    return JsonResponse({"success": True})
+
+
+# API — live seat-map changes as Server-Sent Events (served under ASGI)
+@login_required
+async def seat_events(request, movie_name):
+    movie_name = unquote(movie_name)
+
+    showtime_id = await sync_to_async(requested_showtime_id)(movie_name, request.GET.get("showtime"))
+    if not showtime_id:
+        return JsonResponse({"error": "Movie not found"}, status=404)
+
+    # EventSource reconnects send the last version they saw
+    since = request.headers.get("Last-Event-ID") or request.GET.get("since", "")
+    since = int(since) if since.isdigit() else None
+
+    response = StreamingHttpResponse(
+        _sse_stream(seat_feed.stream(showtime_id, since=since)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _sse_stream(events):
+    yield "retry: 3000\n\n"
+    async for event in events:
+        if event is None:
+            yield ": keepalive\n\n"
+        elif "version" in event:
+            yield f"id: {event['version']}\nevent: seats\ndata: {json.dumps(event)}\n\n"
+        else:
+            yield f"event: resync\ndata: {json.dumps(event)}\n\n"
 
 
 @login_required
@@ -480,10 +567,10 @@ def get_user_bookings(request):
 @login_required
 def download_ticket(request, booking_id):
     """View to display/download a ticket"""
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(Booking.objects.select_related("showtime__movie"), id=booking_id, user=request.user)
     
     # Get movie details if available
-    movie = Movie.objects.filter(title=booking.movie_name).first()
+    movie = movie_for_booking(booking)
     
     context = {
         'booking': booking,
@@ -526,7 +613,7 @@ def update_account(request):
 def delete_account_view(request):
     user = request.user
     logout(request)
-    user.delete()
+    delete_user(user)
     return redirect("register")
 
 
@@ -565,67 +652,29 @@ def deposit_view(request):
 # ADMIN DASHBOARD
 # ============================================================
 
-@staff_member_required
-def admin_dashboard(request):
-    total_users = CustomUser.objects.count()
-    total_bookings = Booking.objects.count()
-    
-    # Calculate total revenue and User Leaderboard
-    total_revenue = 0
-    user_stats = {}
-    
-    all_bookings = Booking.objects.select_related('user').all()
-    
-    # Cache movies to avoid repeated DB hits
-    movies_cache = {m.title: m for m in Movie.objects.all()}
-    
-    for b in all_bookings:
-        # Calculate booking cost
-        movie = movies_cache.get(b.movie_name)
-        booking_cost = 0
-        if movie:
-            seat_count = len([s for s in b.seats.split(",") if s.strip()])
-            booking_cost = movie.price * seat_count
-            
-        total_revenue += booking_cost
-        
-        # Update user stats
-        if b.user not in user_stats:
-            user_stats[b.user] = {'user': b.user, 'revenue': 0, 'bookings': 0}
-        
-        user_stats[b.user]['revenue'] += booking_cost
-        user_stats[b.user]['bookings'] += 1
+DASHBOARD_KPIS = (
+    "total_users", "sales_totals", "popular_movies", "leaderboard", "recent_bookings",
+)
 
-    # Convert stats to list and sort by revenue (descending)
-    leaderboard = sorted(user_stats.values(), key=lambda x: x['revenue'], reverse=True)
 
-    popular = (
-        Booking.objects.values("movie_name")
-        .annotate(count=Count("id"))
-        .order_by("-count")[:5]
-    )
-
-    bookings_by_day_qs = (
-        Booking.objects.annotate(day=TruncDate("created_at"))
-        .values("day")
-        .annotate(count=Count("id"))
-        .order_by("day")
-    )
-
-    dates = [str(x["day"]) for x in bookings_by_day_qs]
-    counts = [x["count"] for x in bookings_by_day_qs]
+@staff_member_required
+def admin_dashboard(request):
+    # Figures come from the KPI cache; POSTing the refresh form recomputes them
+    if request.method == "POST":
+        get_kpis(*DASHBOARD_KPIS, refresh=True)
+        return redirect(request.path)
 
-    recent = Booking.objects.select_related("user").order_by("-created_at")[:10]
+    kpis, computed_at = get_kpis(*DASHBOARD_KPIS)
 
     context = {
-        "total_users": total_users,
-        "total_bookings": total_bookings,
-        "total_revenue": total_revenue,
-        "popular_movies": list(popular),
-        "chart_dates": dates,
-        "chart_counts": counts,
-        "recent_bookings": recent,
-        "leaderboard": leaderboard,
+        "total_users": kpis["total_users"],
+        "total_bookings": kpis["sales_totals"]["bookings"],
+        "total_revenue": kpis["sales_totals"]["revenue"],
+        "popular_movies": kpis["popular_movies"],
+        "recent_bookings": kpis["recent_bookings"],
+        "leaderboard": kpis["leaderboard"],
+        "computed_at": computed_at,
+        "chart_days": getattr(settings, "DASHBOARD_CHART_DAYS", 90),
     }
 
     return render(request, "admin/dashboard.html", context)
@@ -811,17 +860,13 @@ def delete_account(request):
                 })
             
             # Send deletion email
-            from .email_utils import send_account_deletion_email
-            try:
-                send_account_deletion_email(user)
-            except Exception as e:
-                print(f"Failed to send deletion email: {e}")
+            enqueue(tasks.send_account_deletion_email, user.email, user.first_name, user.username)
 
             # Log the user out
             logout(request)
             
             # Delete the user account (this will also delete related bookings due to CASCADE)
-            user.delete()
+            delete_user(user)
             
             return JsonResponse({
                 "success": True,
@@ -907,11 +952,8 @@ def password_reset_request(request):
             user = CustomUser.objects.get(email=email)
             
             # Send password reset email
-            from .email_utils import send_password_reset_email
-            if send_password_reset_email(user, request):
-                messages.success(request, "✅ Password reset link sent! Check your email.")
-            else:
-                messages.error(request, "❌ Failed to send email. Please try again later.")
+            enqueue(tasks.send_password_reset_email, user.pk, _site_url(request))
+            messages.success(request, "✅ Password reset link sent! Check your email.")
                 
         except CustomUser.DoesNotExist:
             # Don't reveal if email exists for security